@@ -0,0 +1,248 @@
+"""
+Agent Pool for the Financial Advisor API
+
+phi Agents are blocking and keep per-run state, so the API cannot share a
+single instance between requests or call it from the event loop. This module
+keeps a fixed set of independently built agents and hands runs to a bounded
+worker executor:
+
+- At most `size` runs execute at once (one agent per worker thread)
+- At most `max_queue` more runs wait for a free agent; beyond that the pool
+  raises PoolBusyError so the API can answer 503 with a Retry-After header
+- Each run is awaited with a timeout; a run that times out keeps its agent
+  until the worker thread finishes, then the agent goes back to the pool
+- Streaming runs (`stream()`) forward each item from the worker thread to
+  the event loop as it is produced
+- Runs execute in a copy of the caller's context, so contextvars (like the
+  request trace) are visible inside the agent's tool and model calls
+- Agents are built on first use (up to `size`), so starting a worker does
+  not pay for agents it may never need
+- `drain()` waits for the running and queued runs on shutdown
+"""
+
+import asyncio
+import contextvars
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool queue is full. `retry_after` is in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Advisor is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _StreamEnd:
+    """Marker put on a stream queue when the worker is done (or failed)."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class AgentPool:
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 4,
+        max_queue: int = 16,
+        timeout: Optional[float] = 120.0,
+        name: str = "advisor",
+    ):
+        self.name = name
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+
+        self._agents: "queue.Queue[Any]" = queue.Queue()
+        self._built = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._pending = 0  # running + waiting
+        self._avg_run_seconds = 10.0  # moving average, used for Retry-After
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.size + self.max_queue:
+                self._rejected += 1
+                raise PoolBusyError(self.retry_after())
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _take_agent(self) -> Any:
+        """A free agent; a new one while fewer than `size` have been built."""
+        try:
+            return self._agents.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            build = self._built < self.size
+            if build:
+                self._built += 1
+        if not build:
+            return self._agents.get()
+        try:
+            return self.factory()
+        except BaseException:
+            with self._lock:
+                self._built -= 1
+            raise
+
+    def _call_with_agent(self, fn: Callable[[Any], Any]) -> Any:
+        agent = self._take_agent()
+        started = time.perf_counter()
+        try:
+            return fn(agent)
+        finally:
+            # Drop conversation state so the next request starts clean
+            if getattr(agent, "memory", None) is not None:
+                agent.memory.clear()
+            self._agents.put(agent)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * elapsed
+                self._completed += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def retry_after(self) -> int:
+        """Rough number of seconds until a queue slot frees up."""
+        waves = max(1, self._pending - self.size + 1) / self.size
+        return max(1, math.ceil(waves * self._avg_run_seconds))
+
+    async def submit(self, fn: Callable[[Any], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn(agent)` on a worker thread with an agent from the pool.
+
+        Raises PoolBusyError when the queue is full and asyncio.TimeoutError
+        when the run takes longer than the timeout.
+        """
+        self._reserve()
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, self._call_with_agent, fn)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            # shield() so a timeout does not try to cancel a running thread
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise
+
+    async def run(self, message: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Shortcut for `agent.run(message, **kwargs)` on a pooled agent."""
+        return await self.submit(lambda agent: agent.run(message, **kwargs), timeout=timeout)
+
+    def stream(
+        self, fn: Callable[[Any], Iterator[Any]], timeout: Optional[float] = None
+    ) -> AsyncIterator[Any]:
+        """
+        Run `fn(agent)` on a worker thread and yield the items of the iterator
+        it returns as soon as they are produced (e.g. `agent.run(..., stream=True)`).
+
+        The pool slot is reserved immediately, so PoolBusyError is raised by
+        this call rather than on first iteration. asyncio.TimeoutError is
+        raised from the iterator when the whole run exceeds the timeout.
+        """
+        self._reserve()
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop already closed
+
+        def consume(agent):
+            error = None
+            try:
+                for item in fn(agent):
+                    if stop.is_set():
+                        break  # client went away, stop generating
+                    put(item)
+            except BaseException as e:
+                error = e
+            finally:
+                put(_StreamEnd(error))
+
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, self._call_with_agent, consume)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = timeout or self.timeout
+        deadline = loop.time() + timeout if timeout else None
+        return self._drain(items, stop, deadline)
+
+    async def _drain(self, items: asyncio.Queue, stop: threading.Event, deadline: Optional[float]):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                try:
+                    item = await asyncio.wait_for(items.get(), remaining)
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._timed_out += 1
+                    raise
+                if isinstance(item, _StreamEnd):
+                    if item.error is not None:
+                        raise item.error
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "agents_built": self._built,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._pending, self.size),
+                "queued": max(0, self._pending - self.size),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_run_seconds": round(self._avg_run_seconds, 2),
+            }
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until no runs are executing or queued (including runs whose
+        caller already timed out). False if `timeout` seconds passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,240 @@
+"""
+Personalized Investment Allocation Engine
+
+Section 8 of the report ("Personalized Investment Plan") used to ask the LLM
+to do the arithmetic of the allocation framework. The same rules now run
+here, vectorized with NumPy/pandas, so thousands of investor profiles are
+allocated in milliseconds and the numbers handed to the LLM are always right.
+
+Framework (standard financial planning rules of thumb):
+
+1. Monthly investment capacity by age (conservative end of each range):
+   age up to 30: 25% of salary (range 25-30%), 31-50: 20% (20-25%),
+   51+: 15% (15-20%)
+2. Equity/debt split by risk appetite: low 30/70, moderate 50/50,
+   high-moderate 70/30, high 90/10
+3. Single stock limit as % of the monthly equity allocation: low 5-10%,
+   moderate 10-15%, high-moderate 15-20%, high 20-25%; the suggested SIP
+   uses the target inside that range, and equity share × that target is
+   the stock's share of the whole monthly investment ("% of portfolio")
+4. Time horizon by age: up to 30: 10+ years, 31-50: 7-10 years, 51+: 3-5 years
+
+Example: age 30, ₹3,00,000/month, moderate risk
+   capacity ₹75,000 → equity ₹37,500 → stock SIP 12% = ₹4,500/month (₹54,000/year),
+   50% × 12% = 6% of the portfolio
+"""
+
+import io
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+RISK_LEVELS = ["low", "moderate", "high-moderate", "high"]
+
+# Other ways people write the same risk level
+RISK_ALIASES = {
+    "conservative": "low",
+    "medium": "moderate",
+    "balanced": "moderate",
+    "moderate-high": "high-moderate",
+    "high moderate": "high-moderate",
+    "highmoderate": "high-moderate",
+    "growth": "high-moderate",
+    "aggressive": "high",
+}
+
+EQUITY_SHARE = {"low": 0.30, "moderate": 0.50, "high-moderate": 0.70, "high": 0.90}
+SINGLE_STOCK_RANGE = {
+    "low": (0.05, 0.10),
+    "moderate": (0.10, 0.15),
+    "high-moderate": (0.15, 0.20),
+    "high": (0.20, 0.25),
+}
+# Suggested single-stock share: the middle of the range, rounded down to a whole percent
+SINGLE_STOCK_TARGET = {"low": 0.07, "moderate": 0.12, "high-moderate": 0.17, "high": 0.22}
+
+AGE_BAND_LABELS = np.array(["20-30", "31-50", "51+"])
+CAPACITY_RANGE = np.array([(0.25, 0.30), (0.20, 0.25), (0.15, 0.20)])
+HORIZONS = np.array(["10+ years", "7-10 years", "3-5 years"])
+
+DEFAULT_RISK = "moderate"
+DEFAULT_AGE_BAND = 1  # 31-50, used when age is not given
+
+OUTPUT_COLUMNS = [
+    "age", "monthly_salary", "risk_appetite", "age_band", "capacity_pct", "capacity_max_pct", "capacity_monthly",
+    "equity_pct", "debt_pct", "equity_monthly", "debt_monthly", "single_stock_min_pct",
+    "single_stock_max_pct", "single_stock_pct", "portfolio_pct", "stock_sip_monthly", "stock_max_monthly",
+    "stock_annual", "horizon", "assumptions", "error",
+]
+
+
+def normalize_risk(values: pd.Series) -> pd.Series:
+    """Map free-text risk appetite to one of RISK_LEVELS (NaN if unknown)."""
+    cleaned = values.astype("string").str.strip().str.lower().str.replace("_", "-", regex=False)
+    cleaned = cleaned.replace(RISK_ALIASES)
+    return cleaned.where(cleaned.isin(RISK_LEVELS))
+
+
+def _given(values: pd.Series) -> np.ndarray:
+    """Whether each value was filled in (not missing and not blank)."""
+    return values.notna().to_numpy() & (values.astype("string").str.strip() != "").fillna(False).to_numpy()
+
+
+def allocate(profiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    Allocate every row of `profiles` (columns: age, monthly_salary,
+    risk_appetite; missing values allowed).
+
+    Missing age uses the 31-50 band and missing risk appetite uses moderate;
+    both are listed in the `assumptions` column. Without a salary only the
+    percentages are filled in. Rows with invalid values (including an age or
+    salary that is not a number) get an `error`.
+    """
+    n = len(profiles)
+    raw_age = profiles.get("age", pd.Series([np.nan] * n)).reset_index(drop=True)
+    raw_salary = profiles.get("monthly_salary", pd.Series([np.nan] * n)).reset_index(drop=True)
+    age = pd.to_numeric(raw_age, errors="coerce").to_numpy(dtype=float)
+    salary = pd.to_numeric(raw_salary, errors="coerce").to_numpy(dtype=float)
+    raw_risk = profiles.get("risk_appetite", pd.Series([None] * n)).reset_index(drop=True)
+    risk = normalize_risk(raw_risk)
+
+    # Validation
+    error = np.full(n, None, dtype=object)
+    bad_risk = _given(raw_risk) & risk.isna().to_numpy()
+    error[bad_risk] = "unknown risk_appetite (use low, moderate, high-moderate or high)"
+    error[(age < 18) | (age > 100)] = "age must be between 18 and 100"
+    error[salary < 0] = "monthly_salary must not be negative"
+    error[_given(raw_salary) & np.isnan(salary)] = "monthly_salary must be a number"
+    error[_given(raw_age) & np.isnan(age)] = "age must be a number"
+
+    # 1. Capacity by age band
+    missing_age = np.isnan(age)
+    band = np.select([age <= 30, age <= 50], [0, 1], default=2)
+    band = np.where(missing_age, DEFAULT_AGE_BAND, band)
+    capacity_min, capacity_max = CAPACITY_RANGE[band, 0], CAPACITY_RANGE[band, 1]
+
+    # 2. Equity/debt split and 3. single stock limits by risk
+    missing_risk = risk.isna().to_numpy() & ~bad_risk
+    risk_filled = risk.fillna(DEFAULT_RISK)
+    equity_pct = risk_filled.map(EQUITY_SHARE).to_numpy(dtype=float)
+    stock_min = risk_filled.map({r: low for r, (low, _) in SINGLE_STOCK_RANGE.items()}).to_numpy(dtype=float)
+    stock_max = risk_filled.map({r: high for r, (_, high) in SINGLE_STOCK_RANGE.items()}).to_numpy(dtype=float)
+    stock_pct = risk_filled.map(SINGLE_STOCK_TARGET).to_numpy(dtype=float)
+
+    capacity_monthly = salary * capacity_min
+    equity_monthly = capacity_monthly * equity_pct
+    # To the nearest ₹100, but never above the single stock limit
+    stock_sip = np.minimum(np.round(equity_monthly * stock_pct, -2), np.floor(equity_monthly * stock_max))
+
+    assumptions = np.full(n, "", dtype=object)
+    assumptions[missing_age] = "age not given: used 31-50 band"
+    assumptions[missing_risk] = np.where(
+        assumptions[missing_risk] == "",
+        "risk appetite not given: used moderate",
+        assumptions[missing_risk] + "; risk appetite not given: used moderate",
+    )
+
+    result = pd.DataFrame({
+        "age": age,
+        "monthly_salary": salary,
+        "risk_appetite": risk_filled.to_numpy(dtype=object),
+        "age_band": AGE_BAND_LABELS[band],
+        "capacity_pct": capacity_min * 100,
+        "capacity_max_pct": capacity_max * 100,
+        "capacity_monthly": capacity_monthly,
+        "equity_pct": equity_pct * 100,
+        "debt_pct": (1 - equity_pct) * 100,
+        "equity_monthly": equity_monthly,
+        "debt_monthly": capacity_monthly - equity_monthly,
+        "single_stock_min_pct": stock_min * 100,
+        "single_stock_max_pct": stock_max * 100,
+        "single_stock_pct": stock_pct * 100,
+        "portfolio_pct": equity_pct * stock_pct * 100,
+        "stock_sip_monthly": stock_sip,
+        "stock_max_monthly": equity_monthly * stock_max,
+        "stock_annual": stock_sip * 12,
+        "horizon": HORIZONS[band],
+        "assumptions": assumptions,
+        "error": error,
+    }, columns=OUTPUT_COLUMNS)
+
+    # Don't report numbers for rows that failed validation
+    invalid = result["error"].notna().to_numpy()
+    if invalid.any():
+        numeric = [c for c in OUTPUT_COLUMNS if c not in ("age", "monthly_salary", "risk_appetite", "assumptions", "error")]
+        result.loc[invalid, numeric] = np.nan
+    return result
+
+
+def allocate_profile(
+    age: Optional[int] = None,
+    monthly_salary: Optional[float] = None,
+    risk_appetite: Optional[str] = None,
+) -> dict:
+    """Allocate a single investor profile; returns one row as a dict."""
+    frame = pd.DataFrame({"age": [age], "monthly_salary": [monthly_salary], "risk_appetite": [risk_appetite]})
+    return allocate(frame).iloc[0].to_dict()
+
+
+def read_profiles_csv(data: bytes) -> pd.DataFrame:
+    """Read profiles from CSV with columns age, monthly_salary, risk_appetite."""
+    return pd.read_csv(io.BytesIO(data), dtype={"risk_appetite": "string"})
+
+
+def _inr(value: float) -> str:
+    """Format rupees in the Indian grouping style, e.g. ₹3,00,000."""
+    rupees = f"{int(round(value)):d}"
+    if len(rupees) > 3:
+        head, tail = rupees[:-3], rupees[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        rupees = ",".join(groups) + "," + tail
+    return f"₹{rupees}"
+
+
+def format_allocation(row: dict) -> str:
+    """Prompt block with the pre-computed Section 8 numbers."""
+    if row.get("error"):
+        return f"Investor allocation could not be computed: {row['error']}"
+
+    lines = ["PRE-COMPUTED ALLOCATION (use these numbers exactly in Section 8, do not recalculate):"]
+    has_salary = not pd.isna(row["monthly_salary"])
+    if has_salary:
+        lines.append(
+            f"- Monthly investment capacity: {_inr(row['monthly_salary'])} × {row['capacity_pct']:.0f}% = "
+            f"{_inr(row['capacity_monthly'])}/month (age band {row['age_band']}: "
+            f"{row['capacity_pct']:.0f}-{row['capacity_max_pct']:.0f}% of salary)"
+        )
+        lines.append(
+            f"- Asset allocation ({row['risk_appetite']} risk): {row['equity_pct']:.0f}% equity = "
+            f"{_inr(row['equity_monthly'])}/month, {row['debt_pct']:.0f}% debt = {_inr(row['debt_monthly'])}/month"
+        )
+        lines.append(
+            f"- Single stock limit: {row['single_stock_min_pct']:.0f}-{row['single_stock_max_pct']:.0f}% of equity "
+            f"(max {_inr(row['stock_max_monthly'])}/month)"
+        )
+        lines.append(
+            f"- Suggested SIP for this stock: {_inr(row['equity_monthly'])} × {row['single_stock_pct']:.0f}% = "
+            f"{_inr(row['stock_sip_monthly'])}/month ({_inr(row['stock_annual'])}/year)"
+        )
+    else:
+        lines.append(f"- Monthly investment capacity: {row['capacity_pct']:.0f}% of salary (age band {row['age_band']})")
+        lines.append(f"- Asset allocation ({row['risk_appetite']} risk): {row['equity_pct']:.0f}% equity, {row['debt_pct']:.0f}% debt")
+        lines.append(
+            f"- Single stock limit: {row['single_stock_min_pct']:.0f}-{row['single_stock_max_pct']:.0f}% of equity "
+            f"(suggested {row['single_stock_pct']:.0f}%)"
+        )
+        lines.append("- Salary not given: give percentages only, no rupee amounts")
+    lines.append(
+        f"- Share of the total portfolio: {row['equity_pct']:.0f}% equity × {row['single_stock_pct']:.0f}% = "
+        f"{row['portfolio_pct']:.1f}% of the monthly investment"
+    )
+    lines.append(f"- Time horizon: {row['horizon']}")
+    if row.get("assumptions"):
+        lines.append(f"- Assumptions: {row['assumptions']}")
+    return "\n".join(lines)
@@ -1,75 +1,200 @@
 """
 Run the Financial AI Analyst Frontend
 
-This script starts both the backend API and opens the frontend in your browser.
+This script starts the backend API, waits until it is ready and opens the
+frontend in your browser.
+
+    python app.py                           # one worker, opens the frontend
+    python app.py --workers 4 --no-browser  # production-style
+
+- With more than one worker and gunicorn installed, the workers are uvicorn
+  workers under gunicorn with --preload: the app is imported once and the
+  workers are forked from it. Otherwise uvicorn runs the workers itself and
+  each one imports the app (agents and toolkits are built on first use, so
+  that import is short).
+- Readiness comes from polling /api/health instead of sleeping, and the
+  launcher reports how long the server took to come up along with each
+  worker's import and startup times.
+- Ctrl+C (or SIGTERM) stops the server gracefully: it stops accepting
+  requests, lets the ones in flight finish, and each worker waits up to
+  ADVISOR_SHUTDOWN_TIMEOUT seconds for agent runs still going before it
+  exits.
 """
 
-import subprocess
-import webbrowser
-import time
+import argparse
+import json
 import os
+import signal
+import subprocess
 import sys
+import time
+import urllib.request
+import webbrowser
+from importlib.util import find_spec
 from pathlib import Path
 
-def start_backend():
+ROOT = Path(__file__).parent
+
+
+def server_command(host: str, port: int, workers: int, graceful_timeout: float) -> list:
+    """gunicorn with preloaded uvicorn workers when possible, else uvicorn's own workers."""
+    if workers > 1 and find_spec("gunicorn") is not None:
+        return [
+            sys.executable, "-m", "gunicorn", "backend_api:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(workers),
+            "--preload",
+            "--bind", f"{host}:{port}",
+            # Open requests, then the agent runs drained by each worker
+            "--graceful-timeout", str(int(2 * graceful_timeout + 5)),
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "backend_api:app",
+        "--host", host,
+        "--port", str(port),
+        "--workers", str(workers),
+        "--timeout-graceful-shutdown", str(int(graceful_timeout)),
+    ]
+
+
+def start_backend(command: list):
     """Start the FastAPI backend server"""
     print("Starting backend API server...")
-    backend_process = subprocess.Popen(
-        [sys.executable, "backend_api.py"],
-        cwd=Path(__file__).parent
-    )
-    return backend_process
+    print("  " + " ".join(command[1:]))
+    # Own process group: Ctrl+C reaches only the launcher, which then asks the
+    # server to stop gracefully (gunicorn treats SIGINT as a quick shutdown)
+    return subprocess.Popen(command, cwd=ROOT, start_new_session=True)
+
+
+def check_health(url: str):
+    """The /api/health payload, or None while the server is not answering."""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def wait_until_ready(backend, url: str, workers: int, timeout: float) -> bool:
+    """
+    Poll /api/health until the server answers, then keep polling briefly to
+    hear from every worker. Prints the time to ready and each worker's
+    import and startup times.
+    """
+    started = time.perf_counter()
+    seen = {}
+    first_ready = None
+    while time.perf_counter() - started < timeout:
+        if backend.poll() is not None:
+            print(f"Error: backend exited with code {backend.returncode}")
+            return False
+        health = check_health(url)
+        if health is not None:
+            worker = health.get("worker") or {}
+            if first_ready is None:
+                first_ready = time.perf_counter() - started
+                print(f"Backend ready in {first_ready:.2f}s")
+            pid = worker.get("pid")
+            if pid not in seen:
+                seen[pid] = worker
+                print(f"  worker {pid}: imports {worker.get('import_seconds')}s, "
+                      f"startup {worker.get('startup_seconds')}s")
+            # Connections are spread over the workers; stop once all of them answered
+            if len(seen) >= workers or time.perf_counter() - started > first_ready + 5:
+                return True
+        time.sleep(0.1 if health is None else 0.02)
+    if first_ready is None:
+        print(f"Error: backend not ready after {timeout:.0f}s")
+    return first_ready is not None
+
 
 def open_frontend():
     """Open the frontend in the browser"""
-    frontend_path = Path(__file__).parent / "frontend" / "index.html"
+    frontend_path = ROOT / "frontend" / "index.html"
     if frontend_path.exists():
         print("Opening frontend in browser...")
-        time.sleep(2)  # Wait for backend to start
         webbrowser.open(f"file://{frontend_path.absolute()}")
     else:
         print(f"Error: Frontend file not found at {frontend_path}")
 
+
+def stop_backend(backend, graceful_timeout: float):
+    """Ask the server to stop, wait for it to drain, and kill it if it hangs."""
+    if backend.poll() is not None:
+        return
+    print("\nShutting down (finishing requests and agent runs in flight)...")
+    started = time.perf_counter()
+    backend.send_signal(signal.SIGTERM)
+    try:
+        backend.wait(timeout=2 * graceful_timeout + 10)
+        print(f"Server stopped in {time.perf_counter() - started:.1f}s.")
+    except subprocess.TimeoutExpired:
+        backend.kill()
+        backend.wait()
+        print("Server did not stop in time and was killed.")
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Run the Financial Advisor API and open the frontend")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--ready-timeout", type=float, default=60, help="seconds to wait for /api/health")
+    parser.add_argument("--no-browser", action="store_true", help="don't open the frontend")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+    graceful_timeout = float(os.getenv("ADVISOR_SHUTDOWN_TIMEOUT", "30"))
+
     print("="*60)
     print("Financial AI Analyst - Starting Application")
     print("="*60)
     print()
-    
+
     # Check if .env exists
-    env_path = Path(__file__).parent / ".env"
+    env_path = ROOT / ".env"
     if not env_path.exists():
         print("⚠️  WARNING: .env file not found!")
         print("Please create a .env file with your GROQ_API_KEY")
         print("Example: GROQ_API_KEY=your_key_here")
         print()
-    
+
+    # SIGTERM (e.g. from a container runtime) stops the server like Ctrl+C
+    signal.signal(signal.SIGTERM, interrupt)
+
     # Start backend
-    backend = start_backend()
-    
+    launched = time.perf_counter()
+    backend = start_backend(server_command(args.host, args.port, workers, graceful_timeout))
+
     try:
+        health_url = f"http://127.0.0.1:{args.port}/api/health"
+        if not wait_until_ready(backend, health_url, workers, args.ready_timeout):
+            stop_backend(backend, graceful_timeout)
+            sys.exit(1)
+
         # Open frontend
-        open_frontend()
-        
+        if not args.no_browser:
+            open_frontend()
+
         print()
         print("="*60)
-        print("Application Started!")
+        print(f"Application Started in {time.perf_counter() - launched:.2f}s ({workers} worker{'s' if workers > 1 else ''})")
         print("="*60)
-        print("Backend API: http://localhost:8000")
+        print(f"Backend API: http://localhost:{args.port}")
         print("Frontend: Check your browser")
         print()
         print("Press Ctrl+C to stop the server")
         print("="*60)
-        
+
         # Keep running
         backend.wait()
-        
+
     except KeyboardInterrupt:
-        print("\n\nShutting down...")
-        backend.terminate()
-        backend.wait()
-        print("Server stopped.")
+        stop_backend(backend, graceful_timeout)
+
 
 if __name__ == "__main__":
     main()
-
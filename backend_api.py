@@ -2,14 +2,243 @@
 Simple FastAPI Backend for Financial AI Advisor
 """
 
-from fastapi import FastAPI, Form
+import time
+
+# Import time is measured from here to the end of the module
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+import pandas as pd
+from fastapi import FastAPI, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from phi.run.response import RunEvent
 from pydantic import BaseModel
-from typing import Optional
-from financial_agent import financial_advisor
+from typing import List, Optional, Tuple
+from agent_pool import AgentPool, PoolBusyError
+from allocation import allocate, allocate_profile, format_allocation, read_profiles_csv
+from batch_jobs import BatchScheduler
+from cache_warmer import DEFAULT_LEASE_PATH, CacheWarmer, WarmerLease
+from context_compaction import COMPACTION_LEVELS, estimate_tokens, fit_to_budget
+from financial_agent import (
+    SECTION_HEADINGS,
+    build_financial_advisor,
+    build_financial_advisor_pure,
+    build_financial_analyst,
+    build_instructions,
+    build_section_instructions,
+    run_agent,
+    stream_agent,
+    tool_cache,
+)
+from llm_provider import LLMUnavailableError, get_llm_client, is_tool_call_error
+from intent_router import ADVICE, FULL_ANALYSIS, Route, answer_lookup, classify, needs_market_data
+from history_store import format_history, get_history_store
+from prefetch import DATA_PARTS, build_data_context, prefetch_stock_data
+from report_store import SECTION_DATA, ReportStore, assemble, data_versions, format_sources, section_text, split_report
+from response_cache import FRESH, Flight, ResponseCache, profile_bucket
+from session_store import (
+    DEFAULT_DB_PATH,
+    SessionStore,
+    add_turn,
+    has_recent_data,
+    last_intent,
+    last_symbol,
+    merge_profile,
+    remember_data,
+    remember_symbol,
+    render_history,
+    valid_session_id,
+)
+from symbol_index import SymbolMatch, get_symbol_index
+from tracing import LLM_FALLBACKS, REGISTRY, Gauge, finish_trace, render_metrics, span, start_trace
+
+# ============================================================================
+# CONCURRENCY SETTINGS (override in .env)
+# ============================================================================
+# ADVISOR_POOL_SIZE: number of agents / concurrent agent runs
+# ADVISOR_MAX_QUEUE: requests allowed to wait for a free agent before 503
+# ADVISOR_REQUEST_TIMEOUT: seconds before a request gives up with 504
+POOL_SIZE = int(os.getenv("ADVISOR_POOL_SIZE", "4"))
+MAX_QUEUE = int(os.getenv("ADVISOR_MAX_QUEUE", "16"))
+REQUEST_TIMEOUT = float(os.getenv("ADVISOR_REQUEST_TIMEOUT", "120"))
+# ADVISOR_PREFETCH: fetch all data up front for full analyses (0 = let the agent call tools)
+PREFETCH_ENABLED = os.getenv("ADVISOR_PREFETCH", "1") != "0"
+# ADVISOR_FALLBACK_TO_PURE: when the tools agent fails before answering (LLM unavailable,
+# broken tool call), answer with the pure LLM agent instead (0 = return the error)
+# Retries, hedging and model fallbacks are configured with LLM_* (see llm_provider.py)
+FALLBACK_TO_PURE = os.getenv("ADVISOR_FALLBACK_TO_PURE", "1") != "0"
+
+# Watchlist batch jobs (/api/batch)
+# BATCH_MAX_CONCURRENCY: agent runs a batch may use at once (leave room for /api/ask)
+# GROQ_REQUESTS_PER_MINUTE / YFINANCE_REQUESTS_PER_SECOND: quotas the batches stay under
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "2"))
+BATCH_MAX_TICKERS = int(os.getenv("BATCH_MAX_TICKERS", "100"))
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+YFINANCE_REQUESTS_PER_SECOND = float(os.getenv("YFINANCE_REQUESTS_PER_SECOND", "2"))
+
+# Identical LLM questions within a freshness window share one agent run
+# RESPONSE_CACHE_WINDOW: seconds an answer is reused (0 = every request runs the agent)
+RESPONSE_CACHE_WINDOW = float(os.getenv("RESPONSE_CACHE_WINDOW", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# Full analyses are stored split by section; a repeat only rewrites the stale sections
+# REPORT_STORE: 0 turns it off
+# REPORT_MAX_SECTION_CALLS: with more stale sections than this the whole report is rewritten in one call
+# REPORT_MAX_AGE_HOURS: stored sections older than this are always rewritten
+REPORT_STORE_ENABLED = os.getenv("REPORT_STORE", "1") != "0"
+REPORT_MAX_SECTION_CALLS = int(os.getenv("REPORT_MAX_SECTION_CALLS", "4"))
+REPORT_MAX_AGE_HOURS = float(os.getenv("REPORT_MAX_AGE_HOURS", "24"))
+REPORT_STORE_MAX_REPORTS = int(os.getenv("REPORT_STORE_MAX_REPORTS", "256"))
+
+# Conversation memory for requests that send a session_id (see session_store.py)
+# SESSIONS: 0 turns it off
+# SESSION_DB: SQLite file shared by the workers ("" = memory only)
+# SESSION_MAX_SESSIONS: sessions kept in memory in front of SQLite
+# SESSION_HISTORY_TOKENS: cap on the summarized history added to follow-up prompts
+# SESSION_DATA_MAX_AGE_MINUTES: follow-ups on a stock the session fetched this recently are answered from that data
+# SESSION_MAX_AGE_DAYS: sessions idle for longer are deleted
+SESSIONS_ENABLED = os.getenv("SESSIONS", "1") != "0"
+SESSION_DB = os.getenv("SESSION_DB", DEFAULT_DB_PATH) or None
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1024"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "400"))
+SESSION_DATA_MAX_AGE_MINUTES = float(os.getenv("SESSION_DATA_MAX_AGE_MINUTES", "30"))
+SESSION_MAX_AGE_DAYS = float(os.getenv("SESSION_MAX_AGE_DAYS", "7"))
+
+# CONTEXT_TOKEN_BUDGET: estimated prompt tokens (instructions + question + data) a
+# pre-fetched analysis may use; news and search results are trimmed to fit
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3500"))
+
+# Background cache warmer: keeps popular tickers' data fresh during NSE hours
+# CACHE_WARMER: 0 turns it off
+# CACHE_WARMER_SYMBOLS: hot list size (NIFTY 50 plus frequently asked stocks)
+# CACHE_WARMER_PRICE_SYMBOLS: how many of the top names get their price kept fresh
+# CACHE_WARMER_ANALYSES: full analyses of the top N names kept in the response cache (costs LLM tokens)
+# CACHE_WARMER_CONCURRENCY / CACHE_WARMER_YFINANCE_RPS: the warmer's share of capacity and quota
+# CACHE_WARMER_MARKET_HOURS: 0 warms around the clock
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER", "1") != "0"
+CACHE_WARMER_SYMBOLS = int(os.getenv("CACHE_WARMER_SYMBOLS", "60"))
+CACHE_WARMER_PRICE_SYMBOLS = int(os.getenv("CACHE_WARMER_PRICE_SYMBOLS", "10"))
+CACHE_WARMER_ANALYSES = int(os.getenv("CACHE_WARMER_ANALYSES", "0"))
+CACHE_WARMER_CONCURRENCY = int(os.getenv("CACHE_WARMER_CONCURRENCY", "2"))
+CACHE_WARMER_YFINANCE_RPS = float(os.getenv("CACHE_WARMER_YFINANCE_RPS", "1"))
+CACHE_WARMER_MARKET_HOURS = os.getenv("CACHE_WARMER_MARKET_HOURS", "1") != "0"
+
+# ADVISOR_SHUTDOWN_TIMEOUT: seconds a stopping worker waits for agent runs still in
+# flight (batch jobs and runs whose client went away included) before exiting
+SHUTDOWN_TIMEOUT = float(os.getenv("ADVISOR_SHUTDOWN_TIMEOUT", "30"))
+
+# ADVISOR_TRACE_DEBUG: include the JSON trace in every answer (otherwise only with debug=true)
+TRACE_DEBUG = os.getenv("ADVISOR_TRACE_DEBUG", "0") == "1"
+
+advisor_pool = AgentPool(
+    build_financial_advisor,
+    size=POOL_SIZE,
+    max_queue=MAX_QUEUE,
+    timeout=REQUEST_TIMEOUT,
+    name="advisor",
+)
+
+# Tool-less agents for full analyses whose data was pre-fetched
+analyst_pool = AgentPool(
+    build_financial_analyst,
+    size=POOL_SIZE,
+    max_queue=MAX_QUEUE,
+    timeout=REQUEST_TIMEOUT,
+    name="analyst",
+)
+
+# Pure LLM agents for general advice that needs no market data
+pure_pool = AgentPool(
+    build_financial_advisor_pure,
+    size=POOL_SIZE,
+    max_queue=MAX_QUEUE,
+    timeout=REQUEST_TIMEOUT,
+    name="pure",
+)
+
+response_cache = ResponseCache(
+    window=RESPONSE_CACHE_WINDOW,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    wait_timeout=REQUEST_TIMEOUT,
+)
+
+report_store = ReportStore(max_reports=REPORT_STORE_MAX_REPORTS, max_age=REPORT_MAX_AGE_HOURS * 60 * 60)
+
+session_store = SessionStore(
+    db_path=SESSION_DB,
+    max_sessions=SESSION_MAX_SESSIONS,
+    max_age=SESSION_MAX_AGE_DAYS * 24 * 60 * 60,
+)
+
+# Live pool and cache numbers, read on each /api/metrics scrape
+POOL_IN_FLIGHT = REGISTRY.register(Gauge("advisor_pool_in_flight", "Agent runs executing", ("pool",)))
+POOL_QUEUED = REGISTRY.register(Gauge("advisor_pool_queued", "Agent runs waiting for a free agent", ("pool",)))
+TOOL_CACHE_LOOKUPS = REGISTRY.register(Gauge(
+    "advisor_tool_cache_lookups", "Tool cache lookups since start", ("kind", "result")
+))
+RESPONSES_SERVED = REGISTRY.register(Gauge(
+    "advisor_responses_served", "LLM answers since start by how they were served", ("served",)
+))
+
+
+def collect_live_metrics():
+    for pool in (advisor_pool, analyst_pool, pure_pool):
+        stats = pool.stats()
+        POOL_IN_FLIGHT.set(stats["in_flight"], pool=pool.name)
+        POOL_QUEUED.set(stats["queued"], pool=pool.name)
+    for kind, counters in tool_cache.stats()["by_kind"].items():
+        for result, count in counters.items():
+            TOOL_CACHE_LOOKUPS.set(count, kind=kind, result=result)
+    for served, count in response_cache.stats()["served"].items():
+        RESPONSES_SERVED.set(count, served=served)
+
+
+REGISTRY.on_collect(collect_live_metrics)
+
 
-app = FastAPI(title="Financial Advisor API")
+
+# Startup and shutdown of this worker, reported by /api/health (app.py polls it
+# for readiness). Agents and toolkits are built on first use, so a worker is
+# ready as soon as the imports are done.
+worker_state = {"state": "starting", "pid": os.getpid(), "import_seconds": None, "startup_seconds": None, "ready_at": None}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if CACHE_WARMER_ENABLED:
+        cache_warmer.start()
+    worker_state.update(
+        state="ready",
+        pid=os.getpid(),
+        import_seconds=round(IMPORT_SECONDS, 3),
+        startup_seconds=round(time.perf_counter() - started, 3),
+        ready_at=time.time(),
+    )
+    print(f"Worker {os.getpid()} ready (imports {IMPORT_SECONDS:.2f}s, startup {worker_state['startup_seconds']:.3f}s)")
+    yield
+
+    # The server has stopped accepting requests; let the agent runs finish
+    worker_state["state"] = "draining"
+    await cache_warmer.stop()
+    pools = (advisor_pool, analyst_pool, pure_pool)
+    in_flight = sum(pool.stats()["in_flight"] + pool.stats()["queued"] for pool in pools)
+    drain_started = time.perf_counter()
+    drained = all(await asyncio.gather(*(pool.drain(SHUTDOWN_TIMEOUT) for pool in pools)))
+    for pool in pools:
+        pool.shutdown(wait=False)
+    worker_state["state"] = "stopped"
+    if drained:
+        print(f"Worker {os.getpid()} stopped: {in_flight} agent runs drained in {time.perf_counter() - drain_started:.1f}s")
+    else:
+        print(f"Worker {os.getpid()} stopped: agent runs still in flight after {SHUTDOWN_TIMEOUT:.0f}s were abandoned")
+
+
+app = FastAPI(title="Financial Advisor API", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -28,50 +257,53 @@ class QuestionRequest(BaseModel):
     risk_appetite: Optional[str] = None
 
 
+class BatchRequest(BaseModel):
+    tickers: Optional[List[str]] = None
+    watchlist: Optional[str] = None  # "NIFTY50" to analyze every NIFTY 50 name
+    age: Optional[int] = None
+    monthly_salary: Optional[float] = None
+    risk_appetite: Optional[str] = None
+
+
 @app.get("/")
 async def root():
     return {
         "message": "Financial Advisor API is running",
         "endpoints": {
             "/api/ask": "POST - Ask a financial question",
-            "/api/health": "GET - Health check"
+            "/api/ask/stream": "POST - Ask a financial question, answer streamed as Server-Sent Events",
+            "/api/batch": "POST - Start a watchlist analysis job; GET /api/batch/{job_id} to poll, /stream for SSE",
+            "/api/allocate": "POST - Allocation for many investor profiles (JSON or CSV), no LLM",
+            "/api/session/{session_id}": "GET - What a session remembers; DELETE - forget it",
+            "/api/health": "GET - Health check",
+            "/api/metrics": "GET - Prometheus metrics (latency per phase, tool calls, LLM tokens)"
         }
     }
 
 
-@app.post("/api/ask")
-async def ask_question(
-    question: str = Form(...),
-    age: Optional[int] = Form(None),
-    monthly_salary: Optional[float] = Form(None),
-    risk_appetite: Optional[str] = Form(None)
-):
-    """
-    Ask a financial question to the advisor.
+# ============================================================================
+# PROMPT BUILDING HELPERS
+# ============================================================================
+
+def build_full_question(
+    question: str,
+    age: Optional[int] = None,
+    monthly_salary: Optional[float] = None,
+    risk_appetite: Optional[str] = None,
+    resolved: Optional[SymbolMatch] = None,
+    data_context: Optional[str] = None,
+    full_analysis: bool = False,
+    history_context: Optional[str] = None,
+    conversation: Optional[str] = None
+) -> str:
+    """Turn the user's question and optional investor profile into the agent prompt."""
+    has_profile = bool(age or monthly_salary or risk_appetite)
     
-    You can provide investor profile information (age, salary, risk appetite)
-    to get personalized advice.
-    """
-    try:
-        # Detect if question is just a stock name (simple detection)
-        question_clean = question.strip().upper()
-        question_lower = question.strip().lower()
-        question_words = question.split()
-        
-        # Check if it's likely just a stock name
-        question_words_lower = [w.lower() for w in question_words]
-        has_question_words = any(word in question_lower for word in ['what', 'should', 'tell', 'analyze', 'give', 'how', 'why', 'when', 'where', 'explain', 'recommend', 'advice', 'is', 'are', 'does', 'do', 'can', 'will'])
-        
-        is_stock_name_only = (
-            len(question_words) <= 3 and 
-            not has_question_words and
-            not question_lower.startswith('?')
-        )
-        
-        # If it looks like just a stock name, create a full analysis prompt
-        if is_stock_name_only:
-            stock_name = question.strip()
-            full_question = f"""Do a complete financial analysis of {stock_name} stock.
+    # Just a stock name: ask for the full analysis
+    if full_analysis:
+        stock_name = f"{resolved.name} ({resolved.symbol})" if resolved else question.strip()
+        profile_item = "\n8. Personalized investment plan" if has_profile else ""
+        full_question = f"""Do a complete financial analysis of {stock_name} stock.
 
 Provide a full analysis following the required format including:
 1. Financial performance and ratios
@@ -80,71 +312,542 @@ Provide a full analysis following the required format including:
 4. Management and strategy
 5. Big picture factors
 6. Future projections
-7. Investment recommendation
-8. Personalized investment plan (if investor profile provided)
+7. Investment recommendation{profile_item}
 
 Determine if this stock is suitable for the investor and provide detailed financial data analysis."""
+    else:
+        full_question = question
+    
+    # Hand over the data (or at least the ticker) we already have
+    if data_context:
+        full_question += "\n\n" + data_context
+    elif resolved:
+        full_question += (
+            f"\n\nResolved stock symbol: {resolved.symbol} ({resolved.name}). "
+            "Use this symbol directly with the YFinanceTools - do not search for the ticker."
+        )
+    if history_context:
+        full_question += "\n\n" + history_context
+    if conversation:
+        full_question += "\n\n" + conversation
+    
+    # Add the investor profile with its allocation already worked out
+    if has_profile:
+        full_question += build_profile_text(age, monthly_salary, risk_appetite)
+    
+    return full_question
+
+
+def build_profile_text(age: Optional[int], monthly_salary: Optional[float], risk_appetite: Optional[str]) -> str:
+    """The investor profile block, with its allocation already worked out."""
+    profile_parts = []
+    if age:
+        profile_parts.append(f"Age: {age} years")
+    if monthly_salary:
+        profile_parts.append(f"Monthly Salary: ₹{monthly_salary:,.0f}")
+    if risk_appetite:
+        profile_parts.append(f"Risk Appetite: {risk_appetite.upper()}")
+    
+    profile_text = "\n\nIMPORTANT: Investor Profile provided - Provide personalized investment allocation:\n"
+    profile_text += "\n".join(f"- {part}" for part in profile_parts)
+    profile_text += "\n\n" + format_allocation(allocate_profile(age, monthly_salary, risk_appetite))
+    profile_text += "\n\nUse these numbers for the allocation and SIP recommendation,"
+    profile_text += " and determine if this stock suits the investor's profile."
+    return profile_text
+
+
+def build_section_question(
+    number: str,
+    resolved: SymbolMatch,
+    data: dict,
+    age: Optional[int] = None,
+    monthly_salary: Optional[float] = None,
+    risk_appetite: Optional[str] = None
+) -> str:
+    """Prompt for rewriting one report section (or the "intro"), with only the data that section uses."""
+    part = "the introduction" if number == "intro" else f"section {number}"
+    question = (f"Write {part} of the complete financial analysis of {resolved.name} "
+                f"({resolved.symbol}) stock.\n\n" + build_data_context(data, parts=SECTION_DATA[number]))
+    if number in ("7", "8") and (age or monthly_salary or risk_appetite):
+        question += build_profile_text(age, monthly_salary, risk_appetite)
+    return question
+
+
+def extract_answer(response) -> str:
+    """Get the markdown answer out of an agent response."""
+    try:
+        if hasattr(response, 'content'):
+            return response.content
+        elif hasattr(response, 'text'):
+            return response.text
+        elif isinstance(response, str):
+            return response
+        else:
+            return str(response)
+    except Exception as extract_error:
+        print(f"Error extracting response content: {str(extract_error)}")
+        return str(response) if response else "Error: Could not extract response content"
+
+
+async def prepare_request(
+    question: str,
+    age: Optional[int],
+    monthly_salary: Optional[float],
+    risk_appetite: Optional[str],
+    debug: bool = False,
+    session: Optional[dict] = None
+) -> dict:
+    """
+    Start the request trace, classify the question, build the prompt and
+    pick the agent pool.
+    
+    - price / fundamentals lookups are answered right here from cached
+      yfinance data (`answer` is set and no agent runs)
+    - full analyses of a known stock take the pre-fetch pipeline: all data is
+      fetched concurrently and a tool-less agent writes the report in one LLM call;
+      the news and search items are trimmed until the prompt fits CONTEXT_TOKEN_BUDGET
+    - advice goes to the tool-equipped agent, or to the pure LLM agent when
+      it needs no market data
+    - in a session, follow-ups resolve "it" to the previous stock, advice on
+      a stock the session fetched recently is written by the tool-less agent
+      from that (cached) data, and the summarized history goes in the prompt
+    
+    Before any of the LLM pipelines the response cache is asked: a cached
+    answer, or the answer of an identical run already in flight, is returned
+    as `answer` with `served` set to "cached" or "coalesced". Otherwise this
+    request may be the leader of its key and must end with release_flight().
+    """
+    started = time.perf_counter()
+    trace = start_trace()
+    has_profile = bool(age or monthly_salary or risk_appetite)
+    with span("prepare", "classify"):
+        route = classify(question, has_profile, previous_route(session))
+    if session is not None:
+        # The session's profile fills in what this request left out (after
+        # classifying, so a price lookup in a session stays a lookup)
+        age, monthly_salary, risk_appetite = merge_profile(session, age, monthly_salary, risk_appetite)
+        has_profile = bool(age or monthly_salary or risk_appetite)
+    resolved = route.match
+    timings = {}
+    request = {
+        "intent": route.intent,
+        "resolved": resolved,
+        "answer": None,
+        "pipeline": "unknown",
+        "served": FRESH,
+        "fallback_from": None,
+        "flight": Flight(FRESH, None),
+        "instructions": None,
+        "context": None,
+        "report": None,
+        "session": session,
+        "profile": (age, monthly_salary, risk_appetite),
+        "timings": timings,
+        "started": started,
+        "trace": trace,
+        "debug": debug or TRACE_DEBUG,
+    }
+    
+    if route.intent not in (FULL_ANALYSIS, ADVICE):
+        try:
+            with span("prepare", "lookup"):
+                request["answer"] = await answer_lookup(route)
+        except Exception as e:
+            print(f"Error in fast-path lookup: {str(e)}")
+        if request["answer"]:
+            request["pipeline"] = "fast_path"
+            timings["prepare_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return request
+    
+    # Full analyses stand on their own; follow-ups get the conversation so far
+    conversation = render_history(session) if session is not None and route.intent != FULL_ANALYSIS else None
+    with span("prepare", "response_cache"):
+        flight = await response_cache.acquire(
+            response_cache.key(route, question, age, monthly_salary, risk_appetite, conversation)
+        )
+    request["flight"], request["served"] = flight, flight.served
+    if flight.entry is not None:
+        request["answer"], request["pipeline"] = flight.entry["answer"], flight.entry["pipeline"]
+        timings["prepare_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return request
+    
+    try:
+        # A follow-up on a stock this session fetched a moment ago is answered from that data
+        session_data = (session is not None and resolved is not None and route.intent == ADVICE
+                        and has_recent_data(session, resolved.symbol, SESSION_DATA_MAX_AGE_MINUTES * 60))
+        data = None
+        if PREFETCH_ENABLED and resolved and (route.intent == FULL_ANALYSIS or session_data):
+            with span("prepare", "prefetch"):
+                data = await prefetch_stock_data(resolved)
+            timings["prefetch_ms"] = data["timings_ms"]
+            if session is not None:
+                remember_data(session, resolved.symbol, DATA_PARTS, data["fetched_at"].timestamp())
+        
+        # The tool agent gets the stored history too (only missing days are downloaded)
+        history_context = None
+        if resolved and data is None:
+            with span("prepare", "history"):
+                history = await prefetch_stock_data(resolved, sources=("history",))
+            if isinstance(history["raw"]["history"], dict):
+                history_context = format_history(history["raw"]["history"])
+            timings["history_ms"] = history["timings_ms"]["history"]
+        
+        if data is not None:
+            request["pool"] = analyst_pool
+            request["pipeline"] = "prefetch" if route.intent == FULL_ANALYSIS else "session_data"
+        elif route.intent == ADVICE and not needs_market_data(question, route):
+            request["pool"], request["pipeline"] = pure_pool, "pure_llm"
         else:
-            full_question = question
+            request["pool"], request["pipeline"] = advisor_pool, "agent_tools"
+        
+        if data is not None and REPORT_STORE_ENABLED and route.intent == FULL_ANALYSIS:
+            with span("prepare", "report_store") as current:
+                plan = report_store.plan(
+                    resolved.symbol, data_versions(data, profile_bucket(age, monthly_salary, risk_appetite)), has_profile
+                )
+                plan["written"] = {}
+                if plan["parts"] and "sources" not in plan["parts"]:
+                    plan["written"]["sources"] = format_sources(data)
+                current.attrs.update(reused=len(plan["parts"]), stale=len(plan["stale"]))
+            request["report"] = plan
+            if not plan["stale"]:
+                # Every section is still current: no LLM call at all
+                request["answer"] = assemble({**plan["parts"], **plan["written"]}, has_profile)
+                request["pipeline"] = "report_store"
+                request["context"] = {"budget_tokens": CONTEXT_TOKEN_BUDGET, "prompt_tokens_estimate": 0, "compaction_level": 0}
+                report_store.count(reused=len(plan["parts"]), assembled=1)
+                release_flight(request, request["answer"])
+                timings["prepare_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return request
+            if len(plan["stale"]) <= REPORT_MAX_SECTION_CALLS and plan["parts"]:
+                request["pipeline"] = "report_sections"
         
-        # Add investor profile instructions if provided
-        if age or monthly_salary or risk_appetite:
-            profile_parts = []
-            if age:
-                profile_parts.append(f"Age: {age} years")
-            if monthly_salary:
-                profile_parts.append(f"Monthly Salary: ₹{monthly_salary:,.0f}")
-            if risk_appetite:
-                profile_parts.append(f"Risk Appetite: {risk_appetite.upper()}")
+        with span("prepare", "build_prompt") as current:
+            if request["pipeline"] == "report_sections":
+                # One small prompt per stale section, each with only the data it uses
+                request["full_question"] = None
+                request["section_prompts"] = {
+                    number: (
+                        build_section_question(number, resolved, data, age, monthly_salary, risk_appetite),
+                        build_section_instructions(number),
+                    )
+                    for number in request["report"]["stale"]
+                }
+                request["context"] = {
+                    "budget_tokens": CONTEXT_TOKEN_BUDGET,
+                    "prompt_tokens_estimate": sum(
+                        estimate_tokens(q) + estimate_tokens("\n".join(i)) for q, i in request["section_prompts"].values()
+                    ),
+                    "compaction_level": 0,
+                }
+                current.attrs.update(request["context"])
+                timings["prepare_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return request
             
-            profile_text = "\n\nIMPORTANT: Investor Profile provided - Provide personalized investment allocation:\n"
-            profile_text += "\n".join(f"- {part}" for part in profile_parts)
-            profile_text += "\n\nBased on this profile, calculate and recommend:"
-            profile_text += "\n1. Total monthly investment capacity (use financial planning frameworks)"
-            profile_text += "\n2. Risk-based asset allocation (equity vs debt)"
-            profile_text += "\n3. Specific allocation for this stock (diversification limits)"
-            profile_text += "\n4. SIP recommendation for this stock"
-            profile_text += "\n5. Determine if this stock suits the investor's profile"
-            profile_text += "\n6. Show calculations and framework used"
+            # The pure agent's instructions are short already
+            if request["pipeline"] != "pure_llm":
+                request["instructions"] = build_instructions(data is not None, has_profile)
+            instruction_tokens = estimate_tokens("\n".join(request["instructions"] or []))
             
-            full_question = full_question + profile_text
+            def build(level: dict) -> str:
+                return build_full_question(
+                    question, age, monthly_salary, risk_appetite, resolved,
+                    build_data_context(data, level) if data is not None else None,
+                    full_analysis=route.intent == FULL_ANALYSIS, history_context=history_context,
+                    conversation=conversation
+                )
+            
+            if data is not None:
+                request["full_question"], level = fit_to_budget(build, CONTEXT_TOKEN_BUDGET - instruction_tokens)
+            else:
+                request["full_question"], level = build(COMPACTION_LEVELS[0]), 0
+            request["context"] = {
+                "budget_tokens": CONTEXT_TOKEN_BUDGET,
+                "prompt_tokens_estimate": instruction_tokens + estimate_tokens(request["full_question"]),
+                "compaction_level": level,
+            }
+            current.attrs.update(request["context"])
+    except BaseException:
+        release_flight(request)
+        raise
+    timings["prepare_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return request
+
+
+def finish_timings(request: dict, agent_started: Optional[float] = None) -> dict:
+    timings = request["timings"]
+    now = time.perf_counter()
+    timings["total_ms"] = round((now - request["started"]) * 1000, 1)
+    if agent_started is None:
+        print(f"[{request['pipeline']}] answered in {timings['total_ms']:.1f} ms (no LLM call)")
+        return timings
+    timings["agent_ms"] = round((now - agent_started) * 1000, 1)
+    print(f"[{request['pipeline']}] answered in {timings['total_ms']:.0f} ms "
+          f"(agent {timings['agent_ms']:.0f} ms)")
+    return timings
+
+
+def release_flight(request: dict, answer: Optional[str] = None):
+    """
+    Hand the leader's answer (None on failure) to identical requests waiting
+    on it, and cache it. Full analyses also go to the report store by section.
+    """
+    response_cache.release(request["flight"], answer, request["pipeline"])
+    if answer and request["report"] is not None:
+        save_report(request, answer)
+
+
+def save_report(request: dict, answer: str):
+    plan = request["report"]
+    if request["pipeline"] == "prefetch":
+        parts = split_report(answer, plan["has_profile"])
+        if parts is None:
+            print(f"Report for {plan['symbol']} not stored: sections not found in the answer")
+            return
+        report_store.count(regenerated=len(plan["stale"]))
+    else:
+        parts = plan["written"]
+    report_store.save(plan["symbol"], plan["versions"], parts)
+
+
+def can_fall_back(request: dict, error: Exception) -> bool:
+    return (FALLBACK_TO_PURE and request["pipeline"] == "agent_tools"
+            and (isinstance(error, LLMUnavailableError) or is_tool_call_error(error)))
+
+
+def fall_back_to_pure(request: dict, error: Exception):
+    print(f"[agent_tools] failed ({str(error)}), answering with the pure LLM agent")
+    LLM_FALLBACKS.inc(source="agent_tools", target="pure_llm")
+    request["fallback_from"] = request["pipeline"]
+    request["pool"], request["pipeline"], request["instructions"] = pure_pool, "pure_llm", None
+
+
+async def run_pipeline(request: dict):
+    """The agent run of a prepared request, or the section rewrites of a stored report."""
+    if request["pipeline"] == "report_sections":
+        return await regenerate_sections(request)
+    try:
+        return await request["pool"].submit(
+            lambda agent: run_agent(agent, request["full_question"], request["instructions"])
+        )
+    except Exception as e:
+        if not can_fall_back(request, e):
+            raise
+        fall_back_to_pure(request, e)
+    return await pure_pool.submit(lambda agent: run_agent(agent, request["full_question"]))
+
+
+async def stream_pipeline(request: dict):
+    """Streaming run_pipeline: falls back to the pure agent only while no answer text has been sent."""
+    answered = False
+    try:
+        async for chunk in request["pool"].stream(
+            lambda agent: stream_agent(
+                agent, request["full_question"], request["instructions"], stream_intermediate_steps=True
+            )
+        ):
+            if getattr(chunk, "event", RunEvent.run_response.value) == RunEvent.run_response.value and chunk.content:
+                answered = True
+            yield chunk
+        return
+    except Exception as e:
+        if answered or not can_fall_back(request, e):
+            raise
+        fall_back_to_pure(request, e)
+    async for chunk in pure_pool.stream(lambda agent: stream_agent(agent, request["full_question"])):
+        yield chunk
+
+
+async def regenerate_sections(request: dict) -> str:
+    """Rewrite the stale sections (concurrently, one small LLM call each) and reassemble the report."""
+    plan = request["report"]
+    
+    async def write(number: str) -> str:
+        question, instructions = request["section_prompts"][number]
+        with span("agent", f"section_{number}"):
+            response = await analyst_pool.submit(lambda agent: run_agent(agent, question, instructions))
+        return section_text(number, extract_answer(response), SECTION_HEADINGS.get(number))
+    
+    texts = await asyncio.gather(*(write(number) for number in plan["stale"]))
+    plan["written"].update(zip(plan["stale"], texts))
+    report_store.count(reused=len(plan["parts"]), regenerated=len(plan["stale"]))
+    return assemble({**plan["parts"], **plan["written"]}, plan["has_profile"])
+
+
+def record_request(request: dict, endpoint: str, status: str = "ok"):
+    finish_trace(request["trace"], endpoint, request["pipeline"], request["intent"], status)
+
+
+def answer_payload(question: str, request: dict, answer: str, timings: dict) -> dict:
+    """Body of a successful answer, shared by /api/ask and the stream's `done` event."""
+    context = dict(request["context"] or {})
+    context["tokens_saved"] = {**request["trace"].tokens_saved, "total": sum(request["trace"].tokens_saved.values())}
+    if request["report"] is not None:
+        context["report_sections"] = {
+            "reused": sorted(p for p in request["report"]["parts"] if p.isdigit()),
+            "regenerated": request["report"]["stale"] if request["pipeline"] != "report_store" else [],
+        }
+    payload = {
+        "success": True,
+        "message": "Question answered successfully",
+        "question": question,
+        "answer": answer,
+        "intent": request["intent"],
+        "resolved_symbol": resolved_symbol_dict(request["resolved"]),
+        "investor_profile": investor_profile_dict(*request["profile"]),
+        "pipeline": request["pipeline"],
+        "served": request["served"],
+        "context": context,
+        "timings": timings
+    }
+    if request["fallback_from"]:
+        payload["fallback_from"] = request["fallback_from"]
+    if request["session"] is not None:
+        payload["session_id"] = request["session"]["id"]
+    if request["debug"]:
+        payload["trace"] = request["trace"].to_dict()
+    return payload
+
+
+def resolved_symbol_dict(resolved: Optional[SymbolMatch]) -> Optional[dict]:
+    if resolved is None:
+        return None
+    return {"symbol": resolved.symbol, "name": resolved.name, "match_type": resolved.match_type}
+
+
+def investor_profile_dict(age, monthly_salary, risk_appetite) -> Optional[dict]:
+    if age or monthly_salary or risk_appetite:
+        return {
+            "age": age,
+            "monthly_salary": monthly_salary,
+            "risk_appetite": risk_appetite
+        }
+    return None
+
+
+def busy_response(busy_error) -> JSONResponse:
+    """503 with Retry-After, for a full agent pool (PoolBusyError) or no LLM endpoint answering (LLMUnavailableError)."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(busy_error.retry_after)},
+        content={
+            "success": False,
+            "message": "The advisor is busy right now. Please try again shortly.",
+            "error_details": str(busy_error),
+            "answer": None
+        }
+    )
+
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+# The store reads and writes SQLite, so its calls run in a thread, off the event loop
+
+async def open_session(session_id: Optional[str]) -> Optional[dict]:
+    """The session for `session_id` (a new one if unknown), or None without a valid id."""
+    if not SESSIONS_ENABLED or not valid_session_id(session_id):
+        return None
+    return await asyncio.to_thread(session_store.get, session_id)
+
+
+def previous_route(session: Optional[dict]) -> Optional[Route]:
+    if session is None or not session["turns"]:
+        return None
+    return Route(last_intent(session), last_symbol(session))
+
+
+async def finish_session(request: dict, question: str, answer: str):
+    """Remember the answered question (and its stock) in the request's session."""
+    session = request["session"]
+    if session is None:
+        return
+    resolved = request["resolved"]
+    remember_symbol(session, resolved)
+    add_turn(session, question, answer, request["intent"], resolved.symbol if resolved else None,
+             request["pipeline"], SESSION_HISTORY_TOKENS)
+    await asyncio.to_thread(session_store.save, session)
+
+
+# ============================================================================
+# ENDPOINTS
+# ============================================================================
+
+@app.post("/api/ask")
+async def ask_question(
+    question: str = Form(...),
+    age: Optional[int] = Form(None),
+    monthly_salary: Optional[float] = Form(None),
+    risk_appetite: Optional[str] = Form(None),
+    debug: bool = Form(False),
+    session_id: Optional[str] = Form(None)
+):
+    """
+    Ask a financial question to the advisor.
+    
+    You can provide investor profile information (age, salary, risk appetite)
+    to get personalized advice. With `debug=true` the response includes a
+    `trace` of every phase (tools, LLM calls, tokens). With a `session_id`
+    (8-64 letters, digits, - or _) follow-up questions reuse the profile,
+    the stocks and the data of the earlier questions.
+    """
+    request = None
+    try:
+        request = await prepare_request(question, age, monthly_salary, risk_appetite, debug, await open_session(session_id))
+        if request["answer"]:
+            # No flight held: the answer came from a cache or was released with it
+            cache_warmer.observe(request["resolved"])
+            timings = finish_timings(request)
+            record_request(request, "ask")
+            await finish_session(request, question, request["answer"])
+            return JSONResponse(
+                status_code=200,
+                content=answer_payload(question, request, request["answer"], timings)
+            )
         
-        # Get response from financial advisor
+        # Get response from financial advisor (runs on a pooled agent, off the event loop)
+        answer = None
         try:
-            response = financial_advisor.run(full_question)
+            # Inside the try, so the flight is released even if this fails
+            cache_warmer.observe(request["resolved"])
+            agent_started = time.perf_counter()
+            with span("agent", request["pipeline"]):
+                response = await run_pipeline(request)
+            with span("extract", "answer"):
+                answer = extract_answer(response)
+        except PoolBusyError as busy_error:
+            record_request(request, "ask", "busy")
+            return busy_response(busy_error)
+        except LLMUnavailableError as llm_error:
+            record_request(request, "ask", "llm_unavailable")
+            return busy_response(llm_error)
+        except asyncio.TimeoutError:
+            record_request(request, "ask", "timeout")
+            return JSONResponse(
+                status_code=504,
+                content={
+                    "success": False,
+                    "message": f"The advisor did not answer within {REQUEST_TIMEOUT:.0f} seconds. Please try again.",
+                    "error_details": "timeout",
+                    "answer": None
+                }
+            )
         except Exception as agent_error:
             print(f"Error in financial_advisor.run: {str(agent_error)}")
             import traceback
             print(traceback.format_exc())
             raise agent_error
+        finally:
+            release_flight(request, answer)
         
-        # Extract content from response
-        try:
-            if hasattr(response, 'content'):
-                answer = response.content
-            elif hasattr(response, 'text'):
-                answer = response.text
-            elif isinstance(response, str):
-                answer = response
-            else:
-                answer = str(response)
-        except Exception as extract_error:
-            print(f"Error extracting response content: {str(extract_error)}")
-            answer = str(response) if response else "Error: Could not extract response content"
+        timings = finish_timings(request, agent_started)
+        record_request(request, "ask")
+        await finish_session(request, question, answer)
         
         return JSONResponse(
             status_code=200,
-            content={
-                "success": True,
-                "message": "Question answered successfully",
-                "question": question,
-                "answer": answer,
-                    "investor_profile": {
-                        "age": age,
-                        "monthly_salary": monthly_salary,
-                    "risk_appetite": risk_appetite
-                } if (age or monthly_salary or risk_appetite) else None
-            }
+            content=answer_payload(question, request, answer, timings)
         )
         
     except Exception as e:
@@ -152,6 +855,8 @@ Determine if this stock is suitable for the investor and provide detailed financ
         error_details = traceback.format_exc()
         print(f"Error in ask_question: {str(e)}")
         print(f"Traceback: {error_details}")
+        if request is not None:
+            record_request(request, "ask", "error")
         return JSONResponse(
             status_code=500,
             content={
@@ -163,9 +868,373 @@ Determine if this stock is suitable for the investor and provide detailed financ
         )
 
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(
+    question: str = Form(...),
+    age: Optional[int] = Form(None),
+    monthly_salary: Optional[float] = Form(None),
+    risk_appetite: Optional[str] = Form(None),
+    debug: bool = Form(False),
+    session_id: Optional[str] = Form(None)
+):
+    """
+    Same as /api/ask, but streams the answer as Server-Sent Events:
+    
+    - `status`: progress messages (run started)
+    - `tool`: a tool call started or completed (yfinance / DuckDuckGo)
+    - `token`: the next piece of the markdown answer
+    - `done`: the full answer, same fields as /api/ask
+    - `error`: the run failed, timed out or the advisor is busy
+    """
+    async def event_stream():
+        # Send something right away so the client sees the connection open
+        yield sse_event("status", {"message": "Getting answer from financial advisor..."})
+        
+        try:
+            request = await prepare_request(question, age, monthly_salary, risk_appetite, debug, await open_session(session_id))
+        except Exception as e:
+            import traceback
+            print(f"Error in ask_question_stream: {str(e)}")
+            print(traceback.format_exc())
+            yield sse_event("error", {"message": f"Error processing question: {str(e)}"})
+            return
+        
+        answer = None
+        answer_parts = []
+        try:
+            cache_warmer.observe(request["resolved"])
+            if request["answer"]:
+                timings = finish_timings(request)
+                record_request(request, "ask_stream")
+                await finish_session(request, question, request["answer"])
+                yield sse_event("token", {"text": request["answer"]})
+                yield sse_event("done", answer_payload(
+                    question, request, request["answer"], timings
+                ))
+                return
+            
+            if request["pipeline"] == "prefetch":
+                yield sse_event("status", {"message": f"Market data collected, writing analysis of {request['resolved'].name}..."})
+            
+            agent_started = time.perf_counter()
+            if request["pipeline"] == "report_sections":
+                stale = request["report"]["stale"]
+                yield sse_event("status", {"message": f"Updating section{'s' if len(stale) > 1 else ''} "
+                                                      f"{', '.join(stale)} of the stored analysis..."})
+                with span("agent", request["pipeline"]):
+                    answer_parts.append(await regenerate_sections(request))
+                yield sse_event("token", {"text": answer_parts[0]})
+            else:
+                with span("agent", request["pipeline"], stream=True):
+                    async for chunk in stream_pipeline(request):
+                        event = getattr(chunk, "event", RunEvent.run_response.value)
+                        if event == RunEvent.run_response.value:
+                            if chunk.content:
+                                answer_parts.append(chunk.content)
+                                yield sse_event("token", {"text": chunk.content})
+                        elif event in (RunEvent.tool_call_started.value, RunEvent.tool_call_completed.value):
+                            yield sse_event("tool", {
+                                "status": "started" if event == RunEvent.tool_call_started.value else "completed",
+                                "call": chunk.content
+                            })
+            with span("extract", "answer"):
+                answer = "".join(answer_parts)
+            timings = finish_timings(request, agent_started)
+            record_request(request, "ask_stream")
+            await finish_session(request, question, answer)
+            yield sse_event("done", answer_payload(
+                question, request, answer, timings
+            ))
+        except (PoolBusyError, LLMUnavailableError) as busy_error:
+            record_request(request, "ask_stream", "busy" if isinstance(busy_error, PoolBusyError) else "llm_unavailable")
+            yield sse_event("error", {
+                "message": "The advisor is busy right now. Please try again shortly.",
+                "retry_after": busy_error.retry_after
+            })
+        except asyncio.TimeoutError:
+            record_request(request, "ask_stream", "timeout")
+            yield sse_event("error", {
+                "message": f"The advisor did not answer within {REQUEST_TIMEOUT:.0f} seconds. Please try again."
+            })
+        except Exception as e:
+            import traceback
+            print(f"Error in ask_question_stream: {str(e)}")
+            print(traceback.format_exc())
+            record_request(request, "ask_stream", "error")
+            yield sse_event("error", {"message": f"Error processing question: {str(e)}"})
+        finally:
+            # Also runs when the client disconnects, so waiters are never left hanging
+            release_flight(request, answer)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ============================================================================
+# WATCHLIST BATCH JOBS
+# ============================================================================
+
+def build_batch_prompt(match: SymbolMatch, data: dict, profile: dict) -> Tuple[str, List[str]]:
+    """Question and instructions for one ticker, fitted to CONTEXT_TOKEN_BUDGET like /api/ask."""
+    instructions = build_instructions(True, bool(profile))
+    instruction_tokens = estimate_tokens("\n".join(instructions))
+    
+    def build(level: dict) -> str:
+        return build_full_question(
+            match.code,
+            profile.get("age"),
+            profile.get("monthly_salary"),
+            profile.get("risk_appetite"),
+            resolved=match,
+            data_context=build_data_context(data, level),
+            full_analysis=True
+        )
+    
+    question, _ = fit_to_budget(build, CONTEXT_TOKEN_BUDGET - instruction_tokens)
+    return question, instructions
+
+
+async def run_batch_agent(prompt: Tuple[str, List[str]]) -> str:
+    question, instructions = prompt
+    return extract_answer(await analyst_pool.submit(lambda agent: run_agent(agent, question, instructions)))
+
+
+batch_scheduler = BatchScheduler(
+    build_prompt=build_batch_prompt,
+    run_agent=run_batch_agent,
+    max_concurrency=BATCH_MAX_CONCURRENCY,
+    groq_requests_per_minute=GROQ_REQUESTS_PER_MINUTE,
+    yfinance_requests_per_second=YFINANCE_REQUESTS_PER_SECOND,
+)
+
+
+@app.post("/api/batch")
+async def start_batch(batch: BatchRequest):
+    """
+    Analyze a whole watchlist in the background.
+    
+    Send `{"tickers": ["TCS", "Reliance", "INFY.NS"]}` or
+    `{"watchlist": "NIFTY50"}`, optionally with age, monthly_salary and
+    risk_appetite. Poll GET /api/batch/{job_id} or stream
+    GET /api/batch/{job_id}/stream for per-ticker results.
+    """
+    tickers = list(batch.tickers or [])
+    if batch.watchlist:
+        if batch.watchlist.replace(" ", "").upper() != "NIFTY50":
+            return JSONResponse(
+                status_code=400,
+                content={"success": False, "message": f"Unknown watchlist '{batch.watchlist}' (supported: NIFTY50)"}
+            )
+        tickers += get_symbol_index().nifty50()
+    if not tickers:
+        return JSONResponse(status_code=400, content={"success": False, "message": "No tickers given"})
+    if len(tickers) > BATCH_MAX_TICKERS:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": f"At most {BATCH_MAX_TICKERS} tickers per batch"}
+        )
+    
+    profile = {
+        key: value for key, value in (
+            ("age", batch.age), ("monthly_salary", batch.monthly_salary), ("risk_appetite", batch.risk_appetite)
+        ) if value
+    }
+    job = batch_scheduler.submit(tickers, profile)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "job_id": job.id,
+            "total": len(job.tickers),
+            "status_url": f"/api/batch/{job.id}",
+            "stream_url": f"/api/batch/{job.id}/stream"
+        }
+    )
+
+
+@app.get("/api/batch/{job_id}")
+async def get_batch(job_id: str):
+    job = batch_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Batch job not found"})
+    return {"success": True, **job.summary()}
+
+
+@app.get("/api/batch/{job_id}/stream")
+async def stream_batch(job_id: str):
+    """Server-Sent Events: one `result` per ticker as it finishes, then `done`."""
+    job = batch_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Batch job not found"})
+    
+    async def event_stream():
+        async for result in job.follow():
+            yield sse_event("result", result)
+        yield sse_event("done", job.summary(include_results=False))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ============================================================================
+# CACHE WARMER
+# ============================================================================
+
+async def warm_analysis(match: SymbolMatch):
+    """Full analysis (no profile) of `match` into the response cache, unless one is there already."""
+    request = await prepare_request(match.code, None, None, None)
+    if request["answer"]:
+        return
+    answer = None
+    status = "error"
+    try:
+        answer = extract_answer(await run_pipeline(request))
+        status = "ok"
+    except PoolBusyError:
+        status = "busy"
+        raise
+    finally:
+        release_flight(request, answer)
+        record_request(request, "warmer", status)
+
+
+cache_warmer = CacheWarmer(
+    analyze=warm_analysis,
+    max_symbols=CACHE_WARMER_SYMBOLS,
+    price_symbols=CACHE_WARMER_PRICE_SYMBOLS,
+    analysis_symbols=CACHE_WARMER_ANALYSES if response_cache.enabled else 0,
+    analysis_interval=RESPONSE_CACHE_WINDOW,
+    max_concurrency=CACHE_WARMER_CONCURRENCY,
+    yfinance_requests_per_second=CACHE_WARMER_YFINANCE_RPS,
+    market_hours_only=CACHE_WARMER_MARKET_HOURS,
+    # Only one worker warms; they share the lease in the tool cache's SQLite file
+    lease=WarmerLease(os.getenv("TOOL_CACHE_DB") or DEFAULT_LEASE_PATH),
+)
+
+
+PROFILE_FIELDS = {"age", "monthly_salary", "risk_appetite"}
+
+
+@app.post("/api/allocate")
+async def allocate_profiles(request: Request, format: str = "json"):
+    """
+    Work out the personalized allocation (Section 8 numbers) for many investor
+    profiles at once, without the LLM.
+    
+    Send either JSON - `{"profiles": [{"age": 30, "monthly_salary": 300000,
+    "risk_appetite": "moderate"}, ...]}`, a plain list or one profile - or a CSV body
+    (Content-Type: text/csv, columns age,monthly_salary,risk_appetite).
+    Use `?format=csv` to get CSV back.
+    """
+    started = time.perf_counter()
+    try:
+        content_type = request.headers.get("content-type", "")
+        body = await request.body()
+        if "csv" in content_type:
+            profiles = read_profiles_csv(body)
+        else:
+            payload = json.loads(body or b"[]")
+            if isinstance(payload, dict):
+                if "profiles" in payload:
+                    payload = payload["profiles"]
+                elif PROFILE_FIELDS & set(payload):
+                    payload = [payload]  # a single profile
+                else:
+                    raise ValueError('expected {"profiles": [...]}, a list of profiles or one profile')
+            if not isinstance(payload, list):
+                raise ValueError("profiles must be a list")
+            profiles = pd.DataFrame.from_records(payload)
+    except Exception as e:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": f"Could not read profiles: {str(e)}"}
+        )
+    
+    allocations = allocate(profiles)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    
+    if format == "csv":
+        return Response(
+            content=allocations.to_csv(index=False),
+            media_type="text/csv",
+            headers={"X-Elapsed-Ms": str(elapsed_ms)}
+        )
+    return Response(
+        content=json.dumps({
+            "success": True,
+            "count": len(allocations),
+            "elapsed_ms": elapsed_ms,
+            # to_json turns NaN into null
+            "allocations": json.loads(allocations.to_json(orient="records"))
+        }),
+        media_type="application/json"
+    )
+
+
+@app.get("/api/session/{session_id}")
+async def get_session(session_id: str):
+    """What a session remembers: the profile, the stocks and the summarized history."""
+    session = await asyncio.to_thread(session_store.find, session_id) if valid_session_id(session_id) else None
+    if session is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Session not found"})
+    return {
+        "success": True,
+        "session_id": session["id"],
+        "profile": session["profile"] or None,
+        "symbols": [s["symbol"] for s in session["symbols"]],
+        "turns": len(session["turns"]),
+        "history": render_history(session),
+    }
+
+
+@app.delete("/api/session/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a session (the frontend's "New conversation")."""
+    deleted = valid_session_id(session_id) and await asyncio.to_thread(session_store.delete, session_id)
+    return {"success": True, "deleted": bool(deleted)}
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Prometheus text format: request/phase latency histograms, LLM tokens, tool-call turns, pools, cache."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "service": "Financial Advisor"}
+    uptime = round(time.time() - worker_state["ready_at"], 1) if worker_state["ready_at"] else None
+    return {
+        "status": "healthy",
+        "service": "Financial Advisor",
+        "worker": dict(worker_state, uptime_seconds=uptime),
+        "pools": {
+            "advisor": advisor_pool.stats(),
+            "analyst": analyst_pool.stats(),
+            "pure": pure_pool.stats()
+        },
+        "tool_cache": tool_cache.stats(),
+        "llm": get_llm_client().stats(),
+        "response_cache": response_cache.stats(),
+        "report_store": report_store.stats(),
+        "sessions": session_store.stats(),
+        "history": get_history_store().stats(),
+        "batch": batch_scheduler.stats(),
+        "cache_warmer": cache_warmer.stats()
+    }
+
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 
 if __name__ == "__main__":
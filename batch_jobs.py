@@ -0,0 +1,227 @@
+"""
+Watchlist Batch Analysis
+
+Runs the full analysis for a whole watchlist (e.g. all NIFTY 50 names) as
+one background job instead of one /api/ask call per stock:
+
+- Agent runs are limited by a concurrency cap and a token bucket sized to
+  the Groq request quota; data fetches by a token bucket for yfinance
+- Data for a symbol is fetched once and shared by every job that needs it
+  at the same time (and by later requests through the tool cache)
+- Clients poll the job or stream per-ticker results as they finish
+
+The scheduler doesn't know how prompts are built or agents are run; the API
+passes those in, so this module has no dependency on backend_api.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent_pool import PoolBusyError
+from prefetch import prefetch_stock_data
+from symbol_index import SymbolMatch, get_symbol_index
+
+# yfinance calls made by one prefetch (price, fundamentals, recommendations, news,
+# and the history update - one incremental call once the store is filled)
+YFINANCE_CALLS_PER_PREFETCH = 5
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:  # first come, first served
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class BatchJob:
+    def __init__(self, tickers: List[str], profile: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.tickers = tickers
+        self.profile = profile
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.results: Dict[str, dict] = {t: {"ticker": t, "status": "queued"} for t in tickers}
+        self.completed: List[str] = []  # tickers in the order they finished
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return len(self.completed) == len(self.tickers)
+
+    @property
+    def status(self) -> str:
+        if self.done:
+            return "done"
+        if any(r["status"] != "queued" for r in self.results.values()):
+            return "running"
+        return "queued"
+
+    async def update(self, ticker: str, **fields):
+        async with self._changed:
+            self.results[ticker].update(fields)
+            if fields.get("status") in ("done", "error") and ticker not in self.completed:
+                self.completed.append(ticker)
+                if self.done:
+                    self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def follow(self):
+        """Yield each ticker's result as it finishes, starting with those already done."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.completed) > sent)
+                ready = self.completed[sent:]
+            for ticker in ready:
+                yield self.results[ticker]
+            sent += len(ready)
+            if sent == len(self.tickers):
+                return
+
+    def summary(self, include_results: bool = True) -> dict:
+        finished_at = self.finished_at or time.time()
+        summary = {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.tickers),
+            "completed": len(self.completed),
+            "failed": sum(1 for r in self.results.values() if r["status"] == "error"),
+            "investor_profile": self.profile or None,
+            "elapsed_seconds": round(finished_at - self.created_at, 1),
+        }
+        if include_results:
+            summary["results"] = [self.results[t] for t in self.tickers]
+        return summary
+
+
+class BatchScheduler:
+    def __init__(
+        self,
+        build_prompt: Callable[[SymbolMatch, dict, dict], Any],  # (match, pre-fetched data, profile) -> prompt
+        run_agent: Callable[[Any], Awaitable[str]],
+        max_concurrency: int = 2,
+        groq_requests_per_minute: float = 30,
+        yfinance_requests_per_second: float = 2,
+        max_jobs: int = 50,
+    ):
+        self.build_prompt = build_prompt
+        self.run_agent = run_agent
+        self.max_concurrency = max(1, max_concurrency)
+        self._agent_slots = asyncio.Semaphore(self.max_concurrency)
+        self._groq_bucket = TokenBucket(groq_requests_per_minute / 60.0, capacity=max(1.0, self.max_concurrency))
+        self._yfinance_bucket = TokenBucket(yfinance_requests_per_second, capacity=YFINANCE_CALLS_PER_PREFETCH * 2)
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._max_jobs = max_jobs
+        self._inflight_data: Dict[str, asyncio.Task] = {}
+        self._tasks = set()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+    def submit(self, tickers: List[str], profile: dict) -> BatchJob:
+        # De-duplicate while keeping the caller's order
+        tickers = list(OrderedDict.fromkeys(t.strip() for t in tickers if t and t.strip()))
+        job = BatchJob(tickers, profile)
+        self._jobs[job.id] = job
+        self._evict_old_jobs()
+        for ticker in tickers:
+            task = asyncio.create_task(self._analyze(job, ticker))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(job_id)
+
+    def _evict_old_jobs(self):
+        while len(self._jobs) > self._max_jobs:
+            oldest_done = next((job_id for job_id, job in self._jobs.items() if job.done), None)
+            if oldest_done is None:
+                return
+            del self._jobs[oldest_done]
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._jobs),
+            "running_jobs": sum(1 for job in self._jobs.values() if not job.done),
+            "max_concurrency": self.max_concurrency,
+            "groq_requests_per_minute": round(self._groq_bucket.rate * 60, 1),
+            "yfinance_requests_per_second": self._yfinance_bucket.rate,
+        }
+
+    # ------------------------------------------------------------------
+    # Per-ticker pipeline
+    # ------------------------------------------------------------------
+    async def _fetch_data(self, match: SymbolMatch) -> dict:
+        """Prefetch once per symbol; concurrent jobs wait on the same fetch."""
+        task = self._inflight_data.get(match.symbol)
+        if task is None:
+            async def fetch():
+                try:
+                    await self._yfinance_bucket.acquire(YFINANCE_CALLS_PER_PREFETCH)
+                    return await prefetch_stock_data(match)
+                finally:
+                    self._inflight_data.pop(match.symbol, None)
+
+            task = asyncio.create_task(fetch())
+            self._inflight_data[match.symbol] = task
+        return await asyncio.shield(task)
+
+    async def _analyze(self, job: BatchJob, ticker: str):
+        started = time.perf_counter()
+        match = get_symbol_index().resolve(ticker)
+        if match is None:
+            await job.update(ticker, status="error", error=f"Could not find an NSE/BSE listing for '{ticker}'")
+            return
+
+        try:
+            await job.update(ticker, status="fetching", symbol=match.symbol, name=match.name)
+            data = await self._fetch_data(match)
+            prompt = self.build_prompt(match, data, job.profile)
+
+            async with self._agent_slots:
+                await job.update(ticker, status="analyzing")
+                while True:
+                    await self._groq_bucket.acquire()
+                    try:
+                        answer = await self.run_agent(prompt)
+                        break
+                    except PoolBusyError as busy_error:
+                        # Interactive traffic has the pool; wait our turn
+                        await asyncio.sleep(busy_error.retry_after)
+
+            await job.update(
+                ticker,
+                status="done",
+                answer=answer,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+        except asyncio.CancelledError:
+            # e.g. at shutdown: finish the ticker so followers of the job are not left waiting
+            await job.update(ticker, status="error", error="cancelled")
+            raise
+        except Exception as e:
+            print(f"Error in batch job {job.id} for {ticker}: {str(e)}")
+            await job.update(ticker, status="error", error=str(e))
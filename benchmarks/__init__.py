@@ -0,0 +1,4 @@
+"""
+Offline benchmarks: a fake Groq-compatible LLM server, recorded yfinance and
+DuckDuckGo fixtures and a load generator. See benchmarks/run.py.
+"""
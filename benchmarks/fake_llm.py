@@ -0,0 +1,256 @@
+"""
+Fake OpenAI/Groq-compatible Chat Completions Server
+
+Stands in for Groq during load tests. Point the app at it with
+GROQ_BASE_URL=http://127.0.0.1:<port> (any GROQ_API_KEY works). Serves
+POST /openai/v1/chat/completions (Groq's path) and /v1/chat/completions
+(OpenAI's), streaming or not:
+
+- `latency_ms`: time before the first token (queueing + prompt processing)
+- `tokens_per_second`: generation speed after the first token
+- `completion_tokens`: length of each answer (a canned markdown report)
+- `tool_turns`: when the request offers tools, answer the first N turns of
+  a conversation with tool calls (stock price, fundamentals, ...) like a
+  real tool-using model would
+- `error_rate` / `error_status`: answer that fraction of requests with an
+  error (429 with a Retry-After of `retry_after` seconds by default)
+- `slow_rate` / `slow_ms`: add `slow_ms` to that fraction of requests, a
+  latency tail for testing hedged requests
+
+GET /stats returns request counts and peak concurrency.
+
+    python -m benchmarks.fake_llm --port 9100 --llm-latency-ms 300 --llm-tokens-per-second 400
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Functions the fake model calls, in order, when the agent offers them
+TOOL_PREFERENCE = [
+    "get_current_stock_price",
+    "get_stock_fundamentals",
+    "get_analyst_recommendations",
+    "duckduckgo_search",
+]
+TOOLS_PER_TURN = 2
+TOKENS_PER_CHUNK = 4
+
+REPORT_WORDS = (
+    "## 1. Financial Performance\nRevenue grew steadily with stable operating margins and a healthy balance sheet. "
+    "\n\n## 2. Business Segments\nThe core segments hold strong market share with diversified revenue streams. "
+    "\n\n## 3. Trends and Opportunities\nDigital adoption and domestic demand support growth over the next few years. "
+    "\n\n## 4. Management and Strategy\nManagement has a consistent record of capital allocation and execution. "
+    "\n\n## 5. Big Picture\nInterest rates, currency moves and regulation remain the key external factors. "
+    "\n\n## 6. Future Projections\nGood case 15% CAGR, base case 10%, bad case 4% over five years. "
+    "\n\n## 7. Recommendation\nHOLD with a long-term positive bias for patient investors. "
+    "\n\n## 8. Personalized Plan\nFollow the pre-computed allocation and invest through a monthly SIP. "
+).split(" ")
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_ms: float = 300.0
+    tokens_per_second: float = 400.0
+    completion_tokens: int = 600
+    tool_turns: int = 1
+    error_rate: float = 0.0
+    error_status: int = 429
+    retry_after: float = 0.2
+    slow_rate: float = 0.0
+    slow_ms: float = 2000.0
+
+
+def _answer_tokens(count: int):
+    """`count` words of the canned report, repeated as needed."""
+    return [REPORT_WORDS[i % len(REPORT_WORDS)] + " " for i in range(count)]
+
+
+def _prompt_tokens(messages) -> int:
+    # Roughly 4 characters per token
+    return max(1, len(json.dumps(messages)) // 4)
+
+
+def _tool_calls(body: dict):
+    """Tool calls for this turn, or None once the model should answer."""
+    tools = {t["function"]["name"]: t["function"] for t in body.get("tools") or [] if t.get("type") == "function"}
+    if not tools:
+        return None
+    messages = body.get("messages") or []
+    turns_done = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+    if turns_done >= app.state.config.tool_turns:
+        return None
+
+    prompt = " ".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+    found = re.search(r"\b([A-Z0-9&\-]+\.(?:NS|BO))\b", prompt)
+    symbol = found.group(1) if found else "TCS.NS"
+
+    names = [name for name in TOOL_PREFERENCE if name in tools]
+    start = turns_done * TOOLS_PER_TURN
+    calls = []
+    for name in names[start:start + TOOLS_PER_TURN]:
+        properties = tools[name].get("parameters", {}).get("properties", {})
+        arguments = {}
+        if "symbol" in properties:
+            arguments["symbol"] = symbol
+        if "query" in properties:
+            arguments["query"] = f"{symbol} latest quarterly results"
+        calls.append({
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments)},
+        })
+    return calls or None
+
+
+def _usage(prompt_tokens: int, completion_tokens: int, elapsed: float) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_time": 0.0,
+        "completion_time": round(elapsed, 4),
+        "total_time": round(elapsed, 4),
+        "queue_time": 0.0,
+    }
+
+
+app = FastAPI(title="Fake LLM")
+app.state.config = FakeLLMConfig()
+app.state.stats = {
+    "requests": 0, "streamed": 0, "tool_call_responses": 0, "in_flight": 0, "peak_in_flight": 0,
+    "errors_injected": 0, "slow_injected": 0,
+}
+
+
+@app.get("/stats")
+async def stats():
+    return {**app.state.stats, "config": asdict(app.state.config)}
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    config: FakeLLMConfig = app.state.config
+    stats = app.state.stats
+    stats["requests"] += 1
+    if random.random() < config.error_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=config.error_status,
+            headers={"Retry-After": str(config.retry_after)} if config.error_status == 429 else None,
+            content={"error": {"message": "Injected error", "type": "fake_llm_error", "code": "injected"}},
+        )
+    latency_ms = config.latency_ms
+    if random.random() < config.slow_rate:
+        stats["slow_injected"] += 1
+        latency_ms += config.slow_ms
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+    started = time.perf_counter()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+    model = body.get("model", "fake")
+    prompt_tokens = _prompt_tokens(body.get("messages"))
+    tool_calls = _tool_calls(body)
+    tokens = [] if tool_calls else _answer_tokens(config.completion_tokens)
+    completion_tokens = len(tool_calls) * 20 if tool_calls else len(tokens)
+    if tool_calls:
+        stats["tool_call_responses"] += 1
+
+    def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            payload["x_groq"] = {"id": completion_id, "usage": usage}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    if body.get("stream"):
+        stats["streamed"] += 1
+
+        async def events():
+            try:
+                await asyncio.sleep(latency_ms / 1000)
+                yield chunk({"role": "assistant", "content": ""})
+                if tool_calls:
+                    yield chunk({"tool_calls": [{"index": i, **call} for i, call in enumerate(tool_calls)]})
+                for i in range(0, len(tokens), TOKENS_PER_CHUNK):
+                    piece = tokens[i:i + TOKENS_PER_CHUNK]
+                    yield chunk({"content": "".join(piece)})
+                    await asyncio.sleep(len(piece) / config.tokens_per_second)
+                usage = _usage(prompt_tokens, completion_tokens, time.perf_counter() - started)
+                yield chunk({}, "tool_calls" if tool_calls else "stop", usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    try:
+        await asyncio.sleep(latency_ms / 1000 + completion_tokens / config.tokens_per_second)
+    finally:
+        stats["in_flight"] -= 1
+    message = {"role": "assistant", "content": None if tool_calls else "".join(tokens)}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return JSONResponse({
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+        "usage": _usage(prompt_tokens, completion_tokens, time.perf_counter() - started),
+    })
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-latency-ms", type=float, default=FakeLLMConfig.latency_ms)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=FakeLLMConfig.tokens_per_second)
+    parser.add_argument("--llm-completion-tokens", type=int, default=FakeLLMConfig.completion_tokens)
+    parser.add_argument("--llm-tool-turns", type=int, default=FakeLLMConfig.tool_turns)
+    parser.add_argument("--llm-error-rate", type=float, default=FakeLLMConfig.error_rate,
+                        help="fraction of LLM requests answered with --llm-error-status")
+    parser.add_argument("--llm-error-status", type=int, default=FakeLLMConfig.error_status)
+    parser.add_argument("--llm-slow-rate", type=float, default=FakeLLMConfig.slow_rate,
+                        help="fraction of LLM requests delayed by --llm-slow-ms")
+    parser.add_argument("--llm-slow-ms", type=float, default=FakeLLMConfig.slow_ms)
+
+
+def config_from_args(args) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.llm_tokens_per_second,
+        completion_tokens=args.llm_completion_tokens,
+        tool_turns=args.llm_tool_turns,
+        error_rate=args.llm_error_rate,
+        error_status=args.llm_error_status,
+        slow_rate=args.llm_slow_rate,
+        slow_ms=args.llm_slow_ms,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI/Groq-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app.state.config = config_from_args(args)
+    print(f"Fake LLM on http://{args.host}:{args.port} - set GROQ_BASE_URL to this address")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
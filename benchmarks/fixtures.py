@@ -0,0 +1,178 @@
+"""
+Recorded fixtures for YFinanceTools and DuckDuckGo
+
+`install()` replaces the network calls of phi's YFinanceTools and DuckDuckGo
+with outputs recorded in fixtures/market_data.json, after an optional delay
+that stands in for the network. The cached subclasses in financial_agent.py
+call these methods through super(), so the tool cache, tracing and prefetch
+work exactly as in production.
+
+Symbols without a recording get the TCS.NS outputs with the symbol swapped
+in, so any ticker can be benchmarked. The history store's downloads are
+replaced by a synthetic 5-year series (seeded by the symbol, ending at the
+recorded price) and fixed annual financials.
+
+Record fresh outputs (needs network access):
+
+    python -m benchmarks.fixtures record TCS.NS RELIANCE.NS INFY.NS
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from phi.tools.duckduckgo import DuckDuckGo
+from phi.tools.yfinance import YFinanceTools
+
+import history_store
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "market_data.json")
+TEMPLATE_SYMBOL = "TCS.NS"
+
+_originals: Dict[tuple, object] = {}  # (class or module, name) -> real function
+HISTORY_DAYS = 1300  # about 5 years of trading days
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _company_names(fixtures: dict) -> Dict[str, str]:
+    """Lowercase company name (without 'limited') -> recorded symbol, for matching search queries."""
+    names = {}
+    for symbol, data in fixtures.items():
+        try:
+            name = json.loads(data["fundamentals"]).get("company_name") or ""
+        except ValueError:
+            continue
+        name = name.lower().replace(" limited", "").strip()
+        if name:
+            names[name] = symbol
+    return names
+
+
+def install(latency_ms: float = 0.0, path: str = FIXTURES_PATH):
+    """Patch YFinanceTools, DuckDuckGo and the history downloads to serve recorded outputs."""
+    fixtures = load_fixtures(path)
+    template = fixtures[TEMPLATE_SYMBOL]
+    names = _company_names(fixtures)
+
+    def symbol_in_query(query: str) -> str:
+        query = query.lower()
+        return next((symbol for name, symbol in names.items() if name in query), TEMPLATE_SYMBOL)
+
+    def lookup(symbol: str, source: str) -> str:
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        symbol = symbol.strip().upper()
+        if symbol in fixtures:
+            return fixtures[symbol][source]
+        return template[source].replace(TEMPLATE_SYMBOL, symbol)
+
+    def get_current_stock_price(self, symbol: str) -> str:
+        return lookup(symbol, "price")
+
+    def get_stock_fundamentals(self, symbol: str) -> str:
+        return lookup(symbol, "fundamentals")
+
+    def get_analyst_recommendations(self, symbol: str) -> str:
+        return lookup(symbol, "recommendations")
+
+    def get_company_news(self, symbol: str, num_stories: int = 3) -> str:
+        return json.dumps(json.loads(lookup(symbol, "news"))[:num_stories], indent=2)
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        return json.dumps(json.loads(lookup(symbol_in_query(query), "search"))[:max_results], indent=2)
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        return json.dumps(json.loads(lookup(symbol_in_query(query), "news"))[:max_results], indent=2)
+
+    def fetch_price_history(symbol: str, start=None, years: int = 5) -> pd.DataFrame:
+        try:
+            last_price = float(lookup(symbol, "price"))
+        except ValueError:
+            last_price = 1000.0
+        rng = np.random.default_rng(zlib.crc32(symbol.strip().upper().encode()))
+        dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=HISTORY_DAYS, tz="Asia/Kolkata")
+        walk = np.cumsum(rng.normal(0.0004, 0.015, len(dates)))
+        close = last_price * np.exp(walk - walk[-1])
+        frame = pd.DataFrame({
+            "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+            "Volume": 1e6, "Stock Splits": 0.0,
+        }, index=dates)
+        return frame[frame.index >= pd.Timestamp(start, tz="Asia/Kolkata")] if start else frame
+
+    def fetch_financial_statements(symbol: str) -> Dict[str, pd.DataFrame]:
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        periods = pd.to_datetime(["2022-03-31", "2023-03-31", "2024-03-31", "2025-03-31"])
+        revenue = np.array([1.9e12, 2.2e12, 2.4e12, 2.5e12])
+        return {
+            "income_stmt": pd.DataFrame(
+                [revenue, revenue * 0.19, revenue * 0.25],
+                index=["Total Revenue", "Net Income", "Operating Income"], columns=periods,
+            ),
+            "cashflow": pd.DataFrame([revenue * 0.2], index=["Operating Cash Flow"], columns=periods),
+            "balance_sheet": pd.DataFrame(
+                [revenue * 0.03, revenue * 0.04], index=["Total Debt", "Cash And Cash Equivalents"], columns=periods,
+            ),
+        }
+
+    replacements = {
+        (YFinanceTools, "get_current_stock_price"): get_current_stock_price,
+        (YFinanceTools, "get_stock_fundamentals"): get_stock_fundamentals,
+        (YFinanceTools, "get_analyst_recommendations"): get_analyst_recommendations,
+        (YFinanceTools, "get_company_news"): get_company_news,
+        (DuckDuckGo, "duckduckgo_search"): duckduckgo_search,
+        (DuckDuckGo, "duckduckgo_news"): duckduckgo_news,
+        (history_store, "fetch_price_history"): fetch_price_history,
+        (history_store, "fetch_financial_statements"): fetch_financial_statements,
+    }
+    for (cls, name), replacement in replacements.items():
+        _originals.setdefault((cls, name), getattr(cls, name))
+        setattr(cls, name, replacement)
+
+
+def uninstall():
+    """Put the real network methods back."""
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+
+
+def record(symbols, path: str = FIXTURES_PATH):
+    """Call the real tools for `symbols` and save their outputs as fixtures."""
+    uninstall()
+    yfinance = YFinanceTools(stock_price=True, analyst_recommendations=True, stock_fundamentals=True, company_news=True)
+    search = DuckDuckGo()
+    fixtures = load_fixtures(path) if os.path.exists(path) else {}
+    for symbol in symbols:
+        print(f"Recording {symbol}...")
+        fundamentals = yfinance.get_stock_fundamentals(symbol)
+        try:
+            company = json.loads(fundamentals).get("company_name") or symbol
+        except ValueError:
+            company = symbol
+        fixtures[symbol] = {
+            "price": yfinance.get_current_stock_price(symbol),
+            "fundamentals": fundamentals,
+            "recommendations": yfinance.get_analyst_recommendations(symbol),
+            "news": yfinance.get_company_news(symbol, num_stories=5),
+            "search": search.duckduckgo_search(f"{company} latest quarterly results annual report", max_results=5),
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=1)
+    print(f"Saved {len(fixtures)} symbols to {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "record":
+        print("Usage: python -m benchmarks.fixtures record SYMBOL [SYMBOL ...]")
+        sys.exit(1)
+    record([s.upper() for s in sys.argv[2:]])
@@ -0,0 +1,218 @@
+"""
+Load Generator for the Financial Advisor API
+
+Drives a running backend at a fixed concurrency and reports throughput and
+p50/p95/p99 latency per scenario:
+
+- ask: POST /api/ask with a mix of questions (price and fundamentals
+  lookups, full analyses, advice with and without an investor profile)
+- ask_stream: POST /api/ask/stream; also reports time to the first token
+- batch: POST /api/batch, then follows the job stream until every ticker is done
+
+Against a live server (real Groq and Yahoo Finance):
+
+    python -m benchmarks.load_test --url http://localhost:8000 --scenarios ask --requests 20
+
+For an offline run with the fake LLM and recorded fixtures use
+`python -m benchmarks.run`.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+SCENARIOS = ("ask", "ask_stream", "batch")
+
+# (question, investor profile) pairs cycled through by the ask scenarios
+QUESTIONS = [
+    ("What is the current price of TCS?", {}),
+    ("Reliance Industries", {}),
+    ("Infosys P/E ratio and market cap", {}),
+    ("Should I invest in HDFC Bank?", {"age": 30, "monthly_salary": 300000, "risk_appetite": "moderate"}),
+    ("ITC", {"age": 45, "monthly_salary": 150000, "risk_appetite": "low"}),
+    ("How much should I keep in an emergency fund?", {}),
+    ("What are the analyst recommendations for Wipro stock?", {}),
+    ("TCS", {}),
+]
+BATCH_TICKERS = ["TCS", "Reliance", "INFY", "HDFC Bank", "ITC"]
+
+
+def summarize(latencies_ms: List[float]) -> Optional[dict]:
+    if not latencies_ms:
+        return None
+    values = np.array(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 1),
+        "p95": round(float(p95), 1),
+        "p99": round(float(p99), 1),
+        "mean": round(float(values.mean()), 1),
+        "max": round(float(values.max()), 1),
+    }
+
+
+async def run_scenario(
+    name: str,
+    request: Callable[[int], Awaitable[dict]],
+    concurrency: int,
+    total: int,
+) -> dict:
+    """Call `request(i)` for i in range(total), `concurrency` at a time."""
+    results: List[dict] = []
+    next_index = iter(range(total))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                result = await request(i)
+            except Exception as e:
+                result = {"ok": False, "status": type(e).__name__}
+            result["latency_ms"] = (time.perf_counter() - started) * 1000
+            results.append(result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "latency_ms": summarize([r["latency_ms"] for r in ok]),
+        "status_codes": dict(Counter(str(r["status"]) for r in results)),
+        "pipelines": dict(Counter(r["pipeline"] for r in ok if r.get("pipeline"))),
+        "served": dict(Counter(r["served"] for r in ok if r.get("served"))),
+    }
+    first_token = [r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    if first_token:
+        summary["first_token_ms"] = summarize(first_token)
+    return summary
+
+
+def _form(i: int) -> dict:
+    question, profile = QUESTIONS[i % len(QUESTIONS)]
+    return {"question": question, **{k: str(v) for k, v in profile.items()}}
+
+
+async def _sse_events(response: httpx.Response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event = None
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:") and event:
+            yield event, json.loads(line[len("data:"):].strip())
+            event = None
+
+
+def make_ask(client: httpx.AsyncClient) -> Callable[[int], Awaitable[dict]]:
+    async def ask(i: int) -> dict:
+        response = await client.post("/api/ask", data=_form(i))
+        body = response.json()
+        return {"ok": response.status_code == 200 and body.get("success"), "status": response.status_code,
+                "pipeline": body.get("pipeline"), "served": body.get("served")}
+    return ask
+
+
+def make_ask_stream(client: httpx.AsyncClient) -> Callable[[int], Awaitable[dict]]:
+    async def ask_stream(i: int) -> dict:
+        started = time.perf_counter()
+        first_token_ms = None
+        async with client.stream("POST", "/api/ask/stream", data=_form(i)) as response:
+            async for event, data in _sse_events(response):
+                if event == "token" and first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                elif event == "done":
+                    return {"ok": True, "status": response.status_code, "pipeline": data.get("pipeline"),
+                            "served": data.get("served"), "first_token_ms": first_token_ms}
+                elif event == "error":
+                    return {"ok": False, "status": "error_event"}
+        return {"ok": False, "status": "no_done_event"}
+    return ask_stream
+
+
+def make_batch(client: httpx.AsyncClient, tickers: List[str]) -> Callable[[int], Awaitable[dict]]:
+    async def batch(i: int) -> dict:
+        response = await client.post("/api/batch", json={"tickers": tickers})
+        if response.status_code != 202:
+            return {"ok": False, "status": response.status_code}
+        job_id = response.json()["job_id"]
+        async with client.stream("GET", f"/api/batch/{job_id}/stream") as stream:
+            async for event, data in _sse_events(stream):
+                if event == "done":
+                    return {"ok": data.get("failed") == 0, "status": response.status_code, "pipeline": "batch"}
+        return {"ok": False, "status": "no_done_event"}
+    return batch
+
+
+async def run_load_test(
+    url: str,
+    scenarios=SCENARIOS,
+    concurrency: int = 8,
+    requests: int = 40,
+    batch_jobs: int = 2,
+    timeout: float = 300.0,
+) -> Dict[str, dict]:
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    results = {}
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        for name in scenarios:
+            if name == "ask":
+                request, total, workers = make_ask(client), requests, concurrency
+            elif name == "ask_stream":
+                request, total, workers = make_ask_stream(client), requests, concurrency
+            elif name == "batch":
+                request, total, workers = make_batch(client, BATCH_TICKERS), batch_jobs, min(concurrency, batch_jobs)
+            else:
+                raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+            print(f"Running {name}: {total} requests, concurrency {workers}...")
+            results[name] = await run_scenario(name, request, workers, total)
+            print(format_summary(results[name]))
+    return results
+
+
+def format_summary(summary: dict) -> str:
+    latency = summary["latency_ms"] or {}
+    line = (
+        f"  {summary['scenario']:<11} {summary['succeeded']}/{summary['requests']} ok, "
+        f"{summary['throughput_rps']} req/s, p50 {latency.get('p50')} ms, "
+        f"p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms"
+    )
+    if "first_token_ms" in summary:
+        line += f", first token p50 {summary['first_token_ms']['p50']} ms"
+    return line
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="requests per ask scenario")
+    parser.add_argument("--batch-jobs", type=int, default=2, help=f"batch jobs of {len(BATCH_TICKERS)} tickers")
+    parser.add_argument("--output", help="write the results to this JSON file")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running Financial Advisor API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(
+        args.url, args.scenarios.split(","), args.concurrency, args.requests, args.batch_jobs
+    ))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "scenarios": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,172 @@
+"""
+Offline Benchmark Run
+
+Starts the fake LLM server, installs the recorded yfinance/DuckDuckGo
+fixtures, serves backend_api in this process and runs the load test against
+it. Nothing leaves the machine, so runs are repeatable and can be compared:
+
+    python -m benchmarks.run                                  # saves benchmarks/results/<time>.json
+    python -m benchmarks.run --baseline benchmarks/results/before.json
+
+With --baseline the run exits with status 1 when p50/p95 latency got worse
+(or throughput dropped) by more than --tolerance (default 20%) in any scenario.
+
+The tool and response caches, the report store and the sessions are cleared
+before each scenario (--warm-cache keeps them), so no scenario is served
+from what an earlier one left behind. GROQ_REQUESTS_PER_MINUTE defaults to
+600 here so batch jobs measure the app rather than the free-tier quota.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import httpx
+import uvicorn
+
+from benchmarks import fake_llm, fixtures, load_test
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+COMPARED_LATENCIES = ("p50", "p95")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port: int) -> uvicorn.Server:
+    """Run `app` on a background thread and wait until it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"Server on port {port} did not start")
+        time.sleep(0.05)
+    return server
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `results` against `baseline`, as printable lines."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before.get("latency_ms") or not current.get("latency_ms"):
+            continue
+        for key in COMPARED_LATENCIES:
+            old, new = before["latency_ms"][key], current["latency_ms"][key]
+            change = (new - old) / old if old else 0
+            print(f"  {name:<11} {key} {old:>9.1f} -> {new:>9.1f} ms ({change:+.0%})")
+            if change > tolerance:
+                regressions.append(f"{name} {key} latency {old:.1f} -> {new:.1f} ms ({change:+.0%})")
+        old, new = before.get("throughput_rps") or 0, current.get("throughput_rps") or 0
+        change = (new - old) / old if old else 0
+        print(f"  {name:<11} throughput {old:>6.2f} -> {new:>6.2f} req/s ({change:+.0%})")
+        if change < -tolerance:
+            regressions.append(f"{name} throughput {old:.2f} -> {new:.2f} req/s ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Financial Advisor API")
+    fake_llm.add_arguments(parser)
+    load_test.add_arguments(parser)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0, help="simulated yfinance/DuckDuckGo latency")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the caches, reports and sessions between scenarios")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # The fake LLM must be up, and the fixtures in place, before the app is imported
+    fake_llm.app.state.config = fake_llm.config_from_args(args)
+    llm_port = _free_port()
+    _serve(fake_llm.app, llm_port)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{llm_port}"
+    os.environ["GROQ_API_KEY"] = "benchmark"
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "600")
+    # A fresh history store per run, so the first request per symbol pays the full download
+    os.environ["HISTORY_DATA_DIR"] = tempfile.mkdtemp(prefix="advisor-history-")
+    os.environ["SESSION_DB"] = os.path.join(tempfile.mkdtemp(prefix="advisor-sessions-"), "sessions.db")
+    # Background refreshes would make the cold-cache numbers depend on the time of day
+    os.environ.setdefault("CACHE_WARMER", "0")
+    fixtures.install(latency_ms=args.tool_latency_ms)
+
+    import backend_api
+    import tracing
+
+    api_port = _free_port()
+    api_server = _serve(backend_api.app, api_port)
+    url = f"http://127.0.0.1:{api_port}"
+
+    scenarios = {}
+    for name in args.scenarios.split(","):
+        if not args.warm_cache:
+            backend_api.tool_cache.clear()
+            backend_api.response_cache.clear()
+            backend_api.report_store.clear()
+            backend_api.session_store.clear()
+        scenarios.update(asyncio.run(load_test.run_load_test(
+            url, [name], args.concurrency, args.requests, args.batch_jobs
+        )))
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "batch_jobs": args.batch_jobs,
+            "tool_latency_ms": args.tool_latency_ms,
+            "warm_cache": args.warm_cache,
+            "fake_llm": vars(fake_llm.app.state.config),
+            "pool_size": backend_api.POOL_SIZE,
+        },
+        "scenarios": scenarios,
+        # Where the time went: mean per phase, tool and LLM call
+        "spans": [
+            {"kind": s["kind"], "name": s["name"], "count": s["count"],
+             "mean_ms": round(s["mean"] * 1000, 2) if s["mean"] is not None else None}
+            for s in tracing.SPAN_SECONDS.snapshot()
+        ],
+        "fake_llm": httpx.get(f"http://127.0.0.1:{llm_port}/stats").json(),
+    }
+    api_server.should_exit = True
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (commit {baseline.get('git_commit')}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
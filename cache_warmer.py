@@ -0,0 +1,370 @@
+"""
+Background Cache Warmer for Popular Tickers
+
+The first person to ask about a big-cap stock after its cache entries
+expired used to pay for the cold yfinance fetches. This scheduler runs in
+the API process and refreshes the tool cache for a hot list before the
+entries expire:
+
+- the hot list is the NIFTY 50 plus stocks people keep asking about
+  (request counts halve every hour, so yesterday's favourite drops out)
+- prices are refreshed for the most asked-about names while the market is
+  open; news, fundamentals, recommendations and the stored history for the
+  whole hot list from shortly before the open to shortly after the close
+- each (symbol, job) is due again after about 80% of the data's cache TTL,
+  jittered so the refreshes don't all land in the same second
+- refreshes share a concurrency cap and a yfinance token bucket, so the
+  warmer leaves most of the quota to real requests
+- with several workers only one of them warms: the workers share a lease
+  row in SQLite (the TOOL_CACHE_DB file, or data/cache_warmer.db), the
+  holder renews it every loop and the others stand by until it expires, so
+  the yfinance traffic doesn't grow with the worker count
+- optionally the full analysis of the top names is regenerated into the
+  response cache once per freshness window (this one costs LLM tokens)
+
+NSE hours are Monday to Friday, 09:15 to 15:30 IST. Exchange holidays are
+treated as trading days. The warming worker fills its own memory cache;
+set TOOL_CACHE_DB so the other workers read the fetched data from SQLite.
+The hot list counts the requests seen by the warming worker.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agent_pool import PoolBusyError
+from batch_jobs import TokenBucket
+from context_compaction import IST
+from financial_agent import refreshing_tool_cache, tool_cache
+from prefetch import prefetch_stock_data
+from symbol_index import SymbolMatch, get_symbol_index
+
+MARKET_OPEN = (9, 15)
+MARKET_CLOSE = (15, 30)
+# Data other than prices is warmed from PRE_OPEN_MINUTES before the open
+# until POST_CLOSE_MINUTES after the close
+PRE_OPEN_MINUTES = 15
+POST_CLOSE_MINUTES = 30
+
+# job -> (prefetch sources, tool cache kind whose TTL sets the interval, when it runs)
+JOBS = {
+    "price": (("price",), "price", "open"),
+    "news": (("news",), "news", "session"),
+    "fundamentals": (("fundamentals", "recommendations", "history"), "fundamentals", "session"),
+}
+REFRESH_FRACTION = 0.8  # of the TTL
+DECAY_SECONDS = 60 * 60
+
+DEFAULT_LEASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache_warmer.db")
+# The loop wakes at least once a minute, so the holder renews well before this
+LEASE_SECONDS = 180
+
+
+def _at(day: datetime, hour_minute: Tuple[int, int], minutes: int = 0) -> datetime:
+    return day.replace(hour=hour_minute[0], minute=hour_minute[1], second=0, microsecond=0) + timedelta(minutes=minutes)
+
+
+def market_open(now: Optional[datetime] = None) -> bool:
+    now = now or datetime.now(IST)
+    return now.weekday() < 5 and _at(now, MARKET_OPEN) <= now < _at(now, MARKET_CLOSE)
+
+
+def in_session(now: Optional[datetime] = None) -> bool:
+    """Between the pre-open warm-up and the end of the post-close window on a weekday."""
+    now = now or datetime.now(IST)
+    return (now.weekday() < 5
+            and _at(now, MARKET_OPEN, -PRE_OPEN_MINUTES) <= now < _at(now, MARKET_CLOSE, POST_CLOSE_MINUTES))
+
+
+def next_session_start(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now(IST)
+    day = now
+    while True:
+        start = _at(day, MARKET_OPEN, -PRE_OPEN_MINUTES)
+        if day.weekday() < 5 and start > now:
+            return start
+        day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+
+
+class WarmerLease:
+    """One row in SQLite naming the worker that warms; it expires unless renewed."""
+
+    def __init__(self, db_path: str, seconds: float = LEASE_SECONDS):
+        self.db_path = db_path
+        self.seconds = seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    @property
+    def owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self) -> sqlite3.Connection:
+        """Opened on first use in each process (workers are forked after import)."""
+        if self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS warmer_lease ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db_pid = os.getpid()
+        return self._db
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; False while another live worker holds it."""
+        now = time.time()
+        try:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT owner, expires_at FROM warmer_lease WHERE id = 1").fetchone()
+                held = row is None or row[0] == self.owner or row[1] <= now
+                if held:
+                    db.execute(
+                        "INSERT OR REPLACE INTO warmer_lease (id, owner, expires_at) VALUES (1, ?, ?)",
+                        (self.owner, now + self.seconds),
+                    )
+            finally:
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Cache warmer lease failed: {e}")
+            return False
+        return held
+
+    def release(self):
+        try:
+            self._connection().execute("DELETE FROM warmer_lease WHERE id = 1 AND owner = ?", (self.owner,))
+        except sqlite3.Error as e:
+            print(f"Cache warmer lease release failed: {e}")
+
+
+class CacheWarmer:
+    def __init__(
+        self,
+        analyze: Optional[Callable[[SymbolMatch], Awaitable[None]]] = None,
+        max_symbols: int = 60,
+        price_symbols: int = 10,
+        analysis_symbols: int = 0,
+        analysis_interval: float = 300,
+        min_requests: int = 3,
+        max_concurrency: int = 2,
+        yfinance_requests_per_second: float = 1,
+        jitter: float = 0.1,
+        market_hours_only: bool = True,
+        lease: Optional[WarmerLease] = None,
+    ):
+        self.analyze = analyze  # regenerates one full analysis into the response cache
+        self.max_symbols = max_symbols
+        self.price_symbols = price_symbols
+        self.analysis_symbols = analysis_symbols if analyze else 0
+        self.analysis_interval = analysis_interval
+        self.min_requests = min_requests
+        self.max_concurrency = max(1, max_concurrency)
+        self.jitter = jitter
+        self.market_hours_only = market_hours_only
+        self.lease = lease  # None: this process always warms
+
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._yfinance_bucket = TokenBucket(yfinance_requests_per_second, capacity=max(3.0, yfinance_requests_per_second))
+        self._seed: List[SymbolMatch] = []
+        self._observed: Dict[str, SymbolMatch] = {}
+        self._requests: Counter = Counter()
+        self._decayed_at = time.time()
+        self._due: Dict[Tuple[str, str], float] = {}  # (symbol, job) -> next refresh (epoch seconds)
+        self._running = set()
+        self._tasks = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._state = "stopped"
+        self._counters = {job: {"ok": 0, "error": 0} for job in (*JOBS, "analysis")}
+        self._last_refresh: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Hot list
+    # ------------------------------------------------------------------
+    def observe(self, match: Optional[SymbolMatch]):
+        """Count a request for `match`; frequently asked stocks join the hot list."""
+        if match is None:
+            return
+        self._observed.setdefault(match.symbol, match)
+        self._requests[match.symbol] += 1
+
+    def _decay(self, now: float):
+        if now - self._decayed_at < DECAY_SECONDS:
+            return
+        self._decayed_at = now
+        for symbol in list(self._requests):
+            self._requests[symbol] //= 2
+            if not self._requests[symbol]:
+                del self._requests[symbol]
+                self._observed.pop(symbol, None)
+
+    def hot_list(self) -> List[SymbolMatch]:
+        """Most asked-about first; NIFTY 50 names nobody asked about keep the index order."""
+        if not self._seed:
+            index = get_symbol_index()
+            self._seed = [m for m in (index.resolve(s, allow_fuzzy=False) for s in index.nifty50()) if m]
+        seed = {m.symbol for m in self._seed}
+        asked = [self._observed[s] for s, n in self._requests.most_common()
+                 if s in seed or n >= self.min_requests]
+        ranked = {m.symbol: m for m in asked}
+        for match in self._seed:
+            ranked.setdefault(match.symbol, match)
+        return list(ranked.values())[:self.max_symbols]
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def _interval(self, job: str) -> float:
+        if job == "analysis":
+            return self.analysis_interval
+        return tool_cache.ttls.get(JOBS[job][1], 60) * REFRESH_FRACTION
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _next_due(self, job: str, now: float) -> float:
+        interval = self._interval(job)
+        if job == "analysis":
+            # Response cache entries live until the end of their window slot,
+            # so regenerate just after the next slot starts
+            return (now // interval + 1) * interval + random.uniform(0, self.jitter * interval)
+        return now + self._jittered(interval)
+
+    def _active_jobs(self, now: datetime) -> List[str]:
+        jobs = list(JOBS) + (["analysis"] if self.analysis_symbols else [])
+        if not self.market_hours_only:
+            return jobs
+        # Full analyses follow the prices: only worth regenerating while they move
+        hours = {job: spec[2] for job, spec in JOBS.items()}
+        return [job for job in jobs if (market_open(now) if hours.get(job, "open") == "open" else in_session(now))]
+
+    def _wanted(self, jobs: List[str]) -> Dict[Tuple[str, str], SymbolMatch]:
+        hot = self.hot_list()
+        limits = {"price": self.price_symbols, "analysis": self.analysis_symbols}
+        wanted = {}
+        for job in jobs:
+            for match in hot[:limits.get(job, len(hot))]:
+                wanted[(match.symbol, job)] = match
+        return wanted
+
+    async def _loop(self):
+        while True:
+            now = time.time()
+            self._decay(now)
+            if self.lease is not None and not await asyncio.to_thread(self.lease.acquire):
+                # Another worker warms; take over if its lease runs out
+                self._state = "standby"
+                self._due.clear()
+                await self._sleep(60)
+                continue
+            jobs = self._active_jobs(datetime.now(IST))
+            if not jobs:
+                self._state = "market_closed"
+                self._due.clear()
+                await self._sleep((next_session_start() - datetime.now(IST)).total_seconds())
+                continue
+            self._state = "warming"
+
+            wanted = self._wanted(jobs)
+            for item in list(self._due):
+                if item not in wanted:
+                    del self._due[item]
+            for item in wanted:
+                if item not in self._due:
+                    # Spread the first round instead of refreshing everything at once
+                    self._due[item] = now + random.uniform(0, min(self._interval(item[1]), 60))
+
+            ready = sorted((at, item) for item, at in self._due.items() if at <= now and item not in self._running)
+            for _, item in ready:
+                await self._slots.acquire()
+                self._running.add(item)
+                self._due[item] = self._next_due(item[1], time.time())
+                task = asyncio.create_task(self._refresh(wanted[item], item[1]))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            upcoming = [at for item, at in self._due.items() if item not in self._running]
+            await self._sleep(min(upcoming, default=now + 5) - time.time())
+
+    async def _sleep(self, seconds: float):
+        """Sleep up to `seconds` (at most a minute, so a new hot symbol or hours change is picked up)."""
+        try:
+            await asyncio.wait_for(self._wake.wait(), max(0.05, min(seconds, 60)))
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _refresh(self, match: SymbolMatch, job: str):
+        try:
+            if job == "analysis":
+                await self.analyze(match)
+            else:
+                sources = JOBS[job][0]
+                await self._yfinance_bucket.acquire(len(sources))
+                with refreshing_tool_cache():
+                    data = await prefetch_stock_data(match, sources=sources)
+                failed = [s for s, result in data["raw"].items()
+                          if isinstance(result, str) and result.startswith("Error")]
+                if failed:
+                    raise RuntimeError(f"{', '.join(failed)} failed")
+            self._counters[job]["ok"] += 1
+            self._last_refresh = time.time()
+        except PoolBusyError:
+            # Real requests have the agents; try again in a little while
+            self._due[(match.symbol, job)] = time.time() + self._jittered(30)
+        except Exception as e:
+            print(f"Cache warmer: {job} refresh of {match.symbol} failed: {str(e)}")
+            self._counters[job]["error"] += 1
+        finally:
+            self._running.discard((match.symbol, job))
+            self._slots.release()
+            self._wake.set()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._loop_task is None:
+            self._wake = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._loop())
+            print(f"Cache warmer started (concurrency {self.max_concurrency}, up to {self.max_symbols} symbols)")
+
+    async def stop(self):
+        tasks = [t for t in (self._loop_task, *self._tasks) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks and self.lease is not None:
+            # Let a standby worker take over without waiting for the lease to expire
+            await asyncio.to_thread(self.lease.release)
+        self._loop_task = None
+        self._due.clear()
+        self._running.clear()
+        self._state = "stopped"
+
+    def stats(self) -> dict:
+        hot = self.hot_list()
+        return {
+            "state": self._state,
+            "market_open": market_open(),
+            "market_hours_only": self.market_hours_only,
+            "hot_symbols": len(hot),
+            "top_symbols": [m.symbol for m in hot[:self.price_symbols]],
+            "scheduled": len(self._due),
+            "running": len(self._running),
+            "max_concurrency": self.max_concurrency,
+            "yfinance_requests_per_second": self._yfinance_bucket.rate,
+            "intervals_seconds": {job: round(self._interval(job)) for job in (*JOBS, "analysis")
+                                  if job != "analysis" or self.analysis_symbols},
+            "refreshes": {job: dict(c) for job, c in self._counters.items()},
+            "last_refresh_ago_seconds": round(time.time() - self._last_refresh, 1) if self._last_refresh else None,
+        }
@@ -0,0 +1,228 @@
+"""
+Context Compaction
+
+Everything in the prompt is paid for in tokens on every LLM call, and Groq's
+latency grows with the prompt. This stage keeps the context down to what the
+answer needs:
+
+- news and web search results are deduplicated (same link or same
+  headline) and cut to a few items with short snippets
+- fundamentals are projected to the fields the report uses; empty values
+  are dropped and long floats rounded
+- analyst recommendations keep only the latest month
+- the instruction prompt is assembled per request from the sections it
+  needs (financial_agent.build_instructions)
+- a prompt over the token budget is rebuilt at the next COMPACTION_LEVELS
+  entry (fewer news and search items, shorter snippets) until it fits
+
+Tokens are estimated at 4 characters each, which is close enough for
+budgeting and needs no tokenizer. Savings are recorded on the request trace
+and in advisor_context_tokens_saved_total.
+"""
+
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
+
+from tracing import record_compaction
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+FUNDAMENTAL_LABELS = {
+    "sector": "Sector",
+    "industry": "Industry",
+    "market_cap": "Market cap",
+    "pe_ratio": "Forward P/E",
+    "pb_ratio": "P/B",
+    "eps": "EPS (trailing)",
+    "dividend_yield": "Dividend yield",
+    "beta": "Beta",
+    "52_week_high": "52-week high",
+    "52_week_low": "52-week low",
+}
+# What the report uses from get_stock_fundamentals
+FUNDAMENTAL_FIELDS = ("symbol", "company_name") + tuple(FUNDAMENTAL_LABELS)
+RECOMMENDATION_FIELDS = ("strongBuy", "buy", "hold", "sell", "strongSell")
+
+# Most to least generous; a prompt over budget moves down the list
+COMPACTION_LEVELS = [
+    {"news": 5, "search": 5, "snippet_chars": 240},
+    {"news": 3, "search": 3, "snippet_chars": 160},
+    {"news": 2, "search": 2, "snippet_chars": 100},
+    {"news": 1, "search": 1, "snippet_chars": 80},
+    {"news": 0, "search": 0, "snippet_chars": 0},
+]
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _load_json(text: str):
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _dedupe_key(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+def normalize_news(text: str, limit: int = 5) -> List[dict]:
+    """
+    Reduce news items (yfinance old and new format, DuckDuckGo news or
+    already compacted) to title/publisher/date/link, without repeats.
+    """
+    items = _load_json(text)
+    if not isinstance(items, list):
+        return []
+    news = []
+    seen = set()
+    for item in items:
+        if len(news) >= limit:
+            break
+        if not isinstance(item, dict):
+            continue
+        content = item.get("content") or item
+        if not isinstance(content, dict) or not content.get("title"):
+            continue
+        provider = content.get("provider") or {}
+        link = (content.get("canonicalUrl") or {}).get("url") or content.get("link") or content.get("url") or ""
+        title = content["title"].strip()
+        keys = {_dedupe_key(title), link.rstrip("/")} - {""}
+        if keys & seen:
+            continue
+        seen |= keys
+        date = content.get("pubDate") or content.get("date") or ""
+        if not date and content.get("providerPublishTime"):
+            date = datetime.fromtimestamp(content["providerPublishTime"], IST).isoformat()
+        news.append({
+            "title": title,
+            "publisher": provider.get("displayName") or content.get("publisher") or content.get("source") or "",
+            "date": date[:10],
+            "link": link,
+        })
+    return news
+
+
+def normalize_search(text: str, limit: int = 5, snippet_chars: int = 240) -> List[dict]:
+    """DuckDuckGo results as title/snippet/link, without repeated links or headlines."""
+    items = _load_json(text)
+    if not isinstance(items, list):
+        return []
+    results = []
+    seen = set()
+    for item in items:
+        if len(results) >= limit:
+            break
+        if not isinstance(item, dict):
+            continue
+        title = (item.get("title") or "").strip()
+        link = item.get("href") or item.get("url") or item.get("link") or ""
+        keys = {_dedupe_key(title), link.rstrip("/")} - {""}
+        if keys & seen:
+            continue
+        seen |= keys
+        body = " ".join((item.get("body") or item.get("snippet") or "").split())
+        if len(body) > snippet_chars:
+            body = body[:snippet_chars].rsplit(" ", 1)[0] + "..."
+        results.append({"title": title, "snippet": body, "link": link})
+    return results
+
+
+def normalize_recommendations(text: str) -> Optional[dict]:
+    """Latest analyst recommendation counts (period '0m')."""
+    table = _load_json(text)
+    if not isinstance(table, dict) or not table:
+        return None
+    rows = [row for row in table.values() if isinstance(row, dict)]
+    if not rows:
+        return None
+    latest = next((r for r in rows if r.get("period") == "0m"), rows[0])
+    return {k: latest.get(k) for k in RECOMMENDATION_FIELDS}
+
+
+def project_fundamentals(text: str) -> Optional[dict]:
+    """The report's fundamentals fields, without empty values and with floats rounded."""
+    fundamentals = _load_json(text)
+    if not isinstance(fundamentals, dict):
+        return None
+    projected = {}
+    for key in FUNDAMENTAL_FIELDS:
+        value = fundamentals.get(key)
+        if value in (None, "", "N/A"):
+            continue
+        if isinstance(value, float):
+            value = round(value) if abs(value) >= 1e5 else round(value, 4 if abs(value) < 1 else 2)
+        projected[key] = value
+    return projected
+
+
+# ============================================================================
+# TOOL OUTPUTS
+# ============================================================================
+# Applied to what the tool-equipped agent (and the pre-fetch) gets back from
+# yfinance and DuckDuckGo; the tool cache keeps the raw outputs.
+
+def _compacted(part: str, raw: str, compact: Optional[str]) -> str:
+    if compact is None or len(compact) >= len(raw):
+        return raw
+    record_compaction(part, estimate_tokens(raw), estimate_tokens(compact))
+    return compact
+
+
+def compact_news(text: str, limit: int = COMPACTION_LEVELS[0]["news"]) -> str:
+    news = normalize_news(text, limit)
+    return _compacted("tool_outputs", text, json.dumps(news, ensure_ascii=False) if news else None)
+
+
+def compact_search(text: str, limit: int = COMPACTION_LEVELS[0]["search"]) -> str:
+    results = normalize_search(text, limit, COMPACTION_LEVELS[0]["snippet_chars"])
+    if not results:
+        return text
+    # Keep DuckDuckGo's field names so the output reads like the original
+    compact = [{"title": r["title"], "href": r["link"], "body": r["snippet"]} for r in results]
+    return _compacted("tool_outputs", text, json.dumps(compact, ensure_ascii=False))
+
+
+def compact_fundamentals(text: str) -> str:
+    fundamentals = project_fundamentals(text)
+    return _compacted("tool_outputs", text, json.dumps(fundamentals, ensure_ascii=False) if fundamentals else None)
+
+
+def compact_recommendations(text: str) -> str:
+    table = _load_json(text)
+    if not isinstance(table, dict) or not table:
+        return text
+    rows = [row for row in table.values() if isinstance(row, dict)]
+    latest = next((r for r in rows if r.get("period") == "0m"), rows[0] if rows else None)
+    if latest is None:
+        return text
+    compact = {"0": {"period": latest.get("period", "0m"), **{k: latest.get(k) for k in RECOMMENDATION_FIELDS}}}
+    return _compacted("tool_outputs", text, json.dumps(compact))
+
+
+# ============================================================================
+# TOKEN BUDGET
+# ============================================================================
+
+def fit_to_budget(build: Callable[[dict], str], budget: Optional[int]) -> Tuple[str, int]:
+    """
+    `build(level)` at the first COMPACTION_LEVELS entry whose result fits in
+    `budget` tokens (the last level if none does). Returns (text, level index).
+    """
+    first = text = build(COMPACTION_LEVELS[0])
+    level = 0
+    if budget is not None:
+        while estimate_tokens(text) > budget and level < len(COMPACTION_LEVELS) - 1:
+            level += 1
+            text = build(COMPACTION_LEVELS[level])
+    if level:
+        record_compaction("budget", estimate_tokens(first), estimate_tokens(text))
+    return text, level
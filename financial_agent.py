@@ -19,183 +19,498 @@ response = financial_advisor.run(
 """
 
 from phi.agent import Agent
-from phi.model.groq import Groq
-from phi.tools.yfinance import YFinanceTools
-from phi.tools.duckduckgo import DuckDuckGo
+import contextvars
 import os
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
+from llm_provider import DEFAULT_MODEL, ResilientGroq
+from context_compaction import (
+    compact_fundamentals,
+    compact_news,
+    compact_recommendations,
+    compact_search,
+    estimate_tokens,
+)
+from tool_cache import cache_from_env
+from tracing import record_compaction, record_completion, span
 
 load_dotenv()
 
 # ============================================================================
-# SIMPLE FINANCIAL ADVISOR AGENT
+# CACHED TOOLKITS
 # ============================================================================
-# You can change the model here:
-# - Groq: Groq(id="llama-3.1-8b-instant") or Groq(id="llama-3.1-70b-versatile")
-# - OpenAI: from phi.model.openai import OpenAIChat; OpenAIChat(id="gpt-4")
-# - Any other model supported by phi framework
+# One cache shared by every agent in this process (and, with TOOL_CACHE_DB
+# set, by every worker process). The overrides below keep the parent
+# signatures and inherit the parent docstrings, which phi uses as the tool
+# descriptions sent to the model. The cache keeps the raw outputs; callers
+# get them compacted (deduplicated news/search, projected fundamentals).
+
+tool_cache = cache_from_env()
+
+# Set by the cache warmer: tool calls skip the lookup and refresh their entry
+_refreshing = contextvars.ContextVar("tool_cache_refreshing", default=False)
+
+
+@contextmanager
+def refreshing_tool_cache():
+    """Tool calls made inside this block (and in contexts copied from it) refetch and re-cache."""
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+def _symbol_key(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def _traced_fetch(tool: str, kind: str, key: str, fetch):
+    """Cached tool call, recorded as a `tool` span (`tool_cached` when served from the cache)."""
+    with span("tool", tool) as current:
+        fetched = []
+
+        def fetch_and_mark():
+            fetched.append(True)
+            return fetch()
+
+        result = tool_cache.get_or_fetch(kind, key, fetch_and_mark, force=_refreshing.get())
+        if not fetched:
+            current.kind = "tool_cached"
+        return result
+
+
+@lru_cache(maxsize=None)
+def _toolkit_classes() -> dict:
+    """
+    Define the cached toolkits on first use: phi's toolkit modules import
+    yfinance and duckduckgo-search, which are slow to import and not needed
+    to start the API or to answer from the caches.
+    """
+    from phi.tools.duckduckgo import DuckDuckGo
+    from phi.tools.yfinance import YFinanceTools
+
+    class CachedYFinanceTools(YFinanceTools):
+        def get_current_stock_price(self, symbol: str) -> str:
+            return _traced_fetch(
+                "get_current_stock_price",
+                "price",
+                _symbol_key(symbol),
+                lambda: super(CachedYFinanceTools, self).get_current_stock_price(symbol),
+            )
+
+        def get_stock_fundamentals(self, symbol: str) -> str:
+            return compact_fundamentals(_traced_fetch(
+                "get_stock_fundamentals",
+                "fundamentals",
+                _symbol_key(symbol),
+                lambda: super(CachedYFinanceTools, self).get_stock_fundamentals(symbol),
+            ))
+
+        def get_analyst_recommendations(self, symbol: str) -> str:
+            return compact_recommendations(_traced_fetch(
+                "get_analyst_recommendations",
+                "recommendations",
+                _symbol_key(symbol),
+                lambda: super(CachedYFinanceTools, self).get_analyst_recommendations(symbol),
+            ))
+
+        def get_company_news(self, symbol: str, num_stories: int = 3) -> str:
+            return compact_news(_traced_fetch(
+                "get_company_news",
+                "news",
+                f"{_symbol_key(symbol)}:{num_stories}",
+                lambda: super(CachedYFinanceTools, self).get_company_news(symbol, num_stories),
+            ))
+
+    class CachedDuckDuckGo(DuckDuckGo):
+        def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+            return compact_search(_traced_fetch(
+                "duckduckgo_search",
+                "search",
+                f"text:{' '.join(query.lower().split())}:{max_results}",
+                lambda: super(CachedDuckDuckGo, self).duckduckgo_search(query, max_results),
+            ))
+
+        def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+            return compact_news(_traced_fetch(
+                "duckduckgo_news",
+                "news",
+                f"ddg:{' '.join(query.lower().split())}:{max_results}",
+                lambda: super(CachedDuckDuckGo, self).duckduckgo_news(query, max_results),
+            ))
+
+    return {"CachedYFinanceTools": CachedYFinanceTools, "CachedDuckDuckGo": CachedDuckDuckGo}
 
-financial_advisor = Agent(
-    name="Financial Advisor",
-    role="Financial advisor for Indian retail investors providing investment guidance and market analysis",
-    model=Groq(id="llama-3.1-8b-instant"),  # Change this to use different models
-    tools=[
-        YFinanceTools(
+
+def build_toolkits() -> list:
+    """New yfinance (price, recommendations, fundamentals, news) and DuckDuckGo toolkits."""
+    classes = _toolkit_classes()
+    return [
+        classes["CachedYFinanceTools"](
             stock_price=True,
             analyst_recommendations=True,
             stock_fundamentals=True,
             company_news=True
         ),
-        DuckDuckGo()  # For web search and market context
-    ],
-    instructions=[
-        "You are a financial advisor specializing in Indian markets. ALWAYS pull real data from APIs first before answering.",
-        "",
-        "CRITICAL: DATA COLLECTION PROCESS (MUST DO THIS FIRST):",
-        "1. When asked about a company or stock name (e.g., RIL, Reliance, TCS, Infosys, RELIANCE.NS):",
-        "   - First identify the correct NSE/BSE symbol (e.g., RELIANCE.NS, TCS.NS, INFY.NS)",
-        "   - Use YFinanceTools to get: stock_price, stock_fundamentals, analyst_recommendations",
-        "   - Then use DuckDuckGo to search for: latest quarterly results, annual reports, market share data, recent news",
-        "   - Pull actual numbers from these sources - DO NOT make up or guess data",
-        "2. If asked 'Do a complete financial analysis' or similar - automatically provide FULL analysis following all sections",
-        "3. Only after collecting real data, proceed to format the answer",
-        "",
-        "REQUIRED OUTPUT FORMAT (follow this exact structure):",
-        "",
-        "## 1. How is the company doing with money?",
-        "- Latest quarter and full year: sales (revenue), profit, cash flow, debt",
-        "- 5-year summary table: Revenue, Profit, Cash from Operations, Net Debt (all in INR ₹)",
-        "- Two ratios explained in plain English:",
-        "  * P/E (price-to-earnings): explain what it means",
-        "  * Debt-to-equity: explain what it means",
-        "- DO NOT include Return on Equity (ROE) ratio",
-        "- Profit growth trend: growing or slowing?",
-        "- Margin trend: getting better or worse?",
-        "",
-        "## 2. Where does the company stand in its main businesses?",
-        "- Energy & chemicals: simple market share/position (one line)",
-        "- Telecom (Jio): subscribers, 5G progress (NO comparison to competitors)",
-        "- Retail: store count, sales growth (NO comparison to rivals)",
-        "- Use 2-3 bullets per segment with numbers",
-        "- DO NOT include industry comparison tables or competitor comparisons",
-        "",
-        "## 3. Trends that matter now",
-        "- Energy transition, data growth (5G/6G, cloud), retail formalisation",
-        "- 3-5 bullets: opportunities (why this helps) and challenges (what could hurt)",
-        "",
-        "## 4. Who runs it and what's the plan?",
-        "- One short paragraph on management and recent strategic moves",
-        "- Keep factual with sources",
-        "",
-        "## 5. Big picture factors",
-        "- How oil prices, India's growth, rupee, government rules affect each segment",
-        "- 3-5 bullets with sources",
-        "",
-        "## 6. What might happen next (3-5 years)",
-        "- Simple ranges for sales and profit growth with one line explanation",
-        "- Top 5 risks (oil prices, regulation, competition, delays, etc.)",
-        "",
-        "## 7. Clear takeaway for a small investor",
-        "- One line: Buy / Hold / Sell recommendation in simple language",
-        "- Suitability assessment: Does this stock suit the investor? (especially if investor profile provided)",
-        "- Price target range and time frame (12-24 months)",
-        "- Three scenarios:",
-        "  * Good case: if things go better → price about ₹X",
-        "  * Base case: if things go as expected → price about ₹Y",
-        "  * Bad case: if things go wrong → price about ₹Z",
-        "- Briefly say what needs to go right for good/base case",
-        "",
-        "## 8. Personalized Investment Plan (ONLY IF INVESTOR PROFILE PROVIDED)",
-        "Calculate using financial planning frameworks:",
-        "- Monthly Investment Capacity: Based on age and salary (use frameworks above)",
-        "- Risk-Based Allocation: Equity vs Debt allocation based on risk appetite",
-        "- Single Stock Allocation: Max % for this specific stock (diversification principle)",
-        "- Specific Recommendations:",
-        "  * Monthly SIP amount for this stock (₹X/month)",
-        "  * Lump sum allocation (if applicable)",
-        "  * Time horizon recommendation based on age",
-        "  * Allocation as % of total portfolio",
-        "- Show calculations clearly with framework used",
-        "",
-        "PERSONALIZED INVESTMENT ALLOCATION FRAMEWORK:",
-        "When investor profile is provided (age, salary, risk appetite), ALWAYS calculate and provide:",
-        "",
-        "1. TOTAL INVESTMENT CAPACITY (Use standard financial planning frameworks):",
-        "   - Rule of thumb: 20-30% of monthly salary for investments (after expenses)",
-        "   - For age 20-30: can allocate 25-30% (longer investment horizon)",
-        "   - For age 31-50: can allocate 20-25% (mid-career, family expenses)",
-        "   - For age 51+: can allocate 15-20% (approaching retirement)",
-        "   - Calculate: Monthly Investment Capacity = Monthly Salary × Allocation %",
-        "",
-        "2. RISK-BASED ASSET ALLOCATION (Modern Portfolio Theory):",
-        "   - Low Risk: 70% Debt/Fixed Income, 30% Equity (conservative)",
-        "   - Moderate Risk: 50% Debt, 50% Equity (balanced)",
-        "   - High-Moderate Risk: 30% Debt, 70% Equity (growth-oriented)",
-        "   - High Risk: 10% Debt, 90% Equity (aggressive)",
-        "",
-        "3. SINGLE STOCK ALLOCATION LIMITS (Diversification Principle):",
-        "   - Low Risk: Max 5-10% of equity portfolio in single stock",
-        "   - Moderate Risk: Max 10-15% of equity portfolio in single stock",
-        "   - High-Moderate Risk: Max 15-20% of equity portfolio in single stock",
-        "   - High Risk: Max 20-25% of equity portfolio in single stock",
-        "",
-        "4. CALCULATION EXAMPLE:",
-        "   If investor: Age 30, ₹3,00,000/month salary, Moderate risk",
-        "   - Monthly Investment Capacity: ₹3,00,000 × 25% = ₹75,000/month",
-        "   - Equity Allocation (50% of investments): ₹75,000 × 50% = ₹37,500/month",
-        "   - Single Stock Limit (10-15% of equity): ₹37,500 × 12% = ₹4,500/month",
-        "   - Annual allocation: ₹4,500 × 12 = ₹54,000/year",
+        classes["CachedDuckDuckGo"](),  # For web search and market context
+    ]
+
+
+# ============================================================================
+# TRACED MODEL
+# ============================================================================
+# Records each chat completion as an `llm` span with its token counts, and
+# whether the model asked for tools (one tool-call turn).
+
+def _usage(response):
+    # Groq reports streamed usage on the last chunk, under x_groq
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(response, "x_groq", None), "usage", None)
+    return usage
+
+
+def _record_usage(current, usage, tool_calls: bool):
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    current.attrs.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, tool_calls=tool_calls)
+    record_completion(prompt_tokens, completion_tokens, tool_calls)
+
+
+class TracedGroq(ResilientGroq):
+    def invoke(self, messages):
+        with span("llm", self.id) as current:
+            response = super().invoke(messages)
+            tool_calls = bool(response.choices and response.choices[0].message.tool_calls)
+            _record_usage(current, _usage(response), tool_calls)
+        return response
+
+    def invoke_stream(self, messages):
+        with span("llm", self.id, stream=True) as current:
+            usage = None
+            tool_calls = False
+            for chunk in super().invoke_stream(messages):
+                usage = _usage(chunk) or usage
+                if chunk.choices and chunk.choices[0].delta.tool_calls:
+                    tool_calls = True
+                yield chunk
+            _record_usage(current, usage, tool_calls)
+
+
+# ============================================================================
+# SIMPLE FINANCIAL ADVISOR AGENT
+# ============================================================================
+# You can change the model here:
+# - Groq: set LLM_MODEL, e.g. LLM_MODEL=llama-3.1-70b-versatile
+#   (TracedGroq is phi's Groq model plus the latency/token metrics above; its
+#   requests go through llm_provider.py: pooled connections, retries, hedging
+#   and the LLM_FALLBACK_* chain)
+# - OpenAI: from phi.model.openai import OpenAIChat; OpenAIChat(id="gpt-4")
+# - Any other model supported by phi framework
+
+LLM_MODEL = os.getenv("LLM_MODEL", DEFAULT_MODEL)
+
+DATA_COLLECTION_INSTRUCTIONS = [
+    "You are a financial advisor specializing in Indian markets. ALWAYS pull real data from APIs first before answering.",
+    "",
+    "CRITICAL: DATA COLLECTION PROCESS (MUST DO THIS FIRST):",
+    "1. When asked about a company or stock name (e.g., RIL, Reliance, TCS, Infosys, RELIANCE.NS):",
+    "   - If the question gives a 'Resolved stock symbol', use it directly - do not look it up again",
+    "   - Otherwise, first identify the correct NSE/BSE symbol (e.g., RELIANCE.NS, TCS.NS, INFY.NS)",
+    "   - Use YFinanceTools to get: stock_price, stock_fundamentals, analyst_recommendations",
+    "   - Then use DuckDuckGo to search for: latest quarterly results, annual reports, market share data, recent news",
+    "   - Pull actual numbers from these sources - DO NOT make up or guess data",
+    "2. If asked 'Do a complete financial analysis' or similar - automatically provide FULL analysis following all sections",
+    "   - If the question has a HISTORY AND COMPUTED METRICS block, take the 5-year table, growth rates,",
+    "     margin trends and the three scenario prices from it - do not estimate them yourself",
+    "3. Only after collecting real data, proceed to format the answer",
+    "",
+]
+
+# Used instead of DATA_COLLECTION_INSTRUCTIONS when the data was fetched
+# ahead of time and is handed to the model inside the question
+PROVIDED_DATA_INSTRUCTIONS = [
+    "You are a financial advisor specializing in Indian markets.",
+    "",
+    "CRITICAL: USE THE PROVIDED DATA:",
+    "1. The question contains a DATA CONTEXT block with real data already fetched for you:",
+    "   current price, fundamentals, analyst recommendations, recent news and web search results",
+    "2. Take every number from the DATA CONTEXT - DO NOT make up or guess data",
+    "3. If something you need is not in the DATA CONTEXT, say 'not available'",
+    "4. Use the links in the DATA CONTEXT as your sources",
+    "5. The HISTORY AND COMPUTED METRICS block has the annual summary for Section 1, growth rates for",
+    "   Section 6 and the good/base/bad scenario prices for Section 7 - use those numbers as given",
+    "",
+]
+
+# The report format is kept in parts so each request gets only what it needs
+# (see build_instructions)
+REPORT_SECTIONS = [
+    "REQUIRED OUTPUT FORMAT (follow this exact structure):",
+    "",
+    "## 1. How is the company doing with money?",
+    "- Latest quarter and full year: sales (revenue), profit, cash flow, debt",
+    "- 5-year summary table: Revenue, Profit, Cash from Operations, Net Debt (all in INR ₹)",
+    "- Two ratios explained in plain English:",
+    "  * P/E (price-to-earnings): explain what it means",
+    "  * Debt-to-equity: explain what it means",
+    "- DO NOT include Return on Equity (ROE) ratio",
+    "- Profit growth trend: growing or slowing?",
+    "- Margin trend: getting better or worse?",
+    "",
+    "## 2. Where does the company stand in its main businesses?",
+    "- Energy & chemicals: simple market share/position (one line)",
+    "- Telecom (Jio): subscribers, 5G progress (NO comparison to competitors)",
+    "- Retail: store count, sales growth (NO comparison to rivals)",
+    "- Use 2-3 bullets per segment with numbers",
+    "- DO NOT include industry comparison tables or competitor comparisons",
+    "",
+    "## 3. Trends that matter now",
+    "- Energy transition, data growth (5G/6G, cloud), retail formalisation",
+    "- 3-5 bullets: opportunities (why this helps) and challenges (what could hurt)",
+    "",
+    "## 4. Who runs it and what's the plan?",
+    "- One short paragraph on management and recent strategic moves",
+    "- Keep factual with sources",
+    "",
+    "## 5. Big picture factors",
+    "- How oil prices, India's growth, rupee, government rules affect each segment",
+    "- 3-5 bullets with sources",
+    "",
+    "## 6. What might happen next (3-5 years)",
+    "- Simple ranges for sales and profit growth with one line explanation",
+    "- Top 5 risks (oil prices, regulation, competition, delays, etc.)",
+    "",
+    "## 7. Clear takeaway for a small investor",
+    "- One line: Buy / Hold / Sell recommendation in simple language",
+    "- Suitability assessment: Does this stock suit the investor? (especially if investor profile provided)",
+    "- Price target range and time frame (12-24 months)",
+    "- Three scenarios:",
+    "  * Good case: if things go better → price about ₹X",
+    "  * Base case: if things go as expected → price about ₹Y",
+    "  * Bad case: if things go wrong → price about ₹Z",
+    "- Briefly say what needs to go right for good/base case",
+    "",
+]
+
+PROFILE_SECTION = [
+    "## 8. Personalized Investment Plan (ONLY IF INVESTOR PROFILE PROVIDED)",
+    "The question contains a PRE-COMPUTED ALLOCATION block worked out with standard",
+    "financial planning frameworks (age-based investment capacity, risk-based equity/debt",
+    "split, single stock diversification limits). Copy its numbers exactly - DO NOT recalculate:",
+    "- Monthly Investment Capacity",
+    "- Risk-Based Allocation: Equity vs Debt",
+    "- Single Stock Allocation limit for this stock",
+    "- Specific Recommendations:",
+    "  * Monthly SIP amount for this stock (₹X/month) and the yearly total",
+    "  * Allocation as % of total portfolio",
+    "  * Lump sum: only if it fits within the yearly total",
+    "  * Time horizon recommendation",
+    "- Show the calculation lines from the block so the investor can follow them",
+    "- Say whether this stock suits the investor given the risk level",
+    "",
+]
+
+WRITING_RULES = [
+    "WRITING RULES:",
+    "- Use very simple English",
+    "- If you must use a finance word, explain it in brackets the first time",
+    "- Keep main answer under 600 words (plus tables and sources)",
+    "- Show dates clearly (e.g., 'Q2 FY26, reported on 20 Oct 2025')",
+    "- If data isn't available, say 'not available' - DO NOT guess",
+    "- Include sources with clickable links at the end",
+    "- Format tables properly in markdown",
+    "- Use INR (₹) for all currency amounts",
+    "- Be conservative and realistic",
+    "- Use professional financial planning frameworks",
+    "- DO NOT include industry comparison tables or competitor analysis",
+    "- Focus only on the specific company asked about, not comparisons with other companies",
+    "- DO NOT include disclaimers about 'hypothetical values' or 'may not be up-to-date'",
+    "- DO NOT include ROE (Return on Equity) ratio in any financial analysis",
+    "- DO NOT compare segments with rivals or competitors",
+    "- Only provide data for the specific company asked about"
+]
+
+PROFILE_RULES = [
+    "- ALWAYS provide personalized allocation when investor profile is given",
+]
+
+REPORT_INSTRUCTIONS = REPORT_SECTIONS + PROFILE_SECTION + WRITING_RULES + PROFILE_RULES
+ADVISOR_INSTRUCTIONS = DATA_COLLECTION_INSTRUCTIONS + REPORT_INSTRUCTIONS
+ANALYST_INSTRUCTIONS = PROVIDED_DATA_INSTRUCTIONS + REPORT_INSTRUCTIONS
+
+
+# One section of the report at a time (report_store.py rewrites only stale sections)
+SECTION_FORMATS = {}
+for _line in REPORT_SECTIONS + PROFILE_SECTION:
+    _heading = re.match(r"## (\d)\.", _line)
+    if _heading:
+        _number = _heading.group(1)
+        SECTION_FORMATS[_number] = []
+    if SECTION_FORMATS and _line:
+        SECTION_FORMATS[_number].append(_line)
+SECTION_HEADINGS = {
+    number: re.sub(r"\s*\(ONLY IF .*\)$", "", lines[0]) for number, lines in SECTION_FORMATS.items()
+}
+# Rules about the whole report that a single section must not follow
+_REPORT_ONLY_RULES = {
+    "- Keep main answer under 600 words (plus tables and sources)",
+    "- Include sources with clickable links at the end",
+}
+_ONE_SECTION_RULE = "- Write only this section: no introduction, no other sections, no sources list at the end"
+SECTION_RULES = [rule for rule in WRITING_RULES if rule not in _REPORT_ONLY_RULES] + [
+    "- Keep the section under 150 words (plus tables)",
+    _ONE_SECTION_RULE,
+    "- Put source links inline where you use them",
+]
+# The opening before Section 1, rewritten on its own when it is the stale part
+INTRO_FORMAT = [
+    "REQUIRED OUTPUT FORMAT: write ONLY the opening lines of a longer report (they come before Section 1):",
+    "- A title line: # <Company name> (<ticker>) - Financial Analysis",
+    "- One or two sentences on what the company does and where its share price stands today",
+    "- No numbered sections, no other headings, no sources list",
+    "",
+]
+
+
+def build_section_instructions(number: str) -> List[str]:
+    """Instructions for writing one report section (or the "intro") from a DATA CONTEXT block."""
+    if number == "intro":
+        return PROVIDED_DATA_INSTRUCTIONS + INTRO_FORMAT + [rule for rule in SECTION_RULES if rule != _ONE_SECTION_RULE]
+    return PROVIDED_DATA_INSTRUCTIONS + [
+        "REQUIRED OUTPUT FORMAT: write ONE section of a longer report, starting with this exact heading:",
+        SECTION_HEADINGS[number],
         "",
-        "5. SIP RECOMMENDATION (Systematic Investment Plan):",
-        "   - Suggest SIP amount within single stock allocation limit",
-        "   - For moderate risk: 10-15% of monthly equity allocation",
-        "   - Provide both monthly SIP and lump sum option",
+        *SECTION_FORMATS[number][1:],
         "",
-        "WRITING RULES:",
-        "- Use very simple English",
-        "- If you must use a finance word, explain it in brackets the first time",
-        "- Keep main answer under 600 words (plus tables and sources)",
-        "- Show dates clearly (e.g., 'Q2 FY26, reported on 20 Oct 2025')",
-        "- If data isn't available, say 'not available' - DO NOT guess",
-        "- Include sources with clickable links at the end",
-        "- Format tables properly in markdown",
-        "- ALWAYS provide personalized allocation when investor profile is given",
-        "- Use INR (₹) for all currency amounts",
-        "- Be conservative and realistic",
-        "- Use professional financial planning frameworks",
-        "- DO NOT include industry comparison tables or competitor analysis",
-        "- Focus only on the specific company asked about, not comparisons with other companies",
-        "- DO NOT include disclaimers about 'hypothetical values' or 'may not be up-to-date'",
-        "- DO NOT include ROE (Return on Equity) ratio in any financial analysis",
-        "- DO NOT compare segments with rivals or competitors",
-        "- Only provide data for the specific company asked about"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
+    ] + SECTION_RULES
+
+
+def build_instructions(provided_data: bool = False, has_profile: bool = False) -> List[str]:
+    """
+    Instructions for one request: the data-collection or provided-data lead,
+    and Section 8 plus the profile rule only when there is an investor
+    profile. Records the tokens saved against the full instructions.
+    """
+    instructions = PROVIDED_DATA_INSTRUCTIONS if provided_data else DATA_COLLECTION_INSTRUCTIONS
+    instructions = instructions + REPORT_SECTIONS
+    if has_profile:
+        instructions = instructions + PROFILE_SECTION
+    instructions = instructions + WRITING_RULES
+    if has_profile:
+        instructions = instructions + PROFILE_RULES
+    full = ANALYST_INSTRUCTIONS if provided_data else ADVISOR_INSTRUCTIONS
+    record_compaction("instructions", estimate_tokens("\n".join(full)), estimate_tokens("\n".join(instructions)))
+    return instructions
+
+
+def run_agent(agent: Agent, message: str, instructions: Optional[List[str]] = None, **kwargs):
+    """`agent.run(message)` with per-request instructions; the agent's own are restored afterwards."""
+    default = agent.instructions
+    if instructions is not None:
+        agent.instructions = instructions
+    try:
+        return agent.run(message, **kwargs)
+    finally:
+        agent.instructions = default
+
+
+def stream_agent(agent: Agent, message: str, instructions: Optional[List[str]] = None, **kwargs) -> Iterator:
+    """Streaming version of run_agent; the instructions are restored once the stream ends."""
+    default = agent.instructions
+    if instructions is not None:
+        agent.instructions = instructions
+    try:
+        yield from agent.run(message, stream=True, **kwargs)
+    finally:
+        agent.instructions = default
+
+
+def build_financial_advisor() -> Agent:
+    """
+    Build a new tool-equipped financial advisor agent.
+
+    Agents keep per-run state (run_response, memory), so concurrent callers
+    should each get their own instance instead of sharing one.
+    """
+    return Agent(
+        name="Financial Advisor",
+        role="Financial advisor for Indian retail investors providing investment guidance and market analysis",
+        model=TracedGroq(id=LLM_MODEL),  # Change LLM_MODEL to use a different model
+        tools=build_toolkits(),
+        instructions=ADVISOR_INSTRUCTIONS,
+        show_tool_calls=True,
+        markdown=True,
+    )
+
+
+def build_financial_analyst() -> Agent:
+    """
+    Build a new advisor agent that writes the full report from pre-fetched
+    data. It has no tools, so the whole analysis is a single LLM call.
+    """
+    return Agent(
+        name="Financial Analyst",
+        role="Financial advisor for Indian retail investors writing analysis from provided market data",
+        model=TracedGroq(id=LLM_MODEL),
+        instructions=ANALYST_INSTRUCTIONS,
+        show_tool_calls=False,
+        markdown=True,
+    )
+
 
 # ============================================================================
 # ALTERNATIVE: Agent without tools (pure LLM)
 # ============================================================================
 # If you want to test with just the LLM without any tools:
 
-financial_advisor_pure = Agent(
-    name="Financial Advisor (Pure LLM)",
-    role="Financial advisor for Indian retail investors",
-    model=Groq(id="llama-3.1-8b-instant"),
-    # No tools - just pure LLM responses
-    instructions=[
-        "You are a knowledgeable financial advisor specializing in Indian markets",
-        "Provide clear, actionable investment advice for Indian retail investors",
-        "Always consider the investor's profile (age, income, risk appetite)",
-        "Use INR (₹) for all currency amounts",
-        "Reference NSE/BSE when discussing Indian stocks",
-        "Be conservative and realistic in recommendations",
-        "Provide specific, actionable advice"
-    ],
-    show_tool_calls=False,
-    markdown=True,
-)
+PURE_ADVISOR_INSTRUCTIONS = [
+    "You are a knowledgeable financial advisor specializing in Indian markets",
+    "Provide clear, actionable investment advice for Indian retail investors",
+    "Always consider the investor's profile (age, income, risk appetite)",
+    "Use INR (₹) for all currency amounts",
+    "Reference NSE/BSE when discussing Indian stocks",
+    "Be conservative and realistic in recommendations",
+    "Provide specific, actionable advice"
+]
+
+
+def build_financial_advisor_pure() -> Agent:
+    """Build a new financial advisor agent without tools (pure LLM)."""
+    return Agent(
+        name="Financial Advisor (Pure LLM)",
+        role="Financial advisor for Indian retail investors",
+        model=TracedGroq(id=LLM_MODEL),
+        # No tools - just pure LLM responses
+        instructions=PURE_ADVISOR_INSTRUCTIONS,
+        show_tool_calls=False,
+        markdown=True,
+    )
+
+
+# ============================================================================
+# SHARED AGENTS (built on first use)
+# ============================================================================
+# `from financial_agent import financial_advisor` keeps working, but nothing
+# is built at import time: importing this module (and every API worker
+# start) only pays for the imports. The API builds its own agents per pool.
+
+_SHARED_AGENTS = {
+    "financial_advisor": build_financial_advisor,
+    "financial_advisor_pure": build_financial_advisor_pure,
+}
+
+
+def __getattr__(name: str):
+    if name in _SHARED_AGENTS:
+        return globals().setdefault(name, _SHARED_AGENTS[name]())
+    if name in ("CachedYFinanceTools", "CachedDuckDuckGo"):
+        return _toolkit_classes()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ============================================================================
 # EXAMPLE USAGE
@@ -216,8 +531,7 @@ if __name__ == "__main__":
     print("  response = financial_advisor.run(question)")
     print("  print(response)")
     print("\n" + "="*80)
-    print("\nTo use a different model, edit financial_agent.py:")
-    print("  - Groq: Groq(id='llama-3.1-8b-instant')")
-    print("  - Groq (larger): Groq(id='llama-3.1-70b-versatile')")
-    print("  - OpenAI: from phi.model.openai import OpenAIChat; OpenAIChat(id='gpt-4')")
+    print("\nTo use a different model, set LLM_MODEL (default llama-3.1-8b-instant):")
+    print("  - Groq (larger): LLM_MODEL=llama-3.1-70b-versatile")
+    print("  - Fallbacks: LLM_FALLBACK_MODELS, LLM_FALLBACK_BASE_URL/LLM_FALLBACK_MODEL (OpenAI-compatible)")
     print("="*80 + "\n")
@@ -10,9 +10,14 @@ const errorState = document.getElementById('errorState');
 const errorMessage = document.getElementById('errorMessage');
 const questionAsked = document.getElementById('questionAsked');
 const closeResults = document.getElementById('closeResults');
+const newSessionBtn = document.getElementById('newSessionBtn');
 
-// API endpoint
-const API_URL = 'http://localhost:8000/api/ask';
+// API endpoints
+const STREAM_URL = 'http://localhost:8000/api/ask/stream';
+const SESSION_URL = 'http://localhost:8000/api/session';
+const SESSION_KEY = 'advisorSessionId';
+const loadingMessage = loadingState.querySelector('p');
+const DEFAULT_LOADING_MESSAGE = loadingMessage.textContent;
 
 // Handle form submission
 questionForm.addEventListener('submit', async (e) => {
@@ -56,38 +61,104 @@ questionForm.addEventListener('submit', async (e) => {
         if (age) formData.append('age', age);
         if (monthlySalary) formData.append('monthly_salary', monthlySalary);
         if (riskAppetite) formData.append('risk_appetite', riskAppetite);
+        formData.append('session_id', getSessionId());
         
-        // Make API call
-        const response = await fetch(API_URL, {
-            method: 'POST',
-            body: formData
-        });
+        // Stream the answer and render it as it arrives
+        let answerText = '';
+        let renderScheduled = false;
         
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
+        const renderPartial = () => {
+            renderScheduled = false;
+            displayAnswer(answerText, false);
+        };
         
-        const data = await response.json();
-        
-        if (data.success) {
-            // Display answer
-            displayAnswer(data.answer);
-        } else {
-            const errorMsg = data.message || data.error_details || 'Failed to get answer';
-            throw new Error(errorMsg);
-        }
+        await streamAnswer(formData, (event, data) => {
+            if (event === 'status') {
+                loadingMessage.textContent = data.message;
+            } else if (event === 'tool') {
+                const toolName = (data.call || '').split('(')[0];
+                loadingMessage.textContent = data.status === 'started'
+                    ? `Fetching data: ${toolName}...`
+                    : `Got data: ${toolName}`;
+            } else if (event === 'token') {
+                // Hide the spinner once the first words arrive
+                loadingState.style.display = 'none';
+                answerText += data.text;
+                if (!renderScheduled) {
+                    renderScheduled = true;
+                    requestAnimationFrame(renderPartial);
+                }
+            } else if (event === 'done') {
+                answerText = data.answer || answerText;
+                displayAnswer(answerText);
+                newSessionBtn.style.display = 'flex';
+            } else if (event === 'error') {
+                throw new Error(data.message || 'Failed to get answer');
+            }
+        });
         
     } catch (error) {
         showError(error.message || 'Failed to connect to server. Make sure the backend is running on port 8000.');
     } finally {
         loadingState.style.display = 'none';
+        loadingMessage.textContent = DEFAULT_LOADING_MESSAGE;
         submitBtn.disabled = false;
         submitBtn.innerHTML = '<i class="fas fa-paper-plane"></i> Ask Question';
     }
 });
 
+// POST the question to the streaming endpoint and call onEvent(event, data)
+// for every Server-Sent Event received
+async function streamAnswer(formData, onEvent) {
+    const response = await fetch(STREAM_URL, {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        let message = `HTTP error! status: ${response.status}`;
+        try {
+            const data = await response.json();
+            message = data.message || message;
+        } catch (e) {
+            // Not JSON, keep the status message
+        }
+        throw new Error(message);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            }
+            if (data) {
+                onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+}
+
 // Display answer with proper markdown rendering
-function displayAnswer(answerText) {
+function displayAnswer(answerText, resetScroll = true) {
     // Extract sources separately
     const { mainText, sourcesText } = extractSourcesSection(answerText);
     
@@ -258,7 +329,9 @@ function displayAnswer(answerText) {
     
     html += '</div>';
     answerOutput.innerHTML = html;
-    answerOutput.scrollTop = 0;
+    if (resetScroll) {
+        answerOutput.scrollTop = 0;
+    }
 }
 
 // Format table with proper HTML
@@ -363,6 +436,51 @@ closeResults.addEventListener('click', () => {
     resultsSection.style.display = 'none';
 });
 
+// One conversation per browser: follow-up questions reuse the profile, the
+// stocks and the data of the earlier ones
+function getSessionId() {
+    let sessionId = localStorage.getItem(SESSION_KEY);
+    if (!sessionId) {
+        sessionId = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem(SESSION_KEY, sessionId);
+    }
+    return sessionId;
+}
+
+// Fill the empty profile fields with the profile the session remembers
+async function restoreSession() {
+    const sessionId = localStorage.getItem(SESSION_KEY);
+    if (!sessionId) return;
+    try {
+        const response = await fetch(`${SESSION_URL}/${encodeURIComponent(sessionId)}`);
+        if (!response.ok) return;
+        const data = await response.json();
+        const profile = data.profile || {};
+        const fields = { age: profile.age, monthlySalary: profile.monthly_salary, riskAppetite: profile.risk_appetite };
+        for (const [id, value] of Object.entries(fields)) {
+            const input = document.getElementById(id);
+            if (value && !input.value) input.value = value;
+        }
+        newSessionBtn.style.display = data.turns ? 'flex' : 'none';
+    } catch (error) {
+        console.warn('Could not restore session:', error);
+    }
+}
+
+// Start over: forget the session, the profile and the last answer
+newSessionBtn.addEventListener('click', () => {
+    const sessionId = localStorage.getItem(SESSION_KEY);
+    if (sessionId) {
+        fetch(`${SESSION_URL}/${encodeURIComponent(sessionId)}`, { method: 'DELETE' }).catch(() => {});
+        localStorage.removeItem(SESSION_KEY);
+    }
+    questionForm.reset();
+    resultsSection.style.display = 'none';
+    newSessionBtn.style.display = 'none';
+});
+
 // Check API health on load
 async function checkAPIHealth() {
     try {
@@ -377,3 +495,4 @@ async function checkAPIHealth() {
 
 // Check on page load
 checkAPIHealth();
+restoreSession();
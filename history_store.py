@@ -0,0 +1,489 @@
+"""
+Local Price and Fundamentals History
+
+Section 1 (5-year summary), Section 6 (3-5 year ranges) and the "Three
+scenarios" of Section 7 used to be left to the model, which only ever saw
+today's price and ratios. This module keeps a local history per symbol and
+works those numbers out with NumPy:
+
+- Daily OHLCV bars in memory-mapped .npy files under HISTORY_DATA_DIR
+  (default data/history). The first request for a symbol downloads
+  HISTORY_YEARS of bars; after that only the days since the last stored bar
+  are fetched (the last bar is fetched again, as it may have been taken
+  mid-session), at most once per HISTORY_REFRESH_MINUTES. A split or a
+  dividend after the last stored bar triggers a full download, because
+  yfinance back-adjusts every older price for it and the stored bars would
+  no longer line up with the new ones. A symbol yfinance has no bars for
+  (unknown or delisted) gets an empty file, so the full download is only
+  tried again after HISTORY_REFRESH_MINUTES.
+- Annual financials (revenue, profit, operating cash flow, debt, cash),
+  refreshed weekly and merged by period, so years yfinance stops returning
+  stay in the store
+- CAGR, volatility, drawdowns, margin trends and good/base/bad price
+  scenarios computed from the stored arrays. The scenarios are a log-normal
+  range around the historical drift, so the same data always gives the same
+  numbers.
+
+Files are replaced atomically, so other workers can read them while one
+writes.
+"""
+
+import math
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from tracing import span
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")
+
+PRICE_DTYPE = np.dtype([
+    ("date", "M8[D]"), ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8"), ("volume", "f8"),
+])
+FINANCIALS_DTYPE = np.dtype([
+    ("period_end", "M8[D]"), ("revenue", "f8"), ("net_income", "f8"), ("operating_income", "f8"),
+    ("operating_cash_flow", "f8"), ("total_debt", "f8"), ("cash", "f8"),
+])
+
+# yfinance statement rows for each financials column (first one present wins)
+FINANCIAL_ROWS = {
+    "revenue": ("income_stmt", ("Total Revenue", "Operating Revenue")),
+    "net_income": ("income_stmt", ("Net Income", "Net Income Common Stockholders")),
+    "operating_income": ("income_stmt", ("Operating Income", "EBIT")),
+    "operating_cash_flow": ("cashflow", ("Operating Cash Flow", "Cash Flow From Continuing Operating Activities")),
+    "total_debt": ("balance_sheet", ("Total Debt",)),
+    "cash": ("balance_sheet", ("Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments")),
+}
+
+TRADING_DAYS = 252
+CAGR_YEARS = (1, 3, 5)
+SCENARIO_YEARS = (1, 3)
+SCENARIO_Z = 1.2816  # 10th / 90th percentile of the normal distribution
+# The scenario drift is the 5-year (or longest) CAGR, kept inside this range
+# so one boom or crash does not decide every projection
+DRIFT_RANGE = (-0.10, 0.20)
+MARGIN_STABLE_POINTS = 1.0
+
+
+# ============================================================================
+# YFINANCE DOWNLOADS
+# ============================================================================
+# Module-level so the offline benchmarks can swap in recorded data.
+
+def fetch_price_history(symbol: str, start: Optional[str] = None, years: int = 5) -> pd.DataFrame:
+    """Daily bars from `start` (YYYY-MM-DD), or the last `years` years."""
+    import yfinance as yf
+
+    ticker = yf.Ticker(symbol)
+    if start:
+        return ticker.history(start=start, interval="1d", auto_adjust=True)
+    return ticker.history(period=f"{years}y", interval="1d", auto_adjust=True)
+
+
+def fetch_financial_statements(symbol: str) -> Dict[str, pd.DataFrame]:
+    """Annual income statement, cash flow and balance sheet (rows = items, columns = period ends)."""
+    import yfinance as yf
+
+    ticker = yf.Ticker(symbol)
+    return {"income_stmt": ticker.income_stmt, "cashflow": ticker.cashflow, "balance_sheet": ticker.balance_sheet}
+
+
+def corporate_action_after(frame: pd.DataFrame, last_date: np.datetime64) -> Optional[str]:
+    """"split" or "dividend" if one happened after `last_date`, else None."""
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    after = index.to_numpy(dtype="datetime64[D]") > last_date
+    for column, reason in (("Stock Splits", "split"), ("Dividends", "dividend")):
+        if column in frame and (frame[column].fillna(0).to_numpy()[after] != 0).any():
+            return reason
+    return None
+
+
+def bars_from_frame(frame: pd.DataFrame) -> np.ndarray:
+    if frame.empty:
+        return np.empty(0, dtype=PRICE_DTYPE)  # unknown symbols come back without columns
+    frame = frame.dropna(subset=["Close"])
+    bars = np.empty(len(frame), dtype=PRICE_DTYPE)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars["date"] = index.to_numpy(dtype="datetime64[D]")
+    for column in ("open", "high", "low", "close", "volume"):
+        bars[column] = frame[column.capitalize()].to_numpy(dtype=float)
+    return bars
+
+
+def financials_from_statements(statements: Dict[str, pd.DataFrame]) -> np.ndarray:
+    periods = set()
+    for frame in statements.values():
+        if frame is not None and not frame.empty:
+            periods.update(pd.to_datetime(frame.columns))
+    periods = sorted(periods)
+    rows = np.empty(len(periods), dtype=FINANCIALS_DTYPE)
+    rows["period_end"] = np.array(periods, dtype="datetime64[D]")
+    for column, (statement, labels) in FINANCIAL_ROWS.items():
+        rows[column] = np.nan
+        frame = statements.get(statement)
+        if frame is None or frame.empty:
+            continue
+        label = next((l for l in labels if l in frame.index), None)
+        if label is None:
+            continue
+        values = frame.loc[label]
+        values.index = pd.to_datetime(values.index)
+        rows[column] = values.reindex(periods).to_numpy(dtype=float)
+    return rows
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class HistoryStore:
+    def __init__(
+        self,
+        directory: str = DEFAULT_DATA_DIR,
+        years: int = 5,
+        refresh_seconds: float = 60 * 60,
+        financials_refresh_seconds: float = 7 * 24 * 60 * 60,
+    ):
+        self.directory = directory
+        self.years = years
+        self.refresh_seconds = refresh_seconds
+        self.financials_refresh_seconds = financials_refresh_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._stats = {"full_downloads": 0, "incremental_updates": 0, "up_to_date": 0, "no_data": 0, "errors": 0}
+
+    def _path(self, symbol: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{symbol.strip().upper()}.{kind}.npy")
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(symbol.strip().upper(), threading.Lock())
+
+    @staticmethod
+    def _load(path: str) -> Optional[np.ndarray]:
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save(path: str, array: np.ndarray):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(temp, path)
+
+    @staticmethod
+    def _is_fresh(path: str, max_age: float) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) < max_age
+        except OSError:
+            return False
+
+    def _count(self, name: str):
+        with self._locks_lock:
+            self._stats[name] += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def prices(self, symbol: str) -> Optional[np.ndarray]:
+        """
+        Daily bars (PRICE_DTYPE, oldest first), updated with the missing days
+        if stale. None if yfinance has no bars for the symbol.
+        """
+        path = self._path(symbol, "prices")
+        with self._lock(symbol):
+            stored = self._load(path)
+            if stored is not None and self._is_fresh(path, self.refresh_seconds):
+                self._count("up_to_date" if len(stored) else "no_data")
+                return stored if len(stored) else None
+
+            try:
+                if stored is None or not len(stored):
+                    with span("history", "full_download", symbol=symbol):
+                        bars = bars_from_frame(fetch_price_history(symbol, years=self.years))
+                    self._count("full_downloads")
+                else:
+                    start = str(stored["date"][-1])
+                    with span("history", "incremental", symbol=symbol):
+                        frame = fetch_price_history(symbol, start=start)
+                    # Older bars are adjusted for the action already when the stored last bar is its day
+                    reason = corporate_action_after(frame, stored["date"][-1])
+                    if reason is not None:
+                        with span("history", "full_download", symbol=symbol, reason=reason):
+                            bars = bars_from_frame(fetch_price_history(symbol, years=self.years))
+                        self._count("full_downloads")
+                    else:
+                        new = bars_from_frame(frame)
+                        new = new[new["date"] >= np.datetime64(start)]
+                        if len(new):
+                            bars = np.concatenate([stored[stored["date"] < np.datetime64(start)], new])
+                        else:
+                            bars = np.array(stored)  # market closed since; saved again to mark it checked
+                        self._count("incremental_updates")
+            except Exception as e:
+                print(f"Price history update failed for {symbol}: {e}")
+                self._count("errors")
+                return stored if stored is not None and len(stored) else None
+
+            if not len(bars) and stored is not None and len(stored):
+                return stored  # keep what we have rather than a failed re-download
+            stored = None  # release the memory map before the file is replaced
+            # An empty file marks a symbol without bars until the next refresh
+            self._save(path, bars)
+            return self._load(path) if len(bars) else None
+
+    def financials(self, symbol: str) -> Optional[np.ndarray]:
+        """Annual financials (FINANCIALS_DTYPE, oldest first), refreshed weekly."""
+        path = self._path(symbol, "financials")
+        with self._lock(symbol):
+            stored = self._load(path)
+            if stored is not None and self._is_fresh(path, self.financials_refresh_seconds):
+                return stored
+            try:
+                with span("history", "financials", symbol=symbol):
+                    fetched = financials_from_statements(fetch_financial_statements(symbol))
+            except Exception as e:
+                print(f"Financials update failed for {symbol}: {e}")
+                self._count("errors")
+                return stored
+
+            if stored is not None and len(stored):
+                # Newly reported periods replace stored ones; older years are kept
+                older = stored[~np.isin(stored["period_end"], fetched["period_end"])]
+                fetched = np.concatenate([older, fetched])
+                fetched = fetched[np.argsort(fetched["period_end"])]
+            stored = None
+            self._save(path, fetched)
+            return self._load(path)
+
+    def summary(self, symbol: str) -> dict:
+        """Everything the report needs from the history: price and financial metrics."""
+        bars = self.prices(symbol)
+        financials = self.financials(symbol)
+        return {
+            "symbol": symbol,
+            "prices": price_metrics(bars) if bars is not None and len(bars) > 1 else None,
+            "financials": financial_metrics(financials) if financials is not None and len(financials) else None,
+        }
+
+    def stats(self) -> dict:
+        with self._locks_lock:
+            return {"directory": self.directory, **self._stats}
+
+
+@lru_cache(maxsize=1)
+def get_history_store() -> HistoryStore:
+    """The process-wide store, configured from HISTORY_DATA_DIR, HISTORY_YEARS and HISTORY_REFRESH_MINUTES."""
+    return HistoryStore(
+        directory=os.getenv("HISTORY_DATA_DIR", DEFAULT_DATA_DIR),
+        years=int(os.getenv("HISTORY_YEARS", "5")),
+        refresh_seconds=float(os.getenv("HISTORY_REFRESH_MINUTES", "60")) * 60,
+    )
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def cagr(first, last, years: float) -> Optional[float]:
+    if not years or not first or not last or first <= 0 or last <= 0 or math.isnan(first) or math.isnan(last):
+        return None
+    return (last / first) ** (1 / years) - 1
+
+
+def price_metrics(bars: np.ndarray) -> dict:
+    """CAGR, volatility, drawdowns and scenario prices from daily bars."""
+    dates = bars["date"]
+    close = np.asarray(bars["close"], dtype=float)
+    last_date = dates[-1]
+
+    returns = {}
+    for years in CAGR_YEARS:
+        cutoff = last_date - np.timedelta64(round(365.25 * years), "D")
+        start = int(np.searchsorted(dates, cutoff))
+        # Need (almost) the whole period, not a listing that started last month
+        if dates[start] - cutoff > np.timedelta64(14, "D"):
+            returns[years] = None
+            continue
+        span_years = (last_date - dates[start]).astype(int) / 365.25
+        returns[years] = cagr(close[start], close[-1], span_years)
+
+    log_returns = np.diff(np.log(close))
+    volatility_1y = float(np.std(log_returns[-TRADING_DAYS:], ddof=1) * math.sqrt(TRADING_DAYS))
+    volatility = float(np.std(log_returns, ddof=1) * math.sqrt(TRADING_DAYS))
+
+    drawdowns = close / np.maximum.accumulate(close) - 1
+    trough = int(np.argmin(drawdowns))
+    peak = int(np.argmax(close[:trough + 1]))
+    last_year = dates >= last_date - np.timedelta64(365, "D")
+
+    history_years = (last_date - dates[0]).astype(int) / 365.25
+    drift = next((returns[y] for y in sorted(CAGR_YEARS, reverse=True) if returns[y] is not None), None)
+    if drift is None:
+        drift = cagr(close[0], close[-1], history_years) or 0.0
+    drift = min(max(drift, DRIFT_RANGE[0]), DRIFT_RANGE[1])
+
+    return {
+        "from": str(dates[0]),
+        "to": str(last_date),
+        "last_close": float(close[-1]),
+        "cagr": returns,
+        "volatility_1y": volatility_1y,
+        "volatility": volatility,
+        "max_drawdown": float(drawdowns[trough]),
+        "max_drawdown_peak": str(dates[peak]),
+        "max_drawdown_trough": str(dates[trough]),
+        "current_drawdown": float(drawdowns[-1]),
+        "high_1y": float(np.max(bars["high"][last_year])),
+        "low_1y": float(np.min(bars["low"][last_year])),
+        "scenarios": scenario_prices(float(close[-1]), drift, volatility),
+        "scenario_drift": drift,
+    }
+
+
+def scenario_prices(price: float, drift: float, volatility: float, horizons=SCENARIO_YEARS) -> Dict[int, dict]:
+    """
+    Good/base/bad prices after each horizon (years): the median of a
+    log-normal with the given annual drift, and its 90th / 10th percentiles.
+    """
+    mu = math.log1p(drift)
+    result = {}
+    for years in horizons:
+        spread = SCENARIO_Z * volatility * math.sqrt(years)
+        base = price * math.exp(mu * years)
+        result[years] = {
+            "bad": base * math.exp(-spread),
+            "base": base,
+            "good": base * math.exp(spread),
+        }
+    return result
+
+
+def financial_metrics(rows: np.ndarray) -> dict:
+    """Per-year summary, growth and margin trends from annual financials."""
+    rows = rows[~np.isnan(rows["revenue"])]
+    if not len(rows):
+        return {"years": []}
+    revenue = rows["revenue"]
+    net_income = rows["net_income"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        net_margin = net_income / revenue
+        operating_margin = rows["operating_income"] / revenue
+    net_debt = rows["total_debt"] - rows["cash"]
+
+    years = []
+    for i in range(len(rows)):
+        years.append({
+            "period_end": str(rows["period_end"][i]),
+            "revenue": float(revenue[i]),
+            "net_income": float(net_income[i]),
+            "operating_cash_flow": float(rows["operating_cash_flow"][i]),
+            "net_debt": float(net_debt[i]),
+            "net_margin": float(net_margin[i]),
+            "operating_margin": float(operating_margin[i]),
+        })
+
+    span_years = (rows["period_end"][-1] - rows["period_end"][0]).astype(int) / 365.25
+    return {
+        "years": years,
+        "revenue_cagr": cagr(revenue[0], revenue[-1], span_years),
+        "profit_cagr": cagr(net_income[0], net_income[-1], span_years),
+        "net_margin_trend": _trend(net_margin),
+        "operating_margin_trend": _trend(operating_margin),
+    }
+
+
+def _trend(margins: np.ndarray) -> Optional[dict]:
+    valid = margins[~np.isnan(margins)]
+    if len(valid) < 2:
+        return None
+    change = float((valid[-1] - valid[0]) * 100)
+    if abs(change) < MARGIN_STABLE_POINTS:
+        direction = "stable"
+    else:
+        direction = "improving" if change > 0 else "worsening"
+    return {"from": float(valid[0]), "to": float(valid[-1]), "change_points": change, "direction": direction}
+
+
+# ============================================================================
+# PROMPT BLOCK
+# ============================================================================
+
+def _pct(value: Optional[float]) -> str:
+    return "not available" if value is None or math.isnan(value) else f"{value * 100:+.1f}%"
+
+
+def _crore(value: float) -> str:
+    if value is None or math.isnan(value):
+        return "n/a"
+    return f"{'-' if value < 0 else ''}₹{abs(value) / 1e7:,.0f} cr"
+
+
+def format_history(summary: dict) -> str:
+    """HISTORY block for the prompt, with the numbers for Sections 1, 6 and 7."""
+    lines = [f"HISTORY AND COMPUTED METRICS for {summary['symbol']} (from stored daily prices and annual reports; "
+             "use these numbers as given, do not recalculate):"]
+
+    prices = summary.get("prices")
+    if prices:
+        cagr_text = ", ".join(f"{y}y {_pct(prices['cagr'][y])}" for y in CAGR_YEARS)
+        lines.append(f"- Price history {prices['from']} to {prices['to']}, last close ₹{prices['last_close']:,.2f}")
+        lines.append(f"- Price CAGR: {cagr_text}")
+        lines.append(
+            f"- Volatility (annualized): last year {prices['volatility_1y'] * 100:.1f}%, "
+            f"whole period {prices['volatility'] * 100:.1f}%"
+        )
+        lines.append(
+            f"- Max drawdown: {_pct(prices['max_drawdown'])} ({prices['max_drawdown_peak']} to "
+            f"{prices['max_drawdown_trough']}); now {_pct(prices['current_drawdown'])} from the peak"
+        )
+        lines.append(f"- 1-year range: ₹{prices['low_1y']:,.2f} - ₹{prices['high_1y']:,.2f}")
+        lines.append(
+            f"- Three scenarios (use in Section 7; drift {_pct(prices['scenario_drift'])}/year, "
+            "good/bad = 90th/10th percentile):"
+        )
+        for years, scenario in prices["scenarios"].items():
+            lines.append(
+                f"  * {years} year{'s' if years > 1 else ''}: good ₹{scenario['good']:,.0f}, "
+                f"base ₹{scenario['base']:,.0f}, bad ₹{scenario['bad']:,.0f}"
+            )
+    else:
+        lines.append("- Price history: not available")
+
+    financials = summary.get("financials")
+    if financials and financials["years"]:
+        lines.append("- Annual summary (use for the Section 1 table):")
+        lines.append("  | Year end | Revenue | Profit | Cash from operations | Net debt | Net margin |")
+        lines.append("  |---|---|---|---|---|---|")
+        for year in financials["years"]:
+            margin = "n/a" if math.isnan(year["net_margin"]) else f"{year['net_margin'] * 100:.1f}%"
+            lines.append(
+                f"  | {year['period_end']} | {_crore(year['revenue'])} | {_crore(year['net_income'])} | "
+                f"{_crore(year['operating_cash_flow'])} | {_crore(year['net_debt'])} | {margin} |"
+            )
+        lines.append(
+            f"- Growth per year over these years (use for Section 6 ranges): revenue "
+            f"{_pct(financials['revenue_cagr'])}, profit {_pct(financials['profit_cagr'])}"
+        )
+        for name, key in (("Net margin", "net_margin_trend"), ("Operating margin", "operating_margin_trend")):
+            trend = financials[key]
+            if trend:
+                lines.append(
+                    f"- {name} trend: {trend['direction']} ({trend['from'] * 100:.1f}% -> "
+                    f"{trend['to'] * 100:.1f}%, {trend['change_points']:+.1f} points)"
+                )
+    else:
+        lines.append("- Annual financials: not available")
+    return "\n".join(lines)
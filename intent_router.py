@@ -0,0 +1,209 @@
+"""
+Intent Router
+
+Decides how a question is answered before any LLM is involved:
+
+- price: "What is the current price of Reliance?" - answered from cached
+  yfinance data with a template, no LLM call
+- fundamentals: "TCS P/E ratio and market cap" - same, from fundamentals
+- full_analysis: just a stock name ("TCS", "Reliance Industries") - the full
+  8-section report
+- advice: everything else - the tool-equipped agent when the question is
+  about a company or market data, the pure LLM agent for general questions
+  ("How much should I keep in an emergency fund?")
+
+Lookups only apply without an investor profile and without advice wording:
+"Should I buy TCS at this price?" is advice, not a price lookup. If a lookup
+can't be answered from the data (e.g. yfinance is down) the caller falls back
+to the agent.
+
+In a session the previous question's route is passed in: a question that
+names no company but points back ("Should I buy it?", "What is its P/E?")
+is about the previous stock, and "And what about Infosys?" after a full
+analysis asks for the same analysis of Infosys.
+"""
+
+import json
+import re
+from typing import NamedTuple, Optional
+
+from prefetch import FUNDAMENTAL_LABELS, format_number, prefetch_stock_data
+from symbol_index import SymbolMatch, get_symbol_index
+
+PRICE = "price"
+FUNDAMENTALS = "fundamentals"
+FULL_ANALYSIS = "full_analysis"
+ADVICE = "advice"
+
+QUESTION_WORDS = {
+    "what", "should", "tell", "analyze", "analyse", "give", "how", "why", "when", "where",
+    "explain", "recommend", "advice", "is", "are", "does", "do", "can", "will", "which",
+}
+
+ADVICE_PATTERN = re.compile(
+    r"\b(should|invest\w*|buy|sell|hold|recommend\w*|advi[cs]e|suit\w*|allocat\w*|portfolio|sip|"
+    r"worth|good|target|outlook|future|forecast|compare|vs|versus|better|risk\w*|why|analy[sz]\w*)\b",
+    re.IGNORECASE,
+)
+
+PRICE_PATTERN = re.compile(
+    r"\b(price|trading at|quote|ltp|cmp|how much is|share value|stock value)\b",
+    re.IGNORECASE,
+)
+
+# Wording that means the answer needs live market data, even when no listed
+# company was recognized ("Is Suzlon stock a buy?")
+MARKET_DATA_PATTERN = re.compile(
+    r"\b(stocks?|shares?|price|ltd|limited|nse|bse|ticker|sensex|nifty|quarterly|results|earnings)\b",
+    re.IGNORECASE,
+)
+
+# Follow-ups in a session: wording that points back at the stock discussed
+# before, and "what about <stock>?" after a full analysis. A bare "it" or
+# "this" only counts when the question ends with it ("What is the target
+# price for it?") or is very short ("Is it overvalued?"), and never when the
+# question names another asset: "Is it a good time to buy gold?" and "Is it
+# a good time to invest?" are not about the last stock
+REFERENCE_PATTERN = re.compile(
+    r"\b(its|(this|that|the|same) (stock|share|company|one))\b",
+    re.IGNORECASE,
+)
+BARE_REFERENCE_PATTERN = re.compile(r"\b(it|this|that|them)\b", re.IGNORECASE)
+TRAILING_REFERENCE_PATTERN = re.compile(r"\b(it|this|that|them)\W*$", re.IGNORECASE)
+BARE_REFERENCE_MAX_WORDS = 5
+OTHER_SUBJECT_PATTERN = re.compile(
+    r"\b(gold|silver|bitcoin|crypto\w*|real estate|propert(y|ies)|fds?|fixed deposits?|mutual funds?|"
+    r"etfs?|index funds?|bonds?|ppf|nps|epf|insurance|markets?|nifty|sensex|economy)\b",
+    re.IGNORECASE,
+)
+WHAT_ABOUT_PATTERN = re.compile(r"^\W*(and\s+)?(what|how)\s+about\b", re.IGNORECASE)
+
+# Fundamentals keys (see prefetch.FUNDAMENTAL_LABELS) and the phrases that ask for them
+FIELD_PATTERNS = {
+    "market_cap": re.compile(r"\bmarket ?cap\w*\b", re.IGNORECASE),
+    "pe_ratio": re.compile(r"(?<!\w)(p/?e|pe ratio|price[- ]to[- ]earnings?)(?!\w)", re.IGNORECASE),
+    "pb_ratio": re.compile(r"(?<!\w)(p/?b|price[- ]to[- ]book|book value)(?!\w)", re.IGNORECASE),
+    "eps": re.compile(r"\b(eps|earnings per share)\b", re.IGNORECASE),
+    "dividend_yield": re.compile(r"\bdividends?\b", re.IGNORECASE),
+    "beta": re.compile(r"\bbeta\b", re.IGNORECASE),
+    # "52-week high" -> high only, "52 week range" or just "52 week" -> both
+    "52_week_high": re.compile(
+        r"\b(?:52[- ]?w(?:ee)?k(?:\s+(?:high|range)\b|(?!\s*(?:high|low)\b))|yearly\s+(?:high|range)\b)", re.IGNORECASE
+    ),
+    "52_week_low": re.compile(
+        r"\b(?:52[- ]?w(?:ee)?k(?:\s+(?:low|range)\b|(?!\s*(?:high|low)\b))|yearly\s+(?:low|range)\b)", re.IGNORECASE
+    ),
+    "sector": re.compile(r"\bsector\b", re.IGNORECASE),
+    "industry": re.compile(r"\bindustry\b", re.IGNORECASE),
+}
+FUNDAMENTALS_PATTERN = re.compile(r"\b(fundamentals?|key ratios|ratios|valuation)\b", re.IGNORECASE)
+
+
+class Route(NamedTuple):
+    intent: str
+    match: Optional[SymbolMatch]
+    fields: tuple = ()  # fundamentals keys asked for (empty = all)
+
+
+def is_stock_name_only(question: str) -> bool:
+    """A short question with no question words, like 'TCS', 'Wipro?' or 'Reliance Industries'."""
+    text = question.strip().lower().rstrip("?!").strip()
+    words = re.findall(r"[a-z0-9&.'\-]+", text)
+    return (
+        0 < len(words) <= 3
+        and not any(word in QUESTION_WORDS for word in words)
+        and not text.startswith("?")
+    )
+
+
+def needs_market_data(question: str, route: "Route") -> bool:
+    """Whether an advice question needs the tool-equipped agent."""
+    return route.match is not None or bool(MARKET_DATA_PATTERN.search(question))
+
+
+def refers_back(question: str) -> bool:
+    """Whether a question that names no company is about the stock discussed before."""
+    if REFERENCE_PATTERN.search(question):
+        return True
+    if not BARE_REFERENCE_PATTERN.search(question) or OTHER_SUBJECT_PATTERN.search(question):
+        return False
+    return len(question.split()) <= BARE_REFERENCE_MAX_WORDS or bool(TRAILING_REFERENCE_PATTERN.search(question))
+
+
+def _lookup_fields(question: str) -> Optional[tuple]:
+    """Fundamentals keys asked for; () for 'all fundamentals', None if not a fundamentals question."""
+    fields = tuple(key for key, pattern in FIELD_PATTERNS.items() if pattern.search(question))
+    if fields:
+        return fields
+    return () if FUNDAMENTALS_PATTERN.search(question) else None
+
+
+def classify(question: str, has_profile: bool = False, previous: Optional[Route] = None) -> Route:
+    """
+    Pick the intent for a question. Takes microseconds; no network calls.
+    `previous` is the route of the session's last question, for follow-ups.
+    """
+    index = get_symbol_index()
+    is_lookup = _lookup_fields(question) is not None or PRICE_PATTERN.search(question)
+
+    if is_stock_name_only(question) and not is_lookup:
+        return Route(FULL_ANALYSIS, index.resolve(question))
+
+    match = index.find_in_text(question)
+    if previous is not None:
+        if match is None and previous.match is not None and refers_back(question):
+            match = previous.match
+        elif match is not None and previous.intent == FULL_ANALYSIS and not is_lookup and WHAT_ABOUT_PATTERN.search(question):
+            return Route(FULL_ANALYSIS, match)
+    if match is None or has_profile or not is_lookup or ADVICE_PATTERN.search(question):
+        return Route(ADVICE, match)
+
+    fields = _lookup_fields(question)
+    if fields is not None:
+        return Route(FUNDAMENTALS, match, fields)
+    return Route(PRICE, match)
+
+
+# ============================================================================
+# TEMPLATE ANSWERS
+# ============================================================================
+
+def price_answer(match: SymbolMatch, price_text: str, fetched_at) -> Optional[str]:
+    try:
+        price = float(price_text)
+    except (TypeError, ValueError):
+        return None
+    return (
+        f"**{match.name} ({match.symbol})** is trading at **₹{price:,.2f}**.\n\n"
+        f"_Source: Yahoo Finance, as of {fetched_at:%d %b %Y %H:%M} IST. Prices may be delayed._"
+    )
+
+
+def fundamentals_answer(match: SymbolMatch, fundamentals_text: str, fields: tuple, fetched_at) -> Optional[str]:
+    try:
+        fundamentals = json.loads(fundamentals_text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(fundamentals, dict):
+        return None
+
+    lines = [
+        f"## {match.name} ({match.symbol})",
+        "",
+        "| Metric | Value |",
+        "|---|---|",
+    ]
+    for key in fields or tuple(FUNDAMENTAL_LABELS):
+        lines.append(f"| {FUNDAMENTAL_LABELS[key]} | {format_number(fundamentals.get(key))} |")
+    lines.append("")
+    lines.append(f"_Source: Yahoo Finance, as of {fetched_at:%d %b %Y %H:%M} IST._")
+    return "\n".join(lines)
+
+
+async def answer_lookup(route: Route) -> Optional[str]:
+    """Answer a price or fundamentals lookup from (cached) yfinance data, or None."""
+    source = "price" if route.intent == PRICE else "fundamentals"
+    data = await prefetch_stock_data(route.match, sources=(source,))
+    if route.intent == PRICE:
+        return price_answer(route.match, data["raw"]["price"], data["fetched_at"])
+    return fundamentals_answer(route.match, data["raw"]["fundamentals"], route.fields, data["fetched_at"])
@@ -0,0 +1,322 @@
+"""
+Resilient LLM Provider Layer
+
+phi's Groq model builds a new HTTP client for every completion, and any 429,
+timeout or slow response used to surface as a failed request. Completions
+now go through one LLMClient per process:
+
+- one pooled httpx client per endpoint, shared by every agent and thread
+- rate limits, timeouts and 5xx errors are retried with jittered
+  exponential backoff (honouring Retry-After when it is short enough)
+- with LLM_HEDGE_AFTER_MS set, a request (or stream, until its first chunk)
+  still pending after that latency target gets a duplicate on the next
+  endpoint of the chain (the same one when it is the last), so a slow
+  provider is raced against another; whichever answers first wins and the
+  other is dropped
+- when an endpoint keeps failing the request moves down an ordered chain:
+  the primary Groq model, other Groq models (they have their own rate
+  limits), then an optional OpenAI-compatible endpoint
+- LLMUnavailableError (with a retry_after hint) once the chain is exhausted
+  or the deadline has passed
+
+The agent-level fallback (tools agent to pure agent) is in backend_api.
+Everything is configured from the environment (settings_from_env) and can
+be exercised against benchmarks/fake_llm.py, which injects errors and slow
+responses on request.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import groq
+import httpx
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+from phi.model.groq import Groq
+
+from tracing import LLM_FALLBACKS, LLM_HEDGES, LLM_RETRIES
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+
+def _sdk_errors(name: str) -> tuple:
+    """
+    The `name` error class of groq and, once an OpenAI-compatible endpoint
+    has been used, of openai (imported only then: it is slow to import).
+    """
+    return tuple(getattr(sdk, name) for sdk in (groq, sys.modules.get("openai")) if sdk is not None)
+
+
+class Endpoint(NamedTuple):
+    provider: str  # groq or openai (any OpenAI-compatible server)
+    model: str
+    base_url: Optional[str] = None  # None: the SDK default (GROQ_BASE_URL / OPENAI_BASE_URL)
+    api_key: Optional[str] = None  # None: GROQ_API_KEY / OPENAI_API_KEY
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class LLMSettings(NamedTuple):
+    fallbacks: Tuple[Endpoint, ...] = ()  # tried in order after the agent's own model
+    max_retries: int = 2  # per endpoint
+    backoff_seconds: float = 0.5  # first retry waits up to this long, doubling each time
+    backoff_max_seconds: float = 8.0  # a longer Retry-After moves on to the next endpoint
+    hedge_after: Optional[float] = None  # seconds; None turns hedging off
+    timeout: float = 60.0  # per HTTP request
+    deadline: float = 90.0  # for one completion, retries and fallbacks included
+    max_connections: int = 32
+
+
+class LLMUnavailableError(Exception):
+    """Every endpoint in the chain failed (or the deadline passed)."""
+
+    def __init__(self, message: str, retry_after: int = 10):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None) if isinstance(error, _sdk_errors("APIStatusError")) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = _status(error)
+    return isinstance(error, _sdk_errors("APIConnectionError")) or status in (408, 409, 429) or (status or 0) >= 500
+
+
+def is_tool_call_error(error: Exception) -> bool:
+    """Groq rejects a completion whose tool call the model got wrong (400 tool_use_failed)."""
+    return _status(error) == 400 and ("tool_use_failed" in str(error) or "Failed to call a function" in str(error))
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _reason(error: Exception) -> str:
+    status = _status(error)
+    if status == 429:
+        return "rate_limit"
+    if status is not None:
+        return f"http_{status}"
+    return "timeout" if isinstance(error, _sdk_errors("APITimeoutError")) else "connection"
+
+
+class LLMClient:
+    def __init__(self, settings: LLMSettings, transport: Optional[httpx.BaseTransport] = None):
+        self.settings = settings
+        self.transport = transport  # tests pass an httpx.MockTransport
+        self._clients = {}
+        self._lock = threading.Lock()
+        # Runs hedged requests; an unhedged request stays on the caller's thread
+        self._hedge_executor = ThreadPoolExecutor(max_workers=2 * settings.max_connections, thread_name_prefix="llm-hedge")
+
+    # ------------------------------------------------------------------
+    # Connection pooling
+    # ------------------------------------------------------------------
+    def client(self, endpoint: Endpoint):
+        """The SDK client for `endpoint`, created once and kept (with its connection pool)."""
+        key = (endpoint.provider, endpoint.base_url, endpoint.api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                http_client = httpx.Client(
+                    transport=self.transport,
+                    timeout=self.settings.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.settings.max_connections,
+                        max_keepalive_connections=self.settings.max_connections,
+                    ),
+                )
+                if endpoint.provider == "groq":
+                    sdk = groq.Groq
+                else:
+                    import openai
+
+                    sdk = openai.OpenAI
+                params = {"max_retries": 0, "timeout": self.settings.timeout, "http_client": http_client}
+                if endpoint.base_url:
+                    params["base_url"] = endpoint.base_url
+                if endpoint.api_key:
+                    params["api_key"] = endpoint.api_key
+                client = self._clients[key] = sdk(**params)
+            return client
+
+    def chain(self, model: str) -> List[Endpoint]:
+        primary = Endpoint("groq", model)
+        return [primary] + [e for e in self.settings.fallbacks if e != primary]
+
+    # ------------------------------------------------------------------
+    # Completions
+    # ------------------------------------------------------------------
+    def complete(self, model: str, messages: List[dict], **kwargs) -> ChatCompletion:
+        def start(endpoint: Endpoint):
+            response = self.client(endpoint).chat.completions.create(model=endpoint.model, messages=messages, **kwargs)
+            return response if endpoint.provider == "groq" else ChatCompletion.model_validate(response.model_dump())
+
+        return self._with_fallback(model, start)
+
+    def stream(self, model: str, messages: List[dict], **kwargs):
+        """
+        Stream of completion chunks. Retries, hedging and fallback apply
+        until the first chunk arrives; an error after that is raised as is.
+        """
+        def start(endpoint: Endpoint):
+            stream = self.client(endpoint).chat.completions.create(
+                model=endpoint.model, messages=messages, stream=True, **kwargs
+            )
+            chunks = iter(stream)
+            first = next(chunks, None)
+            return endpoint, stream, chunks, first
+
+        endpoint, stream, chunks, first = self._with_fallback(model, start, close=lambda opened: opened[1].close())
+        convert = (lambda c: c) if endpoint.provider == "groq" else (
+            lambda c: ChatCompletionChunk.model_validate(c.model_dump())
+        )
+        try:
+            if first is not None:
+                yield convert(first)
+            for chunk in chunks:
+                yield convert(chunk)
+        finally:
+            stream.close()
+
+    def _with_fallback(self, model: str, start: Callable, close: Optional[Callable] = None):
+        settings = self.settings
+        started = time.monotonic()
+        chain = self.chain(model)
+        last_error: Optional[Exception] = None
+        for index, endpoint in enumerate(chain):
+            if index:
+                LLM_FALLBACKS.inc(source=chain[index - 1].name, target=endpoint.name)
+                print(f"LLM: falling back from {chain[index - 1].name} to {endpoint.name} ({last_error})")
+            for attempt in range(settings.max_retries + 1):
+                try:
+                    hedge_to = chain[index + 1] if index + 1 < len(chain) else endpoint
+                    return self._hedged(endpoint, hedge_to, start, close)
+                except Exception as error:
+                    if not is_retryable(error):
+                        if index == 0:
+                            raise
+                        # A misconfigured fallback must not hide the primary's error
+                        last_error = last_error or error
+                        break
+                    last_error = error
+                    delay = random.uniform(0, min(settings.backoff_max_seconds, settings.backoff_seconds * 2 ** attempt))
+                    retry_after = _retry_after(error)
+                    if retry_after is not None:
+                        delay = max(delay, retry_after)
+                    if (attempt == settings.max_retries or delay > settings.backoff_max_seconds
+                            or time.monotonic() - started + delay > settings.deadline):
+                        break
+                    LLM_RETRIES.inc(endpoint=endpoint.name, reason=_reason(error))
+                    time.sleep(delay)
+            if time.monotonic() - started > settings.deadline:
+                break
+        retry_after = _retry_after(last_error) if last_error is not None else None
+        raise LLMUnavailableError(
+            f"No LLM endpoint answered ({', '.join(e.name for e in chain)}): {last_error}",
+            retry_after=max(1, round(retry_after or settings.backoff_max_seconds)),
+        ) from last_error
+
+    def _hedged(self, endpoint: Endpoint, hedge_to: Endpoint, start: Callable, close: Optional[Callable] = None):
+        """`start(endpoint)`, plus `start(hedge_to)` if it hasn't finished within hedge_after."""
+        if not self.settings.hedge_after:
+            return start(endpoint)
+        primary = self._hedge_executor.submit(start, endpoint)
+        try:
+            return primary.result(timeout=self.settings.hedge_after)
+        except FutureTimeoutError:
+            pass
+        hedge = self._hedge_executor.submit(start, hedge_to)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for winner in done:
+                if winner.exception() is not None:
+                    error = error or winner.exception()
+                    continue
+                LLM_HEDGES.inc(endpoint=endpoint.name, winner="primary" if winner is primary else "hedge")
+                if close is not None:
+                    # The slower one is closed whenever it gets there
+                    for loser in pending | (done - {winner}):
+                        loser.add_done_callback(lambda f: f.exception() is None and close(f.result()))
+                return winner.result()
+        raise error
+
+    def stats(self) -> dict:
+        settings = self.settings
+        return {
+            "fallbacks": [e.name for e in settings.fallbacks],
+            "max_retries": settings.max_retries,
+            "hedge_after_ms": round(settings.hedge_after * 1000) if settings.hedge_after else None,
+            "timeout_seconds": settings.timeout,
+            "deadline_seconds": settings.deadline,
+            "clients": len(self._clients),
+        }
+
+
+def settings_from_env() -> LLMSettings:
+    """
+    LLM_FALLBACK_MODELS: other Groq models to try, comma-separated
+    LLM_FALLBACK_BASE_URL / LLM_FALLBACK_MODEL / LLM_FALLBACK_API_KEY: an
+      OpenAI-compatible endpoint at the end of the chain
+    LLM_MAX_RETRIES, LLM_BACKOFF_SECONDS, LLM_BACKOFF_MAX_SECONDS: retry policy
+    LLM_HEDGE_AFTER_MS: latency target after which a request is also sent to the next endpoint (0 = off)
+    LLM_TIMEOUT_SECONDS / LLM_DEADLINE_SECONDS: per request / per completion
+    LLM_MAX_CONNECTIONS: pooled connections per endpoint
+    """
+    fallbacks = [Endpoint("groq", m.strip()) for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+    if os.getenv("LLM_FALLBACK_BASE_URL"):
+        fallbacks.append(Endpoint(
+            "openai",
+            os.getenv("LLM_FALLBACK_MODEL", "gpt-4o-mini"),
+            os.getenv("LLM_FALLBACK_BASE_URL"),
+            os.getenv("LLM_FALLBACK_API_KEY") or None,
+        ))
+    hedge_after_ms = float(os.getenv("LLM_HEDGE_AFTER_MS", "0"))
+    return LLMSettings(
+        fallbacks=tuple(fallbacks),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        backoff_seconds=float(os.getenv("LLM_BACKOFF_SECONDS", "0.5")),
+        backoff_max_seconds=float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8")),
+        hedge_after=hedge_after_ms / 1000 if hedge_after_ms > 0 else None,
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+        deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "90")),
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm_client() -> LLMClient:
+    """The process-wide client, built from the environment on first use."""
+    return LLMClient(settings_from_env())
+
+
+class ResilientGroq(Groq):
+    """phi's Groq model, with its requests sent through the shared LLMClient."""
+
+    def invoke(self, messages):
+        return get_llm_client().complete(
+            self.id, [self.format_message(m) for m in messages], **self.request_kwargs
+        )
+
+    def invoke_stream(self, messages):
+        yield from get_llm_client().stream(
+            self.id, [self.format_message(m) for m in messages], **self.request_kwargs
+        )
@@ -0,0 +1,175 @@
+"""
+Concurrent Data Pre-fetch for Full Stock Analyses
+
+For a "stock name only" question the tool-equipped agent used to call
+yfinance and DuckDuckGo one after another, one LLM turn per call. This stage
+fetches everything a full analysis needs at the same time, turns it into a
+compact DATA CONTEXT block and lets a tool-less agent write the report in a
+single LLM call.
+
+All fetches go through the cached toolkits, so popular stocks are usually
+served from the tool cache, and their outputs are already compacted
+(context_compaction.py). The price and financials history comes from the
+local history store (history_store.py), which only downloads missing days.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence
+
+from context_compaction import (
+    COMPACTION_LEVELS,
+    FUNDAMENTAL_LABELS,
+    IST,
+    normalize_news,
+    normalize_recommendations,
+    normalize_search,
+)
+from financial_agent import build_toolkits
+from history_store import format_history, get_history_store
+from symbol_index import SymbolMatch
+
+
+@lru_cache(maxsize=None)
+def _toolkits():
+    """The yfinance and DuckDuckGo toolkits, built on the first prefetch."""
+    return build_toolkits()
+
+
+# Sources in a full DATA CONTEXT, in the order they are listed
+DATA_PARTS = ("price", "fundamentals", "recommendations", "news", "search", "history")
+
+# Shared by all requests; each prefetch submits one task per data source
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="prefetch")
+
+
+def _fetchers(match: SymbolMatch) -> Dict[str, Callable[[], str]]:
+    symbol = match.symbol
+    company = match.name
+    # The toolkits are looked up on the worker threads, so building them
+    # (and importing yfinance) on the first call stays off the event loop
+    return {
+        "price": lambda: _toolkits()[0].get_current_stock_price(symbol),
+        "fundamentals": lambda: _toolkits()[0].get_stock_fundamentals(symbol),
+        "recommendations": lambda: _toolkits()[0].get_analyst_recommendations(symbol),
+        "news": lambda: _toolkits()[0].get_company_news(symbol, num_stories=5),
+        "search": lambda: _toolkits()[1].duckduckgo_search(f"{company} latest quarterly results annual report", max_results=5),
+        "history": lambda: get_history_store().summary(symbol),
+    }
+
+
+def _timed(fetch: Callable[[], str]):
+    started = time.perf_counter()
+    try:
+        result = fetch()
+    except Exception as e:
+        result = f"Error: {e}"
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def prefetch_stock_data(match: SymbolMatch, sources: Optional[Sequence[str]] = None) -> dict:
+    """
+    Fetch price, fundamentals, recommendations, news, search results and the
+    history metrics for one stock concurrently (or only the given `sources`).
+    Returns the raw tool outputs (the history as a summary dict) plus
+    per-source timings in milliseconds.
+    """
+    loop = asyncio.get_running_loop()
+    fetchers = _fetchers(match)
+    if sources is not None:
+        fetchers = {name: fetchers[name] for name in sources}
+    started = time.perf_counter()
+    # Each fetch runs in a copy of this context so its spans land in the request trace
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_executor, contextvars.copy_context().run, _timed, fetch) for fetch in fetchers.values())
+    )
+    raw = {}
+    timings = {}
+    for name, (result, elapsed_ms) in zip(fetchers, results):
+        raw[name] = result
+        timings[name] = round(elapsed_ms, 1)
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return {"match": match, "raw": raw, "timings_ms": timings, "fetched_at": datetime.now(IST)}
+
+
+# ============================================================================
+# DATA CONTEXT
+# ============================================================================
+
+def _load_json(text: str):
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_number(value) -> str:
+    if value in (None, "", "N/A"):
+        return "not available"
+    if isinstance(value, (int, float)):
+        if abs(value) >= 1e7:
+            return f"₹{value / 1e7:,.0f} crore"
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def build_data_context(data: dict, level: Optional[dict] = None, parts: Optional[Sequence[str]] = None) -> str:
+    """
+    Turn pre-fetched tool outputs into a compact block for the prompt.
+    `level` (a COMPACTION_LEVELS entry) sets how many news and search items to keep;
+    `parts` limits the block to those sources (e.g. for rewriting one report section).
+    """
+    level = level or COMPACTION_LEVELS[0]
+    parts = set(parts or DATA_PARTS)
+    match: SymbolMatch = data["match"]
+    raw = data["raw"]
+    lines = [
+        f"DATA CONTEXT for {match.name} ({match.symbol}), fetched {data['fetched_at']:%d %b %Y %H:%M} IST:",
+    ]
+
+    if "price" in parts:
+        try:
+            lines.append(f"- Current price: ₹{float(raw.get('price')):,.2f}")
+        except (TypeError, ValueError):
+            lines.append("- Current price: not available")
+
+    if "fundamentals" in parts:
+        fundamentals = _load_json(raw.get("fundamentals", ""))
+        if isinstance(fundamentals, dict):
+            lines.append("- Fundamentals:")
+            for key, label in FUNDAMENTAL_LABELS.items():
+                lines.append(f"  * {label}: {format_number(fundamentals.get(key))}")
+        else:
+            lines.append("- Fundamentals: not available")
+
+    if "recommendations" in parts:
+        recommendations = normalize_recommendations(raw.get("recommendations", ""))
+        if recommendations:
+            counts = ", ".join(f"{k} {v}" for k, v in recommendations.items() if v is not None)
+            lines.append(f"- Analyst recommendations (latest month): {counts}")
+        else:
+            lines.append("- Analyst recommendations: not available")
+
+    if "news" in parts:
+        news = normalize_news(raw.get("news", ""), level["news"])
+        lines.append("- Recent news:" if news else "- Recent news: not available")
+        for item in news:
+            lines.append(f"  * {item['date']} {item['title']} ({item['publisher']}) {item['link']}".rstrip())
+
+    if "search" in parts:
+        search = normalize_search(raw.get("search", ""), level["search"], level["snippet_chars"])
+        lines.append("- Web search (latest results, reports):" if search else "- Web search: not available")
+        for item in search:
+            lines.append(f"  * {item['title']}: {item['snippet']} ({item['link']})")
+
+    history = raw.get("history")
+    if "history" in parts and isinstance(history, dict):
+        lines.append("")
+        lines.append(format_history(history))
+
+    return "\n".join(lines)
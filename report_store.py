@@ -0,0 +1,231 @@
+"""
+Section-level Report Store
+
+A full analysis has eight fixed sections (`## 1.` ... `## 8.`), and most of
+them don't change within a day: business segments, management and the big
+picture read the same at 10:00 and at 14:00. Only the takeaway moves with
+the price, and Section 8 with the investor profile. Finished reports are
+therefore stored split by section, each part tagged with the versions of
+the data it was written from:
+
+- price: the price in 1% bands (PRICE_BAND), so small moves don't count
+- fundamentals, recommendations, news, search, financials: digests of the
+  fields the report uses
+- day: the IST trading day, so narrative sections are rewritten daily
+- profile: the investor profile bucket (the Section 8 numbers)
+
+For a new request the stored parts whose versions still match are reused
+and only the stale sections (the intro counts as one) are written again,
+one small LLM call each with just the data that section needs. The sources
+list is rebuilt from the data without the LLM. Sections 7 and 8 are stored per profile
+bucket, so per-profile variants of the same stock only rewrite those two.
+
+Like the response cache, the store lives in the process.
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from context_compaction import (
+    COMPACTION_LEVELS,
+    normalize_news,
+    normalize_recommendations,
+    normalize_search,
+    project_fundamentals,
+)
+
+SECTIONS = ("1", "2", "3", "4", "5", "6", "7", "8")
+PROFILE_SECTIONS = ("7", "8")  # stored per investor profile bucket
+
+# Data versions each section is written from
+SECTION_INPUTS = {
+    "1": ("fundamentals", "financials"),
+    "2": ("search", "day"),
+    "3": ("news", "day"),
+    "4": ("search", "day"),
+    "5": ("news", "day"),
+    "6": ("financials", "day"),
+    "7": ("price", "recommendations", "financials", "profile"),
+    "8": ("price", "profile"),
+    "intro": ("day",),
+    "sources": ("news", "search"),
+}
+
+# DATA CONTEXT parts (prefetch.build_data_context) a section rewrite gets
+SECTION_DATA = {
+    "intro": ("price", "fundamentals"),
+    "1": ("price", "fundamentals", "history"),
+    "2": ("fundamentals", "search"),
+    "3": ("news", "search"),
+    "4": ("news", "search"),
+    "5": ("fundamentals", "news", "search"),
+    "6": ("fundamentals", "history"),
+    "7": ("price", "fundamentals", "recommendations", "history"),
+    "8": ("price",),
+}
+
+PRICE_BAND = 0.01
+# Fundamentals that move with the price; the price version covers them
+PRICE_DRIVEN_FIELDS = ("market_cap", "pe_ratio", "pb_ratio", "dividend_yield")
+
+_HEADING = re.compile(r"^\s*#{1,4}\s*\**\s*([1-8])\.(?!\d)", re.MULTILINE)
+_SOURCES = re.compile(r"^\s*(?:#{1,4}\s*|\*\*)?\s*(?:sources|references)\b", re.MULTILINE | re.IGNORECASE)
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def data_versions(data: dict, profile: str) -> Dict[str, str]:
+    """Versions of the pre-fetched data (prefetch_stock_data) and the profile bucket."""
+    raw = data["raw"]
+    try:
+        price = str(round(math.log(float(raw.get("price"))) / math.log1p(PRICE_BAND)))
+    except (TypeError, ValueError):
+        price = "n/a"
+    fundamentals = project_fundamentals(raw.get("fundamentals", "")) or {}
+    history = raw.get("history") if isinstance(raw.get("history"), dict) else {}
+    level = COMPACTION_LEVELS[0]
+    return {
+        "price": price,
+        "fundamentals": _digest({k: v for k, v in fundamentals.items() if k not in PRICE_DRIVEN_FIELDS}),
+        "recommendations": _digest(normalize_recommendations(raw.get("recommendations", ""))),
+        "news": _digest(sorted(n["title"] for n in normalize_news(raw.get("news", ""), level["news"]))),
+        "search": _digest(sorted(r["title"] for r in normalize_search(raw.get("search", ""), level["search"]))),
+        "financials": _digest(history.get("financials")),
+        "day": f"{data['fetched_at']:%Y-%m-%d}",
+        "profile": profile,
+    }
+
+
+def split_report(answer: str, has_profile: bool) -> Optional[Dict[str, str]]:
+    """
+    Parts of a full report: intro, sections "1".."8" and the trailing
+    sources list. None if a section is missing or repeated. Without a
+    profile a Section 8 (usually "no profile provided") is dropped.
+    """
+    headings = list(_HEADING.finditer(answer))
+    numbers = tuple(m.group(1) for m in headings)
+    if numbers not in (SECTIONS, SECTIONS[:-1]) or (has_profile and numbers != SECTIONS):
+        return None
+    parts = {"intro": answer[:headings[0].start()].strip()}
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(answer)
+        parts[match.group(1)] = answer[match.start():end].strip()
+    last = numbers[-1]
+    sources = _SOURCES.search(parts[last], 1)
+    parts["sources"] = ""
+    if sources:
+        parts["sources"] = parts[last][sources.start():].strip()
+        parts[last] = parts[last][:sources.start()].strip()
+    if not has_profile:
+        parts.pop("8", None)
+    return parts
+
+
+def section_text(number: str, text: str, heading: Optional[str]) -> str:
+    """A rewritten section from its heading on (the heading is added if the model left it out)."""
+    if number == "intro":
+        # Everything before a numbered section, in case the model went on writing
+        first = _HEADING.search(text)
+        return text[:first.start() if first else len(text)].strip()
+    for match in _HEADING.finditer(text):
+        if match.group(1) == number:
+            text = text[match.start():]
+            nxt = next((m for m in _HEADING.finditer(text, 1) if m.group(1) != number), None)
+            return text[:nxt.start() if nxt else len(text)].strip()
+    return f"{heading}\n\n{text.strip()}"
+
+
+def format_sources(data: dict) -> str:
+    """Sources list built from the pre-fetched news and search links."""
+    level = COMPACTION_LEVELS[0]
+    items = normalize_news(data["raw"].get("news", ""), level["news"])
+    items += normalize_search(data["raw"].get("search", ""), level["search"])
+    links = [f"- [{item['title']}]({item['link']})" for item in items if item.get("link")]
+    return "**Sources:**\n" + "\n".join(links) if links else ""
+
+
+def assemble(parts: Dict[str, str], has_profile: bool) -> str:
+    order = ["intro", *(SECTIONS if has_profile else SECTIONS[:-1]), "sources"]
+    return "\n\n".join(parts[name] for name in order if parts.get(name))
+
+
+class ReportStore:
+    def __init__(self, max_reports: int = 256, max_age: float = 24 * 60 * 60, max_profiles: int = 8):
+        self.max_reports = max(1, max_reports)
+        self.max_age = max_age  # seconds; older parts are rewritten whatever their versions
+        self.max_profiles = max(1, max_profiles)  # Section 7/8 variants kept per stock
+
+        self._reports: "OrderedDict[str, OrderedDict]" = OrderedDict()  # symbol -> part key -> entry
+        self._lock = threading.Lock()
+        self._counts = {"reused": 0, "regenerated": 0, "assembled": 0}
+
+    @staticmethod
+    def _key(part: str, versions: Dict[str, str]) -> str:
+        return f"{part}|{versions['profile']}" if part in PROFILE_SECTIONS else part
+
+    def plan(self, symbol: str, versions: Dict[str, str], has_profile: bool) -> dict:
+        """
+        Which parts of the report for `symbol` can be reused as they are
+        (`parts`) and which sections must be written again (`stale`).
+        """
+        wanted = ["intro", *(SECTIONS if has_profile else SECTIONS[:-1]), "sources"]
+        parts = {}
+        now = time.time()
+        with self._lock:
+            report = self._reports.get(symbol)
+            if report is not None:
+                self._reports.move_to_end(symbol)
+                for part in wanted:
+                    entry = report.get(self._key(part, versions))
+                    if entry is None or now - entry["created_at"] > self.max_age:
+                        continue
+                    if all(entry["versions"].get(k) == versions[k] for k in SECTION_INPUTS[part]):
+                        parts[part] = entry["text"]
+        stale = [part for part in wanted if part in SECTION_DATA and part not in parts]
+        return {"symbol": symbol, "versions": versions, "has_profile": has_profile, "parts": parts, "stale": stale}
+
+    def save(self, symbol: str, versions: Dict[str, str], parts: Dict[str, str]):
+        """Store report parts written from `versions`."""
+        now = time.time()
+        with self._lock:
+            report = self._reports.setdefault(symbol, OrderedDict())
+            self._reports.move_to_end(symbol)
+            for part, text in parts.items():
+                key = self._key(part, versions)
+                report[key] = {"text": text, "versions": dict(versions), "created_at": now}
+                report.move_to_end(key)
+            # Keep the Section 7/8 variants of the most recent max_profiles profile buckets
+            buckets = list(OrderedDict.fromkeys(k.split("|", 1)[1] for k in report if "|" in k))
+            for bucket in buckets[:-self.max_profiles]:
+                for part in PROFILE_SECTIONS:
+                    report.pop(f"{part}|{bucket}", None)
+            while len(self._reports) > self.max_reports:
+                self._reports.popitem(last=False)
+
+    def count(self, reused: int = 0, regenerated: int = 0, assembled: int = 0):
+        with self._lock:
+            self._counts["reused"] += reused
+            self._counts["regenerated"] += regenerated
+            self._counts["assembled"] += assembled
+
+    def clear(self):
+        with self._lock:
+            self._reports.clear()
+            self._counts = {"reused": 0, "regenerated": 0, "assembled": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reports": len(self._reports),
+                "max_reports": self.max_reports,
+                "max_age_hours": round(self.max_age / 3600, 1),
+                "sections": dict(self._counts),
+            }
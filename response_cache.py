@@ -0,0 +1,173 @@
+"""
+Single-flight Response Cache
+
+During market hours many people ask about the same stock within a minute,
+and each question used to start its own multi-turn agent run. Answers that
+go through the LLM are now keyed by what actually shapes them:
+
+- the resolved symbol (or the normalized question when none was found)
+- the intent, plus the question itself for advice and the requested fields
+  for fundamentals
+- the investor profile bucket: age band, risk level and salary, i.e. the
+  inputs of the pre-computed Section 8 allocation
+- the conversation so far, for follow-ups in a session: "Should I buy
+  it?" is answered from that session's history, so only the same history
+  shares the answer
+- the data-freshness window: answers are reused until the end of the
+  `window`-second slot they were produced in, then regenerated
+
+While a run for a key is in flight, identical requests wait for it instead
+of starting their own (served "coalesced"); finished answers stay in a
+bounded LRU until their window ends (served "cached"). Either way the
+duplicate costs no LLM tokens. The cache lives in the process, so each
+uvicorn worker has its own.
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from allocation import allocate_profile
+from intent_router import ADVICE, FUNDAMENTALS
+
+FRESH = "fresh"
+COALESCED = "coalesced"
+CACHED = "cached"
+
+
+class Flight(NamedTuple):
+    served: str  # fresh / coalesced / cached
+    entry: Optional[dict]  # the shared answer when served is coalesced or cached
+    key: Optional[str] = None
+    leader: bool = False  # this request runs the agent and must call release()
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9&]+", question.lower()))
+
+
+def profile_bucket(age, monthly_salary, risk_appetite) -> str:
+    """Everything of the profile that changes the prompt's allocation numbers."""
+    if not (age or monthly_salary or risk_appetite):
+        return "none"
+    row = allocate_profile(age, monthly_salary, risk_appetite)
+    if row.get("error"):
+        return f"invalid:{age}:{monthly_salary}:{risk_appetite}"
+    salary = "-" if monthly_salary is None else f"{round(monthly_salary)}"
+    return f"{row['age_band']}:{row['risk_appetite']}:{salary}"
+
+
+class ResponseCache:
+    def __init__(self, window: float = 300, max_entries: int = 512, wait_timeout: Optional[float] = None):
+        self.window = window  # seconds; 0 disables caching and coalescing
+        self.max_entries = max(1, max_entries)
+        self.wait_timeout = wait_timeout
+
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # key -> entry (with expires_at)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._served = {FRESH: 0, COALESCED: 0, CACHED: 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def key(self, route, question: str, age=None, monthly_salary=None, risk_appetite=None,
+            conversation: Optional[str] = None) -> Optional[str]:
+        if not self.enabled:
+            return None
+        subject = route.match.symbol if route.match else normalize_question(question)
+        if route.intent == ADVICE and route.match:
+            detail = normalize_question(question)
+        elif route.intent == FUNDAMENTALS:
+            detail = ",".join(route.fields)
+        else:
+            detail = ""
+        if conversation:
+            detail += "#" + hashlib.sha1(conversation.encode()).hexdigest()[:12]
+        slot = int(time.time() // self.window)
+        return "|".join((subject, route.intent, detail, profile_bucket(age, monthly_salary, risk_appetite), str(slot)))
+
+    def _get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _count(self, served: str):
+        with self._lock:
+            self._served[served] += 1
+
+    async def acquire(self, key: Optional[str]) -> Flight:
+        """
+        Cached answer, the answer of an identical run in flight, or the go-ahead
+        to run the agent. The leader must call release() whatever happens; if
+        its run fails the waiters try again (one of them becomes the leader).
+        """
+        if key is None:
+            self._count(FRESH)
+            return Flight(FRESH, None)
+        while True:
+            entry = self._get(key)
+            if entry is not None:
+                self._count(CACHED)
+                return Flight(CACHED, entry, key)
+
+            future = self._in_flight.get(key)
+            if future is None:
+                self._in_flight[key] = asyncio.get_running_loop().create_future()
+                self._count(FRESH)
+                return Flight(FRESH, None, key, leader=True)
+
+            try:
+                # shield() so a waiter that gives up does not cancel the shared future
+                entry = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._count(FRESH)
+                return Flight(FRESH, None, key)
+            if entry is not None:
+                self._count(COALESCED)
+                return Flight(COALESCED, entry, key)
+
+    def release(self, flight: Flight, answer: Optional[str] = None, pipeline: Optional[str] = None):
+        """Store the leader's answer (None if the run failed) and wake up the waiters."""
+        if not flight.leader:
+            return
+        entry = None
+        if answer:
+            slot = int(flight.key.rsplit("|", 1)[1])
+            entry = {"answer": answer, "pipeline": pipeline, "created_at": time.time(),
+                     "expires_at": (slot + 1) * self.window}
+            with self._lock:
+                self._entries[flight.key] = entry
+                self._entries.move_to_end(flight.key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future = self._in_flight.pop(flight.key, None)
+        if future is not None and not future.done():
+            future.set_result(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._served = {FRESH: 0, COALESCED: 0, CACHED: 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_seconds": self.window,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "in_flight": len(self._in_flight),
+                "served": dict(self._served),
+            }
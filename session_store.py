@@ -0,0 +1,315 @@
+"""
+Per-Session Conversation Memory
+
+Each /api/ask call used to be stateless: a follow-up like "and what about
+Infosys for the same profile?" had to send the investor profile again and
+the model knew nothing of the earlier answers. A request can now carry a
+session_id, and the session keeps:
+
+- the investor profile (fields a request leaves out are taken from it)
+- the stocks resolved in the session, most recent last, so "Should I buy
+  it?" is about the last one (see intent_router.classify)
+- references to the data fetched for those stocks (which sources, when),
+  not the data itself: that lives in the tool cache and history store. A
+  follow-up on a stock fetched recently is answered from that cached data by
+  the tool-less analyst instead of the tool-calling agent
+- a summarized history: each turn is the question and a one-line gist of
+  the answer (its Buy/Hold/Sell line when it has one). Once the rendered
+  history passes its token cap the oldest turns are folded into a list of
+  earlier stocks, so the block added to follow-up prompts stays bounded
+
+Sessions are kept in an LRU in memory in front of SQLite, one row of
+compressed JSON each. Workers share the SQLite file; a session found in
+memory is checked against its row's version first, so a turn handled by
+another worker is never lost and a session deleted by another worker is
+gone everywhere. Sessions idle for longer than max_age are deleted. The
+store's methods block on SQLite, so the API calls them in a thread
+(asyncio.to_thread).
+"""
+
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from context_compaction import estimate_tokens
+from symbol_index import SymbolMatch
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db")
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+MAX_SYMBOLS = 5  # stocks (and their data references) remembered per session
+MAX_EARLIER = 10  # stocks listed for turns folded out of the history
+QUESTION_CHARS = 200
+GIST_CHARS = 240
+
+_MARKDOWN = re.compile(r"[#*_`|>]+")
+_HEADING = re.compile(r"^\d\.\s")
+_RECOMMENDATION = re.compile(
+    r"(\b(recommendation|verdict|takeaway|rating)\b.*\b(buy|hold|sell|avoid|accumulate)\b)"
+    r"|^(buy|hold|sell|avoid|accumulate)\b",
+    re.IGNORECASE,
+)
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id) and bool(SESSION_ID_PATTERN.match(session_id))
+
+
+def new_session(session_id: str) -> dict:
+    now = time.time()
+    return {
+        "id": session_id,
+        "profile": {},
+        "symbols": [],  # SymbolMatch fields, most recent last
+        "data": {},  # symbol -> {"sources": [...], "fetched_at": epoch seconds}
+        "turns": [],  # {"q", "a", "intent", "symbol", "pipeline", "at"}
+        "earlier": [],  # symbols of turns folded out of the history
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def answer_gist(answer: str) -> str:
+    """One line standing for an answer: its Buy/Hold/Sell line if it has one, else its first line."""
+    lines = [_MARKDOWN.sub("", line).strip(" -:") for line in answer.splitlines()]
+    lines = [line for line in lines if line and not _HEADING.match(line)]
+    if not lines:
+        return ""
+    recommendation = next((line for line in lines if _RECOMMENDATION.search(line)), None)
+    return _clip(recommendation or lines[0], GIST_CHARS)
+
+
+# ============================================================================
+# SESSION CONTENTS
+# ============================================================================
+
+def merge_profile(session: dict, age, monthly_salary, risk_appetite) -> Tuple:
+    """The request's profile with the fields it leaves out taken from the session (which keeps the result)."""
+    given = {"age": age, "monthly_salary": monthly_salary, "risk_appetite": risk_appetite}
+    session["profile"].update({field: value for field, value in given.items() if value})
+    profile = session["profile"]
+    return profile.get("age"), profile.get("monthly_salary"), profile.get("risk_appetite")
+
+
+def last_symbol(session: dict) -> Optional[SymbolMatch]:
+    return SymbolMatch(**session["symbols"][-1]) if session["symbols"] else None
+
+
+def last_intent(session: dict) -> Optional[str]:
+    return session["turns"][-1]["intent"] if session["turns"] else None
+
+
+def remember_symbol(session: dict, match: Optional[SymbolMatch]):
+    if match is None:
+        return
+    session["symbols"] = [s for s in session["symbols"] if s["symbol"] != match.symbol][-(MAX_SYMBOLS - 1):]
+    session["symbols"].append(match._asdict())
+    kept = {s["symbol"] for s in session["symbols"]}
+    session["data"] = {symbol: ref for symbol, ref in session["data"].items() if symbol in kept}
+
+
+def remember_data(session: dict, symbol: str, sources, fetched_at: float):
+    """Note that `sources` were fetched for `symbol` (the data stays in the tool cache)."""
+    session["data"][symbol] = {"sources": list(sources), "fetched_at": fetched_at}
+
+
+def has_recent_data(session: dict, symbol: str, max_age: float) -> bool:
+    ref = session["data"].get(symbol)
+    return ref is not None and time.time() - ref["fetched_at"] <= max_age
+
+
+def render_history(session: dict) -> str:
+    """The CONVERSATION SO FAR block for follow-up prompts ("" before the first answer)."""
+    if not session["turns"] and not session["earlier"]:
+        return ""
+    lines = ["CONVERSATION SO FAR (earlier questions in this session, oldest first):"]
+    if session["earlier"]:
+        lines.append(f"- Before that the investor asked about: {', '.join(session['earlier'])}")
+    for turn in session["turns"]:
+        about = f" [{turn['symbol']}]" if turn.get("symbol") else ""
+        lines.append(f"- Q{about}: {turn['q']}")
+        if turn["a"]:
+            lines.append(f"  A: {turn['a']}")
+    lines.append("Use it only to understand the new question (e.g. what 'it' refers to); answer the new question.")
+    return "\n".join(lines)
+
+
+def add_turn(session: dict, question: str, answer: str, intent: str, symbol: Optional[str], pipeline: str, max_tokens: int):
+    """Append a turn, then fold the oldest turns until the history fits `max_tokens`."""
+    session["turns"].append({
+        "q": _clip(question, QUESTION_CHARS),
+        "a": answer_gist(answer),
+        "intent": intent,
+        "symbol": symbol,
+        "pipeline": pipeline,
+        "at": time.time(),
+    })
+    while len(session["turns"]) > 1 and estimate_tokens(render_history(session)) > max_tokens:
+        oldest = session["turns"].pop(0)
+        if oldest["symbol"] and oldest["symbol"] not in session["earlier"]:
+            session["earlier"].append(oldest["symbol"])
+            session["earlier"] = session["earlier"][-MAX_EARLIER:]
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class SessionStore:
+    def __init__(
+        self,
+        db_path: Optional[str] = DEFAULT_DB_PATH,
+        max_sessions: int = 1024,
+        max_age: float = 7 * 24 * 60 * 60,
+    ):
+        self.db_path = db_path  # None: memory only
+        self.max_sessions = max(1, max_sessions)
+        self.max_age = max_age  # seconds since the last turn
+
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._saves = 0
+        self._counts = {"memory_hits": 0, "db_loads": 0, "created": 0}
+
+    # ------------------------------------------------------------------
+    # SQLite tier
+    # ------------------------------------------------------------------
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Opened on first use in each process (workers are forked after import)."""
+        if self.db_path and self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _db_version(self, session_id: str) -> Optional[float]:
+        row = self._connection().execute("SELECT updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def _db_load(self, session_id: str) -> Optional[dict]:
+        try:
+            row = self._connection().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            return json.loads(zlib.decompress(row[0])) if row else None
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"Session store read failed: {e}")
+            return None
+
+    def _db_save(self, session: dict):
+        blob = zlib.compress(json.dumps(session, separators=(",", ":"), ensure_ascii=False).encode())
+        try:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session["id"], blob, session["updated_at"]),
+            )
+            self._saves += 1
+            # Drop idle sessions every so often so the file stays small
+            if self._saves % 256 == 0:
+                db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.max_age,))
+        except sqlite3.Error as e:
+            print(f"Session store write failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def _remember(self, session: dict):
+        self._sessions[session["id"]] = session
+        self._sessions.move_to_end(session["id"])
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def find(self, session_id: str) -> Optional[dict]:
+        """A copy of the session, or None if it doesn't exist (or has been idle too long)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if self.db_path:
+                try:
+                    version = self._db_version(session_id)
+                except sqlite3.Error as e:
+                    print(f"Session store read failed: {e}")
+                    version = session["updated_at"] if session is not None else None  # use the copy in memory
+                if version is None:
+                    # Not saved, or deleted by another worker ("New conversation")
+                    self._sessions.pop(session_id, None)
+                    session = None
+                elif session is None or version > session["updated_at"]:
+                    # Not in memory, or another worker has added a turn since
+                    session = self._db_load(session_id)
+                    if session is not None:
+                        self._counts["db_loads"] += 1
+                        self._remember(session)
+                else:
+                    self._counts["memory_hits"] += 1
+            elif session is not None:
+                self._counts["memory_hits"] += 1
+            if session is None or time.time() - session["updated_at"] > self.max_age:
+                return None
+            self._sessions.move_to_end(session_id)
+            return copy.deepcopy(session)
+
+    def get(self, session_id: str) -> dict:
+        """The session (a copy; changes are kept by save()), or a new one with this id."""
+        session = self.find(session_id)
+        if session is None:
+            session = new_session(session_id)
+            with self._lock:
+                self._counts["created"] += 1
+        return session
+
+    def save(self, session: dict):
+        session = copy.deepcopy(session)
+        session["updated_at"] = time.time()
+        with self._lock:
+            self._remember(session)
+            if self.db_path:
+                self._db_save(session)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+            if self.db_path:
+                try:
+                    found = self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0 or found
+                except sqlite3.Error as e:
+                    print(f"Session store write failed: {e}")
+            return found
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._counts = {"memory_hits": 0, "db_loads": 0, "created": 0}
+            if self.db_path:
+                try:
+                    self._connection().execute("DELETE FROM sessions")
+                except sqlite3.Error as e:
+                    print(f"Session store write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_memory": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "db_path": self.db_path,
+                "max_age_days": round(self.max_age / 86400, 1),
+                **self._counts,
+            }
@@ -0,0 +1,254 @@
+"""
+Local NSE/BSE Symbol Index
+
+Resolves what users type ("RIL", "Reliance", "tata consultancy", "INFY.NS")
+to a yfinance symbol without asking the LLM or searching the web. The index
+is loaded once from the bundled listing file (data/nse_bse_symbols.csv) and
+supports, in order of preference:
+
+- exact: the exchange code itself (RELIANCE, RELIANCE.NS, 500325.BO)
+- alias: company names and common short names (RIL, Reliance Industries)
+- prefix: the start of a company name ("hindustan uni"), when only one
+  company starts that way ("bajaj fin" could be Bajaj Finance or Bajaj
+  Finserv, so it resolves to nothing)
+- fuzzy: trigram similarity, for typos ("infosis", "relaince"); ambiguous
+  inputs such as "Tata" or "HDFC" resolve to nothing rather than a guess
+
+All lookups are dictionary or small set operations, so they take
+microseconds and can run on every request.
+"""
+
+import bisect
+import csv
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Set
+
+DEFAULT_LISTING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nse_bse_symbols.csv")
+
+EXCHANGE_SUFFIX = {"NSE": ".NS", "BSE": ".BO"}
+
+# Words that don't help identify a company
+NAME_NOISE_WORDS = {
+    "ltd", "limited", "the", "company", "co", "corp", "corporation", "inc", "india", "of",
+    "stock", "stocks", "share", "shares", "nse", "bse",
+}
+
+# Minimum trigram similarity (Dice) for a fuzzy match, and how far ahead of
+# the next company the best match must be to count
+FUZZY_THRESHOLD = 0.5
+FUZZY_MARGIN = 0.08
+
+# One-word aliases that are also ordinary English words. Inside a sentence
+# these only count when capitalized ("Is Titan a buy?" but not "a titan of").
+COMMON_WORD_ALIASES = {
+    "axis", "apollo", "eternal", "hero", "jubilant", "persistent", "titan",
+    "torrent", "trent", "vi", "larsen", "shriram", "chola", "lodha",
+}
+
+
+class SymbolMatch(NamedTuple):
+    symbol: str  # yfinance symbol, e.g. RELIANCE.NS
+    code: str  # exchange code, e.g. RELIANCE
+    name: str  # company name from the listing
+    exchange: str  # NSE or BSE
+    match_type: str  # exact, alias, prefix or fuzzy
+    score: float  # 1.0 for exact/alias, similarity for prefix/fuzzy
+    nifty50: bool = False
+
+
+class _Listing(NamedTuple):
+    code: str
+    name: str
+    exchange: str
+    nifty50: bool
+
+
+def normalize(text: str) -> str:
+    """Lowercase, turn '&' into 'and', drop punctuation and noise words."""
+    text = text.lower().replace("&", " and ")
+    words = re.findall(r"[a-z0-9]+", text)
+    return " ".join(w for w in words if w not in NAME_NOISE_WORDS)
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolIndex:
+    def __init__(self, listings: List[_Listing], aliases: Dict[str, List[str]]):
+        self._listings = listings
+        self._by_code: Dict[str, int] = {}
+        self._by_alias: Dict[str, int] = {}
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._key_grams: Dict[int, List[Set[str]]] = {}  # listing idx -> trigrams of each name/alias
+        self._names: List[tuple] = []  # sorted (normalized name, listing idx) for prefix lookups
+
+        for idx, listing in enumerate(listings):
+            # First listing wins, so NSE rows (listed first) are preferred over BSE
+            self._by_code.setdefault(listing.code.upper(), idx)
+
+            keys = {normalize(listing.name)} | {normalize(a) for a in aliases.get(listing.code, [])}
+            for key in keys:
+                if not key:
+                    continue
+                self._by_alias.setdefault(key, idx)
+                grams = _trigrams(key)
+                self._key_grams.setdefault(idx, []).append(grams)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(idx)
+            self._names.append((normalize(listing.name), idx))
+
+        self._names.sort()
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_LISTING_PATH) -> "SymbolIndex":
+        listings: List[_Listing] = []
+        aliases: Dict[str, List[str]] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = row["symbol"].strip()
+                listings.append(_Listing(
+                    code=code,
+                    name=row["name"].strip(),
+                    exchange=(row.get("exchange") or "NSE").strip().upper(),
+                    nifty50=row.get("nifty50", "0").strip() == "1",
+                ))
+                aliases[code] = [a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()]
+        return cls(listings, aliases)
+
+    def __len__(self):
+        return len(self._listings)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def _match(self, idx: int, match_type: str, score: float, exchange: Optional[str] = None) -> SymbolMatch:
+        listing = self._listings[idx]
+        exchange = exchange or listing.exchange
+        return SymbolMatch(
+            symbol=listing.code + EXCHANGE_SUFFIX.get(exchange, ".NS"),
+            code=listing.code,
+            name=listing.name,
+            exchange=exchange,
+            match_type=match_type,
+            score=score,
+            nifty50=listing.nifty50,
+        )
+
+    def exact(self, text: str) -> Optional[SymbolMatch]:
+        """Match an exchange code, with or without the .NS/.BO suffix."""
+        code = text.strip().upper()
+        exchange = None
+        for name, suffix in EXCHANGE_SUFFIX.items():
+            if code.endswith(suffix):
+                code, exchange = code[: -len(suffix)], name
+                break
+        idx = self._by_code.get(code)
+        return self._match(idx, "exact", 1.0, exchange) if idx is not None else None
+
+    def alias(self, text: str) -> Optional[SymbolMatch]:
+        idx = self._by_alias.get(normalize(text))
+        return self._match(idx, "alias", 1.0) if idx is not None else None
+
+    def prefix(self, text: str) -> Optional[SymbolMatch]:
+        """Match the start of a company name, if only one company starts that way."""
+        key = normalize(text)
+        if len(key) < 3:
+            return None
+        start = bisect.bisect_left(self._names, (key,))
+        matches = set()
+        for name, idx in self._names[start:]:
+            if not name.startswith(key):
+                break
+            matches.add(self._listings[idx].name)
+            if len(matches) > 1:
+                return None
+        if not matches:
+            return None
+        name, idx = self._names[start]
+        return self._match(idx, "prefix", len(key) / len(name))
+
+    def fuzzy(self, text: str, threshold: float = FUZZY_THRESHOLD) -> Optional[SymbolMatch]:
+        """Best trigram (Dice) match across names and aliases."""
+        key = normalize(text)
+        if len(key) < 3:
+            return None
+        grams = _trigrams(key)
+        candidates: Set[int] = set()
+        for gram in grams:
+            candidates.update(self._trigrams.get(gram, ()))
+
+        # Best score per company name (NSE and BSE rows of one company count once)
+        scores: Dict[str, tuple] = {}
+        for idx in candidates:
+            score = max(
+                2 * len(grams & candidate) / (len(grams) + len(candidate))
+                for candidate in self._key_grams[idx]
+            )
+            name = self._listings[idx].name
+            if name not in scores or score > scores[name][0] or (
+                score == scores[name][0] and self._listings[idx].exchange == "NSE"
+            ):
+                scores[name] = (score, idx)
+
+        ranked = sorted(scores.values(), reverse=True)
+        if not ranked or ranked[0][0] < threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][0] - ranked[1][0] < FUZZY_MARGIN:
+            return None  # too close to call
+        best_score, best_idx = ranked[0]
+        return self._match(best_idx, "fuzzy", round(best_score, 3))
+
+    def resolve(self, text: str, allow_fuzzy: bool = True) -> Optional[SymbolMatch]:
+        """Resolve a short company name or symbol (the whole text) to a listing."""
+        text = text.strip().strip("?.!")
+        if not text:
+            return None
+        match = self.exact(text) or self.alias(text) or self.prefix(text)
+        if match is None and allow_fuzzy:
+            match = self.fuzzy(text)
+        return match
+
+    def find_in_text(self, text: str, max_words: int = 4) -> Optional[SymbolMatch]:
+        """
+        Find the first company mentioned in a free-form question.
+
+        Only exact and alias matches are used here: fuzzy matching every word
+        of a sentence would turn ordinary words into tickers. Bare exchange
+        codes must be written in capitals ("LT", "IDEA") or carry a
+        .NS/.BO suffix, so "is it a good idea" does not match Vodafone Idea.
+        """
+        tokens = [re.sub(r"'s$", "", t.rstrip(".")) for t in re.findall(r"[A-Za-z0-9&'.\-]+", text)]
+        normalized = [normalize(t) for t in tokens]
+        for start in range(len(tokens)):
+            for length in range(min(max_words, len(tokens) - start), 0, -1):
+                end = start + length
+                if length == 1:
+                    word = tokens[start]
+                    if word.isupper() or word.upper().endswith((".NS", ".BO")):
+                        match = self.exact(word)
+                        if match is not None:
+                            return match
+                # "the hero" must not shrink to the alias "hero"
+                if not normalized[start] or not normalized[end - 1]:
+                    continue
+                key = " ".join(n for n in normalized[start:end] if n)
+                if key in COMMON_WORD_ALIASES and not tokens[start][0].isupper():
+                    continue
+                idx = self._by_alias.get(key)
+                if idx is not None:
+                    return self._match(idx, "alias", 1.0)
+        return None
+
+    def nifty50(self) -> List[str]:
+        """yfinance symbols of the NIFTY 50 names in the listing."""
+        return [l.code + EXCHANGE_SUFFIX[l.exchange] for l in self._listings if l.nifty50]
+
+
+@lru_cache(maxsize=1)
+def get_symbol_index() -> SymbolIndex:
+    """The process-wide index, loaded on first use."""
+    return SymbolIndex.load(os.getenv("SYMBOL_LISTING_PATH", DEFAULT_LISTING_PATH))
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent_pool import AgentPool, PoolBusyError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeMemory:
+    def __init__(self):
+        self.messages = []
+        self.clears = 0
+
+    def clear(self):
+        self.messages = []
+        self.clears += 1
+
+
+class FakeAgent:
+    """Remembers what it was asked until its memory is cleared; blocks while `gate` is closed."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.memory = FakeMemory()
+        self.gate = gate
+
+    def run(self, message, stream=False):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.memory.messages.append(message)
+        if stream:
+            return iter(message.split())
+        return f"{message} (remembered {len(self.memory.messages)})"
+
+
+def test_runs_start_with_a_clean_memory():
+    async def scenario():
+        pool = AgentPool(FakeAgent, size=1)
+        assert await pool.run("Is TCS a buy?") == "Is TCS a buy? (remembered 1)"
+        assert await pool.run("And Infosys?") == "And Infosys? (remembered 1)"
+        agent = pool._agents.get_nowait()
+        assert agent.memory.clears == 2
+        assert pool.stats()["completed"] == 2
+
+    run(scenario())
+
+
+def test_agents_are_built_on_first_use():
+    async def scenario():
+        pool = AgentPool(FakeAgent, size=3)
+        assert pool.stats()["agents_built"] == 0
+        await pool.run("TCS")
+        await pool.run("INFY")
+        assert pool.stats()["agents_built"] == 1
+
+    run(scenario())
+
+
+def test_a_full_queue_raises_busy_with_retry_after():
+    async def scenario():
+        gate = threading.Event()
+        pool = AgentPool(lambda: FakeAgent(gate), size=1, max_queue=1)
+        running = [asyncio.create_task(pool.run(q)) for q in ("TCS", "INFY")]
+        await asyncio.sleep(0.05)
+        assert pool.stats()["in_flight"] == 1 and pool.stats()["queued"] == 1
+
+        with pytest.raises(PoolBusyError) as busy:
+            await pool.run("WIPRO")
+        assert busy.value.retry_after >= 1
+        with pytest.raises(PoolBusyError):
+            pool.stream(lambda agent: agent.run("ITC", stream=True))
+        assert pool.stats()["rejected"] == 2
+
+        gate.set()
+        assert len(await asyncio.gather(*running)) == 2
+        assert await pool.run("WIPRO") == "WIPRO (remembered 1)"
+
+    run(scenario())
+
+
+def test_a_timed_out_run_keeps_its_slot_until_it_finishes():
+    async def scenario():
+        gate = threading.Event()
+        pool = AgentPool(lambda: FakeAgent(gate), size=1, max_queue=0)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run("TCS", timeout=0.05)
+        assert pool.stats()["timed_out"] == 1
+        with pytest.raises(PoolBusyError):
+            await pool.run("INFY")
+        gate.set()
+        assert await pool.drain(timeout=2)
+        assert await pool.run("INFY") == "INFY (remembered 1)"
+
+    run(scenario())
+
+
+def test_stream_yields_items_as_they_are_produced():
+    async def scenario():
+        pool = AgentPool(FakeAgent, size=1)
+        words = [w async for w in pool.stream(lambda agent: agent.run("Should I buy TCS", stream=True))]
+        assert words == ["Should", "I", "buy", "TCS"]
+        assert await pool.drain(timeout=1)
+
+    run(scenario())
+
+
+def test_stream_raises_the_run_error():
+    def fail(agent):
+        yield "partial"
+        raise ValueError("model error")
+
+    async def scenario():
+        pool = AgentPool(FakeAgent, size=1)
+        items = []
+        with pytest.raises(ValueError, match="model error"):
+            async for item in pool.stream(fail):
+                items.append(item)
+        assert items == ["partial"]
+
+    run(scenario())
+
+
+def test_drain_waits_for_running_and_queued_runs():
+    async def scenario():
+        gate = threading.Event()
+        pool = AgentPool(lambda: FakeAgent(gate), size=1, max_queue=2)
+        runs = [asyncio.create_task(pool.run(q)) for q in ("TCS", "INFY", "WIPRO")]
+        await asyncio.sleep(0.05)
+        assert not await pool.drain(timeout=0.15)
+
+        asyncio.get_running_loop().call_later(0.1, gate.set)
+        assert await pool.drain(timeout=2)
+        assert pool.stats()["completed"] == 3
+        await asyncio.gather(*runs)
+
+    run(scenario())
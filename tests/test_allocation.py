@@ -0,0 +1,79 @@
+import math
+
+import pandas as pd
+import pytest
+
+from allocation import allocate, allocate_profile, format_allocation, read_profiles_csv
+
+
+def test_docstring_example():
+    row = allocate_profile(30, 300000, "moderate")
+    assert row["age_band"] == "20-30"
+    assert row["capacity_monthly"] == 75000
+    assert row["equity_monthly"] == 37500
+    assert row["stock_sip_monthly"] == 4500
+    assert row["stock_annual"] == 54000
+    assert row["portfolio_pct"] == pytest.approx(6.0)
+    assert row["horizon"] == "10+ years"
+    assert row["assumptions"] == ""
+    assert not row["error"]
+
+
+def test_vectorized_rows_match_single_profiles():
+    profiles = pd.DataFrame({
+        "age": [30, 45, 60],
+        "monthly_salary": [300000, 150000, 80000],
+        "risk_appetite": ["moderate", "low", "aggressive"],
+    })
+    result = allocate(profiles)
+    for i, profile in profiles.iterrows():
+        single = allocate_profile(profile["age"], profile["monthly_salary"], profile["risk_appetite"])
+        assert result.loc[i, "stock_sip_monthly"] == single["stock_sip_monthly"]
+    assert list(result["age_band"]) == ["20-30", "31-50", "51+"]
+    assert list(result["risk_appetite"]) == ["moderate", "low", "high"]
+
+
+def test_missing_values_use_defaults_and_say_so():
+    row = allocate_profile()
+    assert row["age_band"] == "31-50"
+    assert row["risk_appetite"] == "moderate"
+    assert row["equity_pct"] == 50
+    assert math.isnan(row["capacity_monthly"])  # no salary: percentages only
+    assert "age not given" in row["assumptions"]
+    assert "risk appetite not given" in row["assumptions"]
+
+
+def test_sip_never_exceeds_the_single_stock_limit():
+    result = allocate(pd.DataFrame({
+        "age": [25] * 4,
+        "monthly_salary": [12345, 99999, 250000, 1000000],
+        "risk_appetite": ["low", "moderate", "high-moderate", "high"],
+    }))
+    assert (result["stock_sip_monthly"] <= result["stock_max_monthly"]).all()
+
+
+@pytest.mark.parametrize("age, salary, risk, error", [
+    (15, 100000, "low", "age must be between 18 and 100"),
+    (30, -1, "low", "monthly_salary must not be negative"),
+    (30, 100000, "yolo", "unknown risk_appetite (use low, moderate, high-moderate or high)"),
+    ("abc", 100000, "low", "age must be a number"),
+    (30, "lots", "low", "monthly_salary must be a number"),
+])
+def test_invalid_values_get_an_error_and_no_numbers(age, salary, risk, error):
+    row = allocate_profile(age, salary, risk)
+    assert row["error"] == error
+    assert math.isnan(row["stock_sip_monthly"])
+
+
+def test_csv_profiles():
+    profiles = read_profiles_csv(b"age,monthly_salary,risk_appetite\n30,300000,moderate\n,50000,\n")
+    result = allocate(profiles)
+    assert list(result["stock_sip_monthly"]) == [4500, 600]
+    assert result.loc[1, "age_band"] == "31-50"
+
+
+def test_format_allocation_gives_the_share_of_the_portfolio():
+    block = format_allocation(allocate_profile(30, 300000, "moderate"))
+    assert "₹37,500 × 12% = ₹4,500/month (₹54,000/year)" in block
+    assert "Share of the total portfolio: 50% equity × 12% = 6.0% of the monthly investment" in block
+    assert "portfolio" in format_allocation(allocate_profile(30, None, "high"))
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+import batch_jobs
+from agent_pool import PoolBusyError
+from batch_jobs import BatchScheduler, TokenBucket
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Prefetches made, by symbol; each takes a moment so concurrent jobs overlap."""
+    calls = []
+
+    async def fake_prefetch(match):
+        calls.append(match.symbol)
+        await asyncio.sleep(0.02)
+        return {"symbol": match.symbol}
+
+    monkeypatch.setattr(batch_jobs, "prefetch_stock_data", fake_prefetch)
+    return calls
+
+
+class StubPool:
+    """Answers prompts; busy for the first `busy` runs, or blocks until released with `hold`."""
+
+    def __init__(self, busy: int = 0, hold: bool = False):
+        self.busy = busy
+        self.hold = asyncio.Event() if hold else None
+        self.prompts = []
+
+    async def run(self, prompt):
+        if self.busy:
+            self.busy -= 1
+            raise PoolBusyError(retry_after=0.01)
+        if self.hold is not None:
+            await self.hold.wait()
+        self.prompts.append(prompt)
+        return f"analysis of {prompt}"
+
+
+async def collect(job):
+    return [r async for r in job.follow()]
+
+
+def scheduler(pool: StubPool, **kwargs) -> BatchScheduler:
+    kwargs.setdefault("groq_requests_per_minute", 6000)
+    kwargs.setdefault("yfinance_requests_per_second", 1000)
+    return BatchScheduler(
+        build_prompt=lambda match, data, profile: data["symbol"],
+        run_agent=pool.run,
+        **kwargs,
+    )
+
+
+def test_tickers_are_deduplicated_in_order(fetches):
+    async def scenario():
+        job = scheduler(StubPool()).submit(["TCS", " TCS ", "", "INFY", "TCS"], {})
+        assert job.tickers == ["TCS", "INFY"]
+        results = await collect(job)
+        assert sorted(r["ticker"] for r in results) == ["INFY", "TCS"]
+        assert job.status == "done"
+        assert job.summary()["failed"] == 0
+
+    run(scenario())
+
+
+def test_unknown_tickers_fail_without_blocking_the_job(fetches):
+    async def scenario():
+        job = scheduler(StubPool()).submit(["TCS", "NOSUCHCOMPANYXYZ"], {})
+        results = {r["ticker"]: r for r in await collect(job)}
+        assert results["TCS"]["answer"] == "analysis of TCS.NS"
+        assert results["NOSUCHCOMPANYXYZ"]["status"] == "error"
+        assert job.summary()["failed"] == 1
+
+    run(scenario())
+
+
+def test_concurrent_jobs_share_one_prefetch_per_symbol(fetches):
+    async def scenario():
+        batch = scheduler(StubPool())
+        first = batch.submit(["TCS", "INFY"], {})
+        second = batch.submit(["TCS"], {})
+        await asyncio.gather(collect(first), collect(second))
+        assert sorted(fetches) == ["INFY.NS", "TCS.NS"]
+        assert not batch._inflight_data
+
+    run(scenario())
+
+
+def test_a_busy_pool_is_retried(fetches):
+    async def scenario():
+        pool = StubPool(busy=2)
+        job = scheduler(pool).submit(["TCS"], {})
+        [result] = await collect(job)
+        assert result["status"] == "done"
+        assert pool.busy == 0 and pool.prompts == ["TCS.NS"]
+
+    run(scenario())
+
+
+def test_agent_runs_are_capped(fetches):
+    async def scenario():
+        pool = StubPool(hold=True)
+        batch = scheduler(pool, max_concurrency=2)
+        job = batch.submit(["TCS", "INFY", "WIPRO", "ITC"], {})
+        await asyncio.sleep(0.1)
+        statuses = [r["status"] for r in job.results.values()]
+        assert statuses.count("analyzing") == 2
+        pool.hold.set()
+        await asyncio.wait_for(asyncio.gather(*batch._tasks), 1)
+        assert job.done
+
+    run(scenario())
+
+
+def test_cancelled_tickers_finish_the_job(fetches):
+    async def scenario():
+        pool = StubPool(hold=True)
+        batch = scheduler(pool)
+        job = batch.submit(["TCS", "INFY"], {})
+        follower = asyncio.create_task(asyncio.wait_for(collect(job), 1))
+        await asyncio.sleep(0.1)
+        for task in list(batch._tasks):
+            task.cancel()
+        results = await follower
+        assert {r["ticker"]: r["error"] for r in results} == {"TCS": "cancelled", "INFY": "cancelled"}
+        assert job.done
+
+    run(scenario())
+
+
+def test_token_bucket_waits_for_tokens():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(3):
+            await bucket.acquire()
+        # The first token is there; two more take 1/50 s each
+        assert loop.time() - started >= 0.035
+
+    run(scenario())
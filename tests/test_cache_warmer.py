@@ -0,0 +1,79 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache_warmer import PRE_OPEN_MINUTES, CacheWarmer, WarmerLease, in_session, market_open, next_session_start
+from context_compaction import IST
+
+
+def ist(*args) -> datetime:
+    return datetime(*args, tzinfo=IST)
+
+
+# 2025-01-10 is a Friday
+@pytest.mark.parametrize("now, is_open, is_in_session", [
+    (ist(2025, 1, 10, 8, 59), False, False),
+    (ist(2025, 1, 10, 9, 5), False, True),  # pre-open warm-up
+    (ist(2025, 1, 10, 9, 15), True, True),
+    (ist(2025, 1, 10, 15, 29), True, True),
+    (ist(2025, 1, 10, 15, 30), False, True),  # post-close window
+    (ist(2025, 1, 10, 16, 0), False, False),
+    (ist(2025, 1, 11, 11, 0), False, False),  # Saturday
+    (ist(2025, 1, 12, 11, 0), False, False),  # Sunday
+])
+def test_market_hours(now, is_open, is_in_session):
+    assert market_open(now) is is_open
+    assert in_session(now) is is_in_session
+
+
+def test_next_session_starts_before_the_open():
+    monday_open = ist(2025, 1, 13, 9, 15)
+    warm_up = monday_open - timedelta(minutes=PRE_OPEN_MINUTES)
+    # Friday after the close and over the weekend: Monday's pre-open warm-up
+    assert next_session_start(ist(2025, 1, 10, 15, 45)) == warm_up
+    assert next_session_start(ist(2025, 1, 11, 11, 0)) == warm_up
+    assert market_open(monday_open)
+    # Early on a weekday: the same morning
+    assert next_session_start(ist(2025, 1, 14, 6, 0)) == ist(2025, 1, 14, 9, 0)
+
+
+class OtherWorker(WarmerLease):
+    owner = "other-host:4242"
+
+
+def test_one_worker_holds_the_lease(tmp_path):
+    path = str(tmp_path / "warmer.db")
+    mine, theirs = WarmerLease(path), OtherWorker(path)
+    assert mine.acquire()
+    assert mine.acquire()  # renewing
+    assert not theirs.acquire()
+
+    mine.release()
+    assert theirs.acquire()
+    assert not mine.acquire()
+
+
+def test_an_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / "warmer.db")
+    theirs = OtherWorker(path, seconds=0.05)
+    assert theirs.acquire()
+    time.sleep(0.1)
+    assert WarmerLease(path).acquire()
+
+
+def test_a_worker_without_the_lease_stands_by(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "warmer.db")
+        assert OtherWorker(path).acquire()
+        warmer = CacheWarmer(lease=WarmerLease(path), market_hours_only=False)
+        warmer.start()
+        await asyncio.sleep(0.2)
+        assert warmer.stats()["state"] == "standby"
+        assert warmer.stats()["scheduled"] == 0
+        await warmer.stop()
+        # Stopping a standby worker leaves the holder's lease alone
+        assert not WarmerLease(path).acquire()
+
+    asyncio.run(scenario())
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import history_store
+from history_store import HistoryStore, bars_from_frame, cagr, corporate_action_after, price_metrics
+
+
+def price_frame(dates, closes, dividends=None, splits=None) -> pd.DataFrame:
+    """A daily history shaped like yfinance's (IST timestamps, capitalized columns)."""
+    closes = np.asarray(closes, dtype=float)
+    index = pd.DatetimeIndex(pd.to_datetime(dates)).tz_localize("Asia/Kolkata")
+    return pd.DataFrame({
+        "Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes,
+        "Volume": np.full(len(closes), 1000.0),
+        "Dividends": dividends if dividends is not None else np.zeros(len(closes)),
+        "Stock Splits": splits if splits is not None else np.zeros(len(closes)),
+    }, index=index)
+
+
+class FakeYahoo:
+    """Serves full downloads and incremental (`start=`) downloads from fixed frames."""
+
+    def __init__(self, full: pd.DataFrame, since: pd.DataFrame = None):
+        self.full = full
+        self.since = since
+        self.calls = []
+
+    def __call__(self, symbol, start=None, years=5):
+        self.calls.append(start or "full")
+        return self.since if start else self.full
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Always stale, so every call goes to the (fake) download
+    return HistoryStore(directory=str(tmp_path), refresh_seconds=0)
+
+
+def test_bars_from_frame():
+    frame = price_frame(["2025-01-01", "2025-01-02", "2025-01-03"], [100, np.nan, 102])
+    bars = bars_from_frame(frame)
+    assert bars.dtype == history_store.PRICE_DTYPE
+    assert [str(d) for d in bars["date"]] == ["2025-01-01", "2025-01-03"]
+    assert list(bars["close"]) == [100, 102]
+    assert len(bars_from_frame(pd.DataFrame())) == 0
+
+
+def test_corporate_action_after():
+    dates = ["2025-01-01", "2025-01-02", "2025-01-03"]
+    last = np.datetime64("2025-01-02")
+    assert corporate_action_after(price_frame(dates, [1, 2, 3]), last) is None
+    # On the stored last day the older bars were already adjusted for it
+    assert corporate_action_after(price_frame(dates, [1, 2, 3], dividends=[0, 5, 0]), last) is None
+    assert corporate_action_after(price_frame(dates, [1, 2, 3], dividends=[0, 0, 5]), last) == "dividend"
+    assert corporate_action_after(price_frame(dates, [1, 2, 3], splits=[0, 0, 2]), last) == "split"
+
+
+def test_incremental_update_replaces_the_last_bar_and_appends(store, monkeypatch):
+    yahoo = FakeYahoo(
+        full=price_frame(["2025-01-01", "2025-01-02", "2025-01-03"], [100, 101, 102]),
+        # The last stored day again (it was taken mid-session), then a new day
+        since=price_frame(["2025-01-03", "2025-01-06"], [103, 104]),
+    )
+    monkeypatch.setattr(history_store, "fetch_price_history", yahoo)
+
+    assert len(store.prices("TCS.NS")) == 3
+    bars = store.prices("TCS.NS")
+    assert yahoo.calls == ["full", "2025-01-03"]
+    assert [str(d) for d in bars["date"]] == ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-06"]
+    assert list(bars["close"]) == [100, 101, 103, 104]
+    assert store.stats()["incremental_updates"] == 1
+
+
+def test_a_dividend_since_the_last_bar_downloads_everything_again(store, monkeypatch):
+    yahoo = FakeYahoo(
+        full=price_frame(["2025-01-01", "2025-01-02"], [100, 101]),
+        since=price_frame(["2025-01-02", "2025-01-03"], [101, 95], dividends=[0, 6]),
+    )
+    monkeypatch.setattr(history_store, "fetch_price_history", yahoo)
+
+    store.prices("ITC.NS")
+    store.prices("ITC.NS")
+    assert yahoo.calls == ["full", "2025-01-02", "full"]
+    assert store.stats()["full_downloads"] == 2
+
+
+def test_a_symbol_without_bars_is_not_downloaded_on_every_request(tmp_path, monkeypatch):
+    yahoo = FakeYahoo(full=pd.DataFrame())
+    monkeypatch.setattr(history_store, "fetch_price_history", yahoo)
+    store = HistoryStore(directory=str(tmp_path), refresh_seconds=3600)
+
+    assert store.prices("DELISTED.NS") is None
+    assert store.prices("DELISTED.NS") is None
+    assert yahoo.calls == ["full"]
+    assert store.stats()["no_data"] == 1
+
+    # Once the marker is stale the download is tried again
+    stale = HistoryStore(directory=str(tmp_path), refresh_seconds=0)
+    assert stale.prices("DELISTED.NS") is None
+    assert yahoo.calls == ["full", "full"]
+
+
+def test_cagr():
+    assert cagr(100, 121, 2) == pytest.approx(0.10)
+    assert cagr(0, 121, 2) is None
+    assert cagr(100, float("nan"), 2) is None
+
+
+def test_price_metrics_cagr_over_each_period():
+    dates = np.arange(np.datetime64("2020-01-01"), np.datetime64("2025-01-15"))
+    days = (dates - dates[0]).astype(int)
+    closes = 100 * 1.10 ** (days / 365.25)
+    metrics = price_metrics(bars_from_frame(price_frame(dates, closes)))
+
+    for years in (1, 3, 5):
+        assert metrics["cagr"][years] == pytest.approx(0.10, abs=0.002)
+    assert metrics["max_drawdown"] == 0
+    assert metrics["scenario_drift"] == pytest.approx(0.10, abs=0.002)
+    for scenario in metrics["scenarios"].values():
+        assert scenario["bad"] < scenario["base"] < scenario["good"]
+
+
+def test_price_metrics_drawdown():
+    dates = ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-06"]
+    metrics = price_metrics(bars_from_frame(price_frame(dates, [100, 120, 60, 90])))
+
+    assert metrics["max_drawdown"] == pytest.approx(-0.5)
+    assert (metrics["max_drawdown_peak"], metrics["max_drawdown_trough"]) == ("2025-01-02", "2025-01-03")
+    assert metrics["current_drawdown"] == pytest.approx(-0.25)
+    # Too short for any of the CAGR periods
+    assert metrics["cagr"] == {1: None, 3: None, 5: None}
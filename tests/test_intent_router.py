@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+
+from intent_router import (
+    ADVICE,
+    FULL_ANALYSIS,
+    FUNDAMENTALS,
+    PRICE,
+    Route,
+    classify,
+    fundamentals_answer,
+    needs_market_data,
+    price_answer,
+)
+from symbol_index import get_symbol_index
+
+AS_OF = datetime(2025, 1, 2, 10, 0)
+
+
+@pytest.mark.parametrize("question, intent, symbol, fields", [
+    ("TCS", FULL_ANALYSIS, "TCS.NS", ()),
+    ("Reliance Industries", FULL_ANALYSIS, "RELIANCE.NS", ()),
+    ("TCS?", FULL_ANALYSIS, "TCS.NS", ()),
+    ("Reliance Industries?", FULL_ANALYSIS, "RELIANCE.NS", ()),
+    ("What is the current price of TCS?", PRICE, "TCS.NS", ()),
+    ("Infosys P/E ratio and market cap", FUNDAMENTALS, "INFY.NS", ("market_cap", "pe_ratio")),
+    ("TCS 52 week high", FUNDAMENTALS, "TCS.NS", ("52_week_high",)),
+    ("Wipro fundamentals", FUNDAMENTALS, "WIPRO.NS", ()),
+    ("Should I buy TCS at this price?", ADVICE, "TCS.NS", ()),
+    ("How much should I keep in an emergency fund?", ADVICE, None, ()),
+])
+def test_classify(question, intent, symbol, fields):
+    route = classify(question)
+    assert route.intent == intent
+    assert (route.match.symbol if route.match else None) == symbol
+    assert route.fields == fields
+
+
+def test_lookup_with_a_profile_is_advice():
+    assert classify("What is the current price of TCS?", has_profile=True).intent == ADVICE
+
+
+@pytest.mark.parametrize("question, needs_data", [
+    ("Should I invest in HDFC Bank?", True),
+    ("Is Suzlon stock a buy?", True),  # not in the listing, but asks about a stock
+    ("How much should I keep in an emergency fund?", False),
+])
+def test_needs_market_data(question, needs_data):
+    assert needs_market_data(question, classify(question)) is needs_data
+
+
+def test_price_answer():
+    match = get_symbol_index().resolve("TCS")
+    answer = price_answer(match, "3500.5", AS_OF)
+    assert "**₹3,500.50**" in answer
+    assert "02 Jan 2025 10:00" in answer
+    assert price_answer(match, "Error fetching price", AS_OF) is None
+
+
+def test_fundamentals_answer():
+    match = get_symbol_index().resolve("TCS")
+    answer = fundamentals_answer(match, '{"pe_ratio": 25.1}', ("pe_ratio",), AS_OF)
+    assert "| 25.10 |" in answer
+    assert fundamentals_answer(match, "Could not fetch fundamentals", ("pe_ratio",), AS_OF) is None
+
+
+# ============================================================================
+# FOLLOW-UPS IN A SESSION
+# ============================================================================
+
+def after_tcs_analysis() -> Route:
+    return Route(FULL_ANALYSIS, get_symbol_index().resolve("TCS"))
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Should I buy it?", ADVICE),
+    ("Is it overvalued?", ADVICE),
+    ("What is the target price for it?", ADVICE),
+    ("What is its P/E?", FUNDAMENTALS),
+    ("How has the company done this year?", ADVICE),
+])
+def test_follow_ups_are_about_the_previous_stock(question, intent):
+    route = classify(question, previous=after_tcs_analysis())
+    assert route.intent == intent
+    assert route.match.symbol == "TCS.NS"
+
+
+@pytest.mark.parametrize("question", [
+    "Is it a good time to buy gold?",
+    "Is it a good time to invest?",
+    "Should I move it into a fixed deposit?",
+    "How much should I keep in an emergency fund?",
+])
+def test_general_questions_are_not_follow_ups(question):
+    route = classify(question, previous=after_tcs_analysis())
+    assert route.intent == ADVICE
+    assert route.match is None
+
+
+def test_what_about_after_a_full_analysis_asks_for_the_same_analysis():
+    route = classify("And what about Infosys?", previous=after_tcs_analysis())
+    assert (route.intent, route.match.symbol) == (FULL_ANALYSIS, "INFY.NS")
+    advice = Route(ADVICE, get_symbol_index().resolve("TCS"))
+    assert classify("And what about Infosys?", previous=advice).intent == ADVICE
+
+
+def test_follow_ups_need_a_session():
+    assert classify("Should I buy it?").match is None
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+import groq
+import httpx
+import pytest
+
+from llm_provider import Endpoint, LLMClient, LLMSettings, LLMUnavailableError
+
+MESSAGES = [{"role": "user", "content": "Is TCS a buy?"}]
+
+
+def completion(model: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer from {model}"}, "finish_reason": "stop"}],
+    }
+
+
+class FakeGroq:
+    """Answers each model from a script of responses (the last one repeats) and records the calls."""
+
+    def __init__(self, script: dict):
+        self.script = script
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        with self._lock:
+            attempt = sum(1 for m in self.calls if m == model)
+            self.calls.append(model)
+        steps = self.script[model]
+        step = steps[min(attempt, len(steps) - 1)]
+        if callable(step):
+            return step(model)
+        status, headers = step
+        if status == 200:
+            return httpx.Response(200, json=completion(model))
+        return httpx.Response(status, headers=headers, json={"error": {"message": f"status {status}"}})
+
+
+def slow(seconds: float):
+    def respond(model):
+        time.sleep(seconds)
+        return httpx.Response(200, json=completion(model))
+
+    return respond
+
+
+OK = (200, {})
+
+
+@pytest.fixture(autouse=True)
+def groq_key(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.delenv("GROQ_BASE_URL", raising=False)
+
+
+def make_client(script: dict, **settings):
+    fake = FakeGroq(script)
+    settings.setdefault("fallbacks", (Endpoint("groq", "fallback"),))
+    settings.setdefault("backoff_seconds", 0.01)
+    return LLMClient(LLMSettings(**settings), transport=httpx.MockTransport(fake)), fake
+
+
+def answer(response) -> str:
+    return response.choices[0].message.content
+
+
+def test_rate_limit_with_retry_after_is_retried():
+    client, fake = make_client({"primary": [(429, {"retry-after": "0.05"}), OK]})
+    started = time.monotonic()
+    assert answer(client.complete("primary", MESSAGES)) == "answer from primary"
+    assert fake.calls == ["primary", "primary"]
+    assert time.monotonic() - started >= 0.05
+
+
+def test_a_long_retry_after_moves_on_to_the_next_endpoint():
+    client, fake = make_client({"primary": [(429, {"retry-after": "30"})], "fallback": [OK]})
+    assert answer(client.complete("primary", MESSAGES)) == "answer from fallback"
+    assert fake.calls == ["primary", "fallback"]
+
+
+def test_server_errors_fall_through_to_the_next_endpoint():
+    client, fake = make_client({"primary": [(503, {})], "fallback": [OK]}, max_retries=1)
+    assert answer(client.complete("primary", MESSAGES)) == "answer from fallback"
+    assert fake.calls == ["primary", "primary", "fallback"]
+
+
+def test_a_client_error_is_raised_as_is():
+    client, fake = make_client({"primary": [(400, {})], "fallback": [OK]})
+    with pytest.raises(groq.BadRequestError):
+        client.complete("primary", MESSAGES)
+    assert fake.calls == ["primary"]
+
+
+def test_a_slow_primary_is_hedged_to_the_next_endpoint():
+    client, fake = make_client({"primary": [slow(1.0)], "fallback": [OK]}, hedge_after=0.05)
+    started = time.monotonic()
+    assert answer(client.complete("primary", MESSAGES)) == "answer from fallback"
+    assert time.monotonic() - started < 0.5
+    assert fake.calls == ["primary", "fallback"]
+
+
+def test_a_fast_primary_is_not_hedged():
+    client, fake = make_client({"primary": [OK], "fallback": [OK]}, hedge_after=0.5)
+    assert answer(client.complete("primary", MESSAGES)) == "answer from primary"
+    assert fake.calls == ["primary"]
+
+
+def test_all_endpoints_failing_raises_unavailable():
+    client, fake = make_client(
+        {"primary": [(503, {})], "fallback": [(429, {"retry-after": "9"})]},
+        max_retries=1,
+    )
+    with pytest.raises(LLMUnavailableError) as error:
+        client.complete("primary", MESSAGES)
+    assert error.value.retry_after == 9
+    assert fake.calls == ["primary", "primary", "fallback"]
@@ -0,0 +1,68 @@
+from report_store import SECTIONS, ReportStore, assemble, section_text, split_report
+
+VERSIONS = {
+    "price": "800", "fundamentals": "f1", "recommendations": "r1", "news": "n1",
+    "search": "s1", "financials": "x1", "day": "2025-01-02", "profile": "none",
+}
+
+
+def report(numbers=SECTIONS, intro="# TCS (TCS.NS) - Financial Analysis") -> str:
+    sections = [f"## {n}. Heading {n}\nText of section {n}." for n in numbers]
+    return "\n\n".join([intro, *sections, "**Sources:**\n- [News](https://example.com)"])
+
+
+def test_split_and_assemble_round_trip():
+    answer = report()
+    parts = split_report(answer, has_profile=True)
+    assert set(parts) == {"intro", "sources", *SECTIONS}
+    assert parts["intro"] == "# TCS (TCS.NS) - Financial Analysis"
+    assert parts["8"] == "## 8. Heading 8\nText of section 8."
+    assert parts["sources"].startswith("**Sources:**")
+    assert assemble(parts, has_profile=True) == answer
+
+
+def test_split_without_a_profile_drops_section_8():
+    parts = split_report(report(), has_profile=False)
+    assert "8" not in parts
+    assert split_report(report(SECTIONS[:-1]), has_profile=False)["7"] == "## 7. Heading 7\nText of section 7."
+
+
+def test_split_rejects_missing_or_repeated_sections():
+    assert split_report(report(("1", "2", "3")), has_profile=False) is None
+    assert split_report(report(SECTIONS[:-1]), has_profile=True) is None
+    assert split_report(report(("1", "1", "2", "3", "4", "5", "6", "7")), has_profile=False) is None
+
+
+def test_section_text_keeps_only_the_section():
+    text = "Sure!\n\n## 3. Trends that matter now\n- AI demand\n\n## 4. Who runs it\n- someone"
+    assert section_text("3", text, "## 3. Trends that matter now") == "## 3. Trends that matter now\n- AI demand"
+    assert section_text("3", "- AI demand", "## 3. Trends") == "## 3. Trends\n\n- AI demand"
+    assert section_text("intro", "# TCS\nA software exporter.\n\n## 1. Money", None) == "# TCS\nA software exporter."
+
+
+def test_only_sections_with_changed_inputs_are_stale():
+    store = ReportStore()
+    store.save("TCS.NS", VERSIONS, split_report(report(), has_profile=False))
+
+    assert store.plan("TCS.NS", VERSIONS, has_profile=False)["stale"] == []
+    plan = store.plan("TCS.NS", {**VERSIONS, "news": "n2"}, has_profile=False)
+    assert plan["stale"] == ["3", "5"]
+    assert "sources" not in plan["parts"]  # rebuilt from the data
+
+
+def test_new_profile_only_rewrites_sections_7_and_8():
+    store = ReportStore()
+    store.save("TCS.NS", VERSIONS, split_report(report(), has_profile=True))
+    plan = store.plan("TCS.NS", {**VERSIONS, "profile": "20-30:moderate:300000"}, has_profile=True)
+    assert plan["stale"] == ["7", "8"]
+
+
+def test_a_stale_intro_is_rewritten_not_dropped():
+    store = ReportStore()
+    parts = split_report(report(), has_profile=False)
+    store.save("TCS.NS", VERSIONS, {part: text for part, text in parts.items() if part != "intro"})
+
+    plan = store.plan("TCS.NS", VERSIONS, has_profile=False)
+    assert plan["stale"] == ["intro"]
+    written = {"intro": "# TCS (TCS.NS) - Financial Analysis"}
+    assert assemble({**plan["parts"], **written}, has_profile=False) == report(SECTIONS[:-1])
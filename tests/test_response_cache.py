@@ -0,0 +1,84 @@
+import asyncio
+
+from intent_router import classify
+from response_cache import CACHED, COALESCED, FRESH, ResponseCache, profile_bucket
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def full_analysis_key(cache: ResponseCache, name: str) -> str:
+    return cache.key(classify(name), name)
+
+
+def test_key_depends_on_what_shapes_the_answer():
+    cache = ResponseCache(window=300)
+    route = classify("Should I invest in TCS?")
+    key = cache.key(route, "Should I invest in TCS?")
+    assert key == cache.key(route, "should i invest in TCS")
+    assert key != cache.key(route, "Should I invest in TCS?", 30, 300000, "moderate")
+    assert key != cache.key(route, "Should I invest in TCS?", conversation="CONVERSATION SO FAR: ...")
+    assert ResponseCache(window=0).key(route, "Should I invest in TCS?") is None
+
+
+def test_profile_bucket():
+    assert profile_bucket(None, None, None) == "none"
+    assert profile_bucket(25, 300000, "moderate") == profile_bucket(29, 300000, "balanced")
+    assert profile_bucket(25, 300000, "moderate") != profile_bucket(35, 300000, "moderate")
+
+
+def test_identical_requests_wait_for_the_leader():
+    async def scenario():
+        cache = ResponseCache(window=300)
+        key = full_analysis_key(cache, "TCS")
+        leader = await cache.acquire(key)
+        assert leader.served == FRESH and leader.leader
+
+        waiter = asyncio.create_task(cache.acquire(key))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        cache.release(leader, "the report", "prefetch")
+        shared = await waiter
+        assert shared.served == COALESCED
+        assert shared.entry["answer"] == "the report"
+        assert not cache._in_flight
+
+        cached = await cache.acquire(key)
+        assert cached.served == CACHED and not cached.leader
+
+    run(scenario())
+
+
+def test_a_failed_leader_hands_over_to_a_waiter():
+    async def scenario():
+        cache = ResponseCache(window=300)
+        key = full_analysis_key(cache, "Infosys")
+        leader = await cache.acquire(key)
+        waiter = asyncio.create_task(cache.acquire(key))
+        await asyncio.sleep(0)
+
+        cache.release(leader, None)
+        retry = await waiter
+        assert retry.served == FRESH and retry.leader
+        cache.release(retry, None)
+        assert not cache._in_flight
+
+    run(scenario())
+
+
+def test_waiters_give_up_after_the_wait_timeout():
+    async def scenario():
+        cache = ResponseCache(window=300, wait_timeout=0.01)
+        key = full_analysis_key(cache, "Wipro")
+        leader = await cache.acquire(key)
+        waiter = await cache.acquire(key)
+        assert waiter.served == FRESH and not waiter.leader
+        cache.release(waiter, "not kept")  # only the leader's answer is cached
+        assert key in cache._in_flight
+        cache.release(leader, None)
+        assert not cache._in_flight
+        assert (await cache.acquire(key)).leader
+
+    run(scenario())
@@ -0,0 +1,101 @@
+import time
+
+from context_compaction import estimate_tokens
+from session_store import (
+    SessionStore,
+    add_turn,
+    answer_gist,
+    has_recent_data,
+    last_symbol,
+    merge_profile,
+    new_session,
+    remember_data,
+    remember_symbol,
+    render_history,
+    valid_session_id,
+)
+from symbol_index import get_symbol_index
+
+
+def test_valid_session_id():
+    assert valid_session_id("sess-1234_abcd")
+    assert not valid_session_id("short")
+    assert not valid_session_id("../../etc/passwd")
+    assert not valid_session_id(None)
+
+
+def test_merge_profile_fills_in_what_the_request_leaves_out():
+    session = new_session("session-1")
+    assert merge_profile(session, 30, 300000, None) == (30, 300000, None)
+    assert merge_profile(session, None, None, "high") == (30, 300000, "high")
+    assert merge_profile(session, 31, None, None) == (31, 300000, "high")
+
+
+def test_remembered_symbols_and_data():
+    index = get_symbol_index()
+    session = new_session("session-1")
+    remember_symbol(session, index.resolve("TCS"))
+    remember_data(session, "TCS.NS", ["price", "news"], time.time() - 60)
+    remember_symbol(session, index.resolve("Infosys"))
+    remember_symbol(session, index.resolve("TCS"))
+
+    assert last_symbol(session).symbol == "TCS.NS"
+    assert [s["symbol"] for s in session["symbols"]] == ["INFY.NS", "TCS.NS"]
+    assert has_recent_data(session, "TCS.NS", max_age=300)
+    assert not has_recent_data(session, "TCS.NS", max_age=30)
+    assert not has_recent_data(session, "INFY.NS", max_age=300)
+
+
+def test_answer_gist_prefers_the_recommendation():
+    answer = "## 1. Money\nRevenue grew.\n\n## 7. Takeaway\n**Recommendation: Hold** for now."
+    assert answer_gist(answer) == "Recommendation: Hold for now."
+    assert answer_gist("TCS is trading at ₹3,500.") == "TCS is trading at ₹3,500."
+
+
+def test_add_turn_folds_the_oldest_turns_under_the_cap():
+    session = new_session("session-1")
+    symbols = ["TCS.NS", "INFY.NS", "WIPRO.NS", "ITC.NS", "TCS.NS", "HDFCBANK.NS"]
+    for i, symbol in enumerate(symbols):
+        add_turn(session, f"Question {i} " + "about the stock " * 10, "Recommendation: Hold. " * 5,
+                 "advice", symbol, "agent_tools", max_tokens=200)
+
+    history = render_history(session)
+    assert estimate_tokens(history) <= 200
+    kept = len(session["turns"])
+    assert 1 <= kept < len(symbols)
+    assert session["turns"][-1]["q"].startswith("Question 5")
+    assert all(f"Question {i} " not in history for i in range(len(symbols) - kept))
+    # Folded turns leave their stocks behind, each once
+    assert session["earlier"] == list(dict.fromkeys(symbols[:len(symbols) - kept]))
+    assert "Before that the investor asked about: TCS.NS" in history
+
+
+def test_render_history_is_empty_before_the_first_answer():
+    assert render_history(new_session("session-1")) == ""
+
+
+def test_store_round_trip_through_sqlite(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(db_path=path)
+    session = store.get("session-1")
+    merge_profile(session, 30, None, None)
+    store.save(session)
+
+    other_worker = SessionStore(db_path=path)
+    assert other_worker.find("session-1")["profile"] == {"age": 30}
+    assert other_worker.stats()["db_loads"] == 1
+    assert other_worker.delete("session-1")
+    assert store.find("session-1") is None
+
+
+def test_copies_are_returned_and_idle_sessions_expire():
+    store = SessionStore(db_path=None, max_age=60)
+    session = store.get("session-1")
+    session["profile"]["age"] = 30
+    assert store.find("session-1") is None  # never saved
+    store.save(session)
+    store.find("session-1")["profile"]["age"] = 99
+    assert store.find("session-1")["profile"] == {"age": 30}
+
+    store._sessions["session-1"]["updated_at"] -= 61
+    assert store.find("session-1") is None
@@ -0,0 +1,73 @@
+import pytest
+
+from symbol_index import SymbolIndex, get_symbol_index
+
+
+@pytest.fixture(scope="module")
+def index() -> SymbolIndex:
+    return get_symbol_index()
+
+
+@pytest.mark.parametrize("text, symbol", [
+    ("RELIANCE", "RELIANCE.NS"),
+    ("INFY.NS", "INFY.NS"),
+    ("tcs", "TCS.NS"),
+])
+def test_exact_codes(index, text, symbol):
+    match = index.resolve(text)
+    assert (match.symbol, match.match_type) == (symbol, "exact")
+
+
+def test_bse_code_keeps_its_exchange(index):
+    match = index.resolve("500325.BO")
+    assert (match.symbol, match.exchange) == ("500325.BO", "BSE")
+
+
+@pytest.mark.parametrize("text, symbol", [
+    ("RIL", "RELIANCE.NS"),
+    ("Reliance Industries", "RELIANCE.NS"),
+    ("tata consultancy", "TCS.NS"),
+    ("Bajaj Finance", "BAJFINANCE.NS"),
+    ("Bajaj Finserv", "BAJAJFINSV.NS"),
+])
+def test_aliases(index, text, symbol):
+    match = index.resolve(text)
+    assert (match.symbol, match.match_type) == (symbol, "alias")
+
+
+def test_unique_prefix(index):
+    match = index.resolve("hindustan uni")
+    assert (match.symbol, match.match_type) == ("HINDUNILVR.NS", "prefix")
+
+
+def test_ambiguous_prefix_resolves_to_nothing(index):
+    # Bajaj Finance and Bajaj Finserv
+    assert index.prefix("bajaj fin") is None
+
+
+@pytest.mark.parametrize("text, symbol", [
+    ("infosis", "INFY.NS"),
+    ("relaince", "RELIANCE.NS"),
+])
+def test_fuzzy_typos(index, text, symbol):
+    match = index.resolve(text)
+    assert (match.symbol, match.match_type) == (symbol, "fuzzy")
+    assert 0.5 <= match.score < 1
+
+
+@pytest.mark.parametrize("text", ["Tata", "HDFC", "xyzzy"])
+def test_ambiguous_or_unknown_names_resolve_to_nothing(index, text):
+    assert index.resolve(text) is None
+
+
+@pytest.mark.parametrize("question, symbol", [
+    ("Should I buy Reliance Industries now?", "RELIANCE.NS"),
+    ("What is the P/E of INFY.NS?", "INFY.NS"),
+    ("Is Titan a buy?", "TITAN.NS"),
+    ("How much should I keep in an emergency fund?", None),
+    ("Is it a good idea to invest monthly?", None),
+    ("a titan of industry", None),
+])
+def test_find_in_text(index, question, symbol):
+    match = index.find_in_text(question)
+    assert (match.symbol if match else None) == symbol
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from tool_cache import ToolCache, is_tool_error
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_their_kind_ttl(clock):
+    cache = ToolCache(ttls={"price": 30, "news": 900})
+    cache.set("price", "TCS.NS", "3500")
+    cache.set("news", "TCS.NS", "[]")
+
+    clock.now += 29
+    assert cache.get("price", "TCS.NS") == "3500"
+    clock.now += 2
+    assert cache.get("price", "TCS.NS") is None
+    assert cache.get("news", "TCS.NS") == "[]"
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ToolCache(max_entries=2)
+    cache.set("price", "A", "1")
+    cache.set("price", "B", "2")
+    assert cache.get("price", "A") == "1"  # B is now the oldest
+    cache.set("price", "C", "3")
+
+    assert cache.get("price", "B") is None
+    assert cache.get("price", "A") == "1"
+    assert cache.get("price", "C") == "3"
+
+
+def test_get_or_fetch_caches_results_but_not_errors(clock):
+    cache = ToolCache()
+    calls = []
+
+    def fetch(value):
+        def run():
+            calls.append(value)
+            return value
+        return run
+
+    assert cache.get_or_fetch("price", "TCS.NS", fetch("Error fetching price")) == "Error fetching price"
+    assert cache.get_or_fetch("price", "TCS.NS", fetch("3500")) == "3500"
+    assert cache.get_or_fetch("price", "TCS.NS", fetch("3600")) == "3500"
+    assert calls == ["Error fetching price", "3500"]
+    assert cache.get_or_fetch("price", "TCS.NS", fetch("3600"), force=True) == "3600"
+
+
+def test_sqlite_tier_is_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / "tool_cache.db")
+    ToolCache(db_path=path).set("fundamentals", "INFY.NS", '{"pe_ratio": 25}')
+
+    other = ToolCache(db_path=path)
+    assert other.get("fundamentals", "INFY.NS") == '{"pe_ratio": 25}'
+    assert other.stats()["by_kind"]["fundamentals"]["db_hits"] == 1
+
+
+@pytest.mark.parametrize("result, expected", [
+    ("Error fetching data for XYZ", True),
+    ("Could not find news", True),
+    (None, True),
+    ('{"price": 3500}', False),
+    ({"price": 3500}, False),
+])
+def test_is_tool_error(result, expected):
+    assert is_tool_error(result) is expected
@@ -0,0 +1,218 @@
+"""
+Shared TTL + LRU Cache for Tool Calls
+
+The advisor calls yfinance and DuckDuckGo for every question, even when the
+same ticker was asked about seconds earlier. This cache sits in front of
+those calls:
+
+- Each kind of data has its own time-to-live (prices for seconds,
+  fundamentals for hours, news for minutes)
+- The in-memory tier is an LRU bounded by `max_entries`
+- An optional SQLite tier (`db_path`) is shared by all uvicorn workers on
+  the machine, so one worker's fetch serves the others
+- Hit/miss counters per kind are available from `stats()`
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Default time-to-live per kind of data, in seconds
+DEFAULT_TTLS = {
+    "price": 30,
+    "fundamentals": 6 * 60 * 60,
+    "recommendations": 6 * 60 * 60,
+    "news": 15 * 60,
+    "search": 30 * 60,
+}
+
+
+def is_tool_error(result) -> bool:
+    """Tool functions report failures as strings; those must not be cached."""
+    if not isinstance(result, str):
+        return result is None
+    return result.startswith("Error") or result.startswith("Could not")
+
+
+class ToolCache:
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 2048,
+        db_path: Optional[str] = None,
+    ):
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # (kind, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._db_writes = 0
+
+    # ------------------------------------------------------------------
+    # SQLite tier
+    # ------------------------------------------------------------------
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """
+        The SQLite tier, opened on first use in each process: a launcher that
+        preloads the app forks the workers after import, and a connection
+        must not cross a fork.
+        """
+        if self.db_path and self._db_pid != os.getpid():
+            self._open_db(self.db_path)
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _open_db(self, db_path: str):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes read while one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+
+    def _db_get(self, kind: str, key: str, now: float):
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE kind = ? AND key = ? AND expires_at > ?",
+                (kind, key, now),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Tool cache read failed: {e}")
+            return None
+        return row
+
+    def _db_set(self, kind: str, key: str, value: str, expires_at: float):
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_cache (kind, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (kind, key, value, expires_at),
+            )
+            self._db_writes += 1
+            # Prune expired rows every so often so the file stays small
+            if self._db_writes % 256 == 0:
+                self._db.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"Tool cache write failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def _count(self, kind: str, counter: str):
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "db_hits": 0})
+        counters[counter] += 1
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end((kind, key))
+                    self._count(kind, "hits")
+                    return entry[1]
+                del self._entries[(kind, key)]
+
+            if self._connection() is not None:
+                row = self._db_get(kind, key, now)
+                if row is not None:
+                    value, expires_at = row
+                    self._store(kind, key, value, expires_at)
+                    self._count(kind, "hits")
+                    self._count(kind, "db_hits")
+                    return value
+
+            self._count(kind, "misses")
+            return None
+
+    def _store(self, kind: str, key: str, value: str, expires_at: float):
+        self._entries[(kind, key)] = (expires_at, value)
+        self._entries.move_to_end((kind, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, kind: str, key: str, value: str, ttl: Optional[float] = None):
+        expires_at = time.time() + (ttl if ttl is not None else self.ttls.get(kind, 60))
+        with self._lock:
+            self._store(kind, key, value, expires_at)
+            if self._connection() is not None:
+                self._db_set(kind, key, value, expires_at)
+
+    def get_or_fetch(self, kind: str, key: str, fetch: Callable[[], str], force: bool = False) -> str:
+        """
+        Return the cached value for (kind, key), or call `fetch()` and cache
+        its result. Error results are returned but not cached. `force=True`
+        skips the lookup and refreshes the entry.
+        """
+        if not force:
+            cached = self.get(kind, key)
+            if cached is not None:
+                return cached
+
+        value = fetch()
+        if not is_tool_error(value):
+            self.set(kind, key, value)
+        return value
+
+    def invalidate(self, kind: str, key: str):
+        with self._lock:
+            self._entries.pop((kind, key), None)
+            if self._connection() is not None:
+                try:
+                    self._db.execute("DELETE FROM tool_cache WHERE kind = ? AND key = ?", (kind, key))
+                except sqlite3.Error as e:
+                    print(f"Tool cache delete failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            if self._connection() is not None:
+                self._db.execute("DELETE FROM tool_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_kind = {kind: dict(counters) for kind, counters in self._counters.items()}
+            hits = sum(c["hits"] for c in by_kind.values())
+            misses = sum(c["misses"] for c in by_kind.values())
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self.db_path is not None,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+                "by_kind": by_kind,
+            }
+
+
+def cache_from_env() -> ToolCache:
+    """
+    Build the cache from environment settings:
+
+    TOOL_CACHE_DB: SQLite file shared by all workers (unset = memory only)
+    TOOL_CACHE_MAX_ENTRIES: in-memory LRU size
+    TOOL_CACHE_TTL_<KIND>: TTL in seconds, e.g. TOOL_CACHE_TTL_PRICE=15
+    """
+    ttls = {}
+    for kind in DEFAULT_TTLS:
+        value = os.getenv(f"TOOL_CACHE_TTL_{kind.upper()}")
+        if value:
+            ttls[kind] = float(value)
+    return ToolCache(
+        ttls=ttls,
+        max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048")),
+        db_path=os.getenv("TOOL_CACHE_DB") or None,
+    )
@@ -0,0 +1,308 @@
+"""
+Request Tracing and Prometheus Metrics
+
+Records where the time of each request goes - prompt building, each tool
+call (yfinance function or DuckDuckGo search), each LLM completion and
+answer extraction - plus LLM token counts and tool-call turns.
+
+- Spans are recorded with `with span(kind, name):` anywhere in the code. They
+  always feed the `advisor_span_duration_seconds` histogram and, when the
+  current request has a trace (`start_trace()`), are also added to it so the
+  API can return the trace as JSON for debugging
+- The current trace lives in a contextvar, so it follows the request into
+  worker threads as long as they are started with the caller's context
+  (AgentPool and the prefetch executor do this)
+- `render_metrics()` returns everything in the Prometheus text format for
+  /api/metrics; no client library needed
+"""
+
+import contextvars
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds; LLM completions and full analyses take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TURN_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12)
+INF_LABEL = 'le="+Inf"'
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def snapshot(self) -> List[dict]:
+        """Count and mean per label set, e.g. for benchmark reports."""
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        return [
+            {**dict(zip(self.labelnames, key)), "count": data[-1], "mean": data[-2] / data[-1] if data[-1] else None}
+            for key, data in items
+        ]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self._header()
+        for key, data in items:
+            for bound, count in zip(self.buckets, data):
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, INF_LABEL)} {data[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(data[-2], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]):
+        """Run `collector` before each scrape (to set gauges from live stats)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error in metrics collector: {str(e)}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "advisor_requests_total", "Answered API requests", ("endpoint", "pipeline", "intent", "status")
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "advisor_request_duration_seconds", "End-to-end request latency", ("endpoint", "pipeline")
+))
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    "advisor_span_duration_seconds",
+    "Time spent per request phase (prepare, tool, tool_cached, agent, llm, extract)",
+    ("kind", "name"),
+))
+LLM_TOKENS = REGISTRY.register(Counter("advisor_llm_tokens_total", "LLM tokens used", ("type",)))
+REQUEST_TOKENS = REGISTRY.register(Histogram(
+    "advisor_request_llm_tokens", "Prompt plus completion tokens per request", ("pipeline",), TOKEN_BUCKETS
+))
+TOOL_CALL_TURNS = REGISTRY.register(Histogram(
+    "advisor_tool_call_turns", "LLM turns that ended in tool calls, per request", ("pipeline",), TURN_BUCKETS
+))
+CONTEXT_TOKENS_SAVED = REGISTRY.register(Counter(
+    "advisor_context_tokens_saved_total",
+    "Estimated prompt tokens removed by context compaction (instructions, tool_outputs, budget)",
+    ("part",),
+))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "advisor_llm_retries_total", "LLM requests retried (rate limit, timeout, server error)", ("endpoint", "reason")
+))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "advisor_llm_hedged_total", "LLM requests duplicated after the latency target, by the one that won", ("endpoint", "winner")
+))
+LLM_FALLBACKS = REGISTRY.register(Counter(
+    "advisor_llm_fallbacks_total", "Requests moved to the next model or agent in the fallback chain", ("source", "target")
+))
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+# ============================================================================
+# TRACES
+# ============================================================================
+
+class Span:
+    __slots__ = ("kind", "name", "started", "duration_ms", "attrs")
+
+    def __init__(self, kind: str, name: str, attrs: dict):
+        self.kind = kind
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attrs = attrs
+
+
+class Trace:
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.tool_call_turns = 0
+        self.tokens_saved: Dict[str, int] = {}  # context compaction, by part
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.id,
+            "llm_calls": self.llm_calls,
+            "tool_call_turns": self.tool_call_turns,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "context_tokens_saved": dict(self.tokens_saved),
+            "spans": [
+                {
+                    "kind": s.kind,
+                    "name": s.name,
+                    "start_ms": round((s.started - self.started) * 1000, 1),
+                    "duration_ms": s.duration_ms,
+                    **s.attrs,
+                }
+                for s in sorted(self.spans, key=lambda s: s.started)
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("advisor_trace", default=None)
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """Time a block. The yielded Span's kind and attrs may be changed inside it."""
+    current = Span(kind, name, attrs)
+    try:
+        yield current
+    finally:
+        elapsed = time.perf_counter() - current.started
+        current.duration_ms = round(elapsed * 1000, 1)
+        SPAN_SECONDS.observe(elapsed, kind=current.kind, name=current.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(current)
+
+
+def record_completion(prompt_tokens: int, completion_tokens: int, tool_calls: bool):
+    """Count the tokens (and tool-call turn) of one LLM completion."""
+    LLM_TOKENS.inc(prompt_tokens, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, type="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.llm_calls += 1
+        trace.prompt_tokens += prompt_tokens
+        trace.completion_tokens += completion_tokens
+        if tool_calls:
+            trace.tool_call_turns += 1
+
+
+def record_compaction(part: str, tokens_before: int, tokens_after: int):
+    """Count the (estimated) prompt tokens that compaction removed."""
+    saved = max(0, tokens_before - tokens_after)
+    CONTEXT_TOKENS_SAVED.inc(saved, part=part)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens_saved[part] = trace.tokens_saved.get(part, 0) + saved
+
+
+def finish_trace(trace: Trace, endpoint: str, pipeline: str, intent: str, status: str = "ok"):
+    """Record request-level metrics once the answer (or error) is ready."""
+    REQUESTS.inc(endpoint=endpoint, pipeline=pipeline, intent=intent, status=status)
+    REQUEST_SECONDS.observe(time.perf_counter() - trace.started, endpoint=endpoint, pipeline=pipeline)
+    if trace.llm_calls:
+        REQUEST_TOKENS.observe(trace.prompt_tokens + trace.completion_tokens, pipeline=pipeline)
+        TOOL_CALL_TURNS.observe(trace.tool_call_turns, pipeline=pipeline)